@@ -0,0 +1,64 @@
+###############################################################################
+# Thread scaling benchmark
+#
+# Plotting speedup of add_data as the number of threads increases
+###############################################################################
+import os
+import timeit
+import numpy as np
+
+import infotheory
+
+import matplotlib
+
+matplotlib.use("TkAgg")
+import matplotlib.pyplot as plt
+
+
+def thread_scaling(thread_counts, data_size, nreps, num_bins, time_reps=5):
+    print("Data size: {} | nreps: {} | bins: {}".format(data_size, nreps, num_bins))
+    times = []
+
+    # setup
+    setup = ""
+    setup += "import numpy as np;import infotheory;"
+    setup += "data = np.random.rand({}, 3);".format(data_size)
+
+    # a fresh object each time, so that every call merges into empty histograms
+    to_time = ""
+    to_time += "it = infotheory.InfoTools(3, {});".format(nreps)
+    to_time += "it.set_equal_interval_binning([{}] * 3, [0] * 3, [1] * 3);".format(
+        num_bins
+    )
+    to_time += "it.add_data(data, n_threads={});"
+
+    for n_threads in thread_counts:
+        print("\tTesting {} threads".format(n_threads))
+        t = timeit.timeit(to_time.format(n_threads), setup=setup, number=time_reps)
+        times.append(t / time_reps)
+
+    return times
+
+
+if __name__ == "__main__":
+    thread_counts = [t for t in [1, 2, 4, 8, 16] if t <= os.cpu_count()]
+    data_size = 2000000
+
+    plt.figure(figsize=[5, 3])
+    for nreps, num_bins in [(0, 10), (0, 100), (2, 100)]:
+        times = thread_scaling(thread_counts, data_size, nreps, num_bins)
+        speedup = [times[0] / t for t in times]
+        plt.plot(
+            thread_counts,
+            speedup,
+            marker="o",
+            label="nreps={}, bins={}".format(nreps, num_bins),
+        )
+
+    plt.plot(thread_counts, thread_counts, "k--", label="linear")
+    plt.xlabel("Num threads")
+    plt.ylabel("Speedup of add_data")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig("thread_scaling.png")
+    plt.show()
@@ -48,22 +48,19 @@ data = np.array(data)
 #######################################
 ## Analysis
 #######################################
-mi = []
-# measuring informatino for each time point
-for t in np.unique(data[:, 0]):
-    # init object
-    it = infotheory.InfoTools(2, 3)
-    it.set_equal_interval_binning([10] * 2, [0] * 2, [1] * 2)
+# one object with the binning for all time points
+it = infotheory.InfoTools(2, 3)
+it.set_equal_interval_binning([10] * 2, [0] * 2, [1] * 2)
 
-    # get data points for particular time and add them
-    data_t = data[np.where(data[:, 0] == t)[0], 1:]
-    it.add_data(data_t)
+# data of each trial at each time point - shape (trials, time points, dims)
+times = np.unique(data[:, 0])
+data_trials = data[:, 1:].reshape(-1, len(times), 2)
 
-    # measure mutual information
-    mi.append(it.mutual_info([0, 1]))
+# measuring information for each time point
+mi = it.time_resolved(data_trials, "mutual_info", [0, 1])
 
 plt.subplot(313)
-plt.plot(np.unique(data[:, 0]), mi, "C2")
+plt.plot(times, mi, "C2")
 
 plt.subplot(311)
 plt.ylabel("Stimuli")
@@ -7,11 +7,779 @@
 
 #include <iostream>
 #include <math.h>
+#include <vector>
+#include <list>
+#include <deque>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <condition_variable>
+#include <thread>
+#include <atomic>
+#include <cstring>
+#include <fstream>
+#include <cstdio>
+#include <random>
+#include <algorithm>
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+#endif
 #include "VectorMatrix.h"
 
 #pragma once
 #define TESTMODE 0
 
+#ifndef DOXYGEN_SHOULD_SKIP_THIS
+/*******************
+* Sparse bin store
+*******************/
+// bin coordinates are stored in 2 bytes, limiting the number of bins along each dimension to 65535
+// define INFOTHEORY_WIDE_BINS for up to 2^32-1 bins, at twice the memory
+#ifdef INFOTHEORY_WIDE_BINS
+typedef unsigned int BinCoord;
+#else
+typedef unsigned short BinCoord;
+#endif
+#define MAX_BINS_PER_DIM ((long)(BinCoord)(-1))
+typedef unsigned long long BinCount; // number of points in a bin (summed across shifts), 64 bits so that totals of merged objects do not wrap
+
+class BinIndex{
+    // Hash index over rows of integer bin coordinates
+    // rows are numbered 0,1,2... in the order in which they were first inserted
+    // lookups and inserts are O(1) expected (open addressing, linear probing)
+    // rows can also be viewed in memory owned elsewhere (e.g. a mapped file), they are then
+    // copied and hashed on the first lookup or insert
+    public:
+        BinIndex(int w=0, int capacity=0){
+            init(w, capacity);
+        }
+
+        void init(int w, int capacity=0){
+            width = w;
+            viewed = NULL;
+            viewedRows = 0;
+            coords.clear();
+            hashes.clear();
+            int nSlots = 16;
+            while(nSlots < 2*capacity) nSlots *= 2;
+            coords.reserve(capacity*width);
+            hashes.reserve(capacity);
+            slots.assign(nSlots, -1);
+        }
+
+        void view(int w, const BinCoord* rows, int nRows){
+            // use nRows rows of w coordinates at rows, which must outlive this index or the next init
+            init(w);
+            viewed = rows;
+            viewedRows = nRows;
+        }
+
+        int size(){return viewed ? viewedRows : hashes.size();}
+        int Width(){return width;}
+        long long bytes(){
+            return coords.capacity()*sizeof(BinCoord) + hashes.capacity()*sizeof(unsigned long long) + slots.capacity()*sizeof(int);
+        }
+        const BinCoord* row(int i){return (viewed ? viewed : coords.data()) + (size_t)i*width;}
+
+        int find(const BinCoord* c){
+            // returns row number of c, or -1 if it has not been inserted
+            return find(c, hashCoords(c));
+        }
+
+        int find(const BinCoord* c, unsigned long long h){
+            // as find(c), with h = hashCoords(c)
+            if(viewed) own();
+            size_t mask = slots.size()-1;
+            for(size_t s=h&mask; slots[s]!=-1; s=(s+1)&mask){
+                if(hashes[slots[s]]==h && sameCoords(slots[s],c)) return slots[s];
+            }
+            return -1;
+        }
+
+        int insert(const BinCoord* c, int& added){
+            // returns row number of c, inserting it as a new row if it doesn't exist
+            return insert(c, hashCoords(c), added);
+        }
+
+        int insert(const BinCoord* c, unsigned long long h, int& added){
+            // as insert(c, added), with h = hashCoords(c)
+            if(viewed) own();
+            size_t mask = slots.size()-1;
+            size_t s = h&mask;
+            for(; slots[s]!=-1; s=(s+1)&mask){
+                if(hashes[slots[s]]==h && sameCoords(slots[s],c)){
+                    added = 0;
+                    return slots[s];
+                }
+            }
+            added = 1;
+            return append(c, h, s);
+        }
+
+        int append(const BinCoord* c, unsigned long long h){
+            // insert c, which must not be in the index, with h = hashCoords(c), and return its row
+            if(viewed) own();
+            size_t mask = slots.size()-1;
+            size_t s = h&mask;
+            while(slots[s]!=-1) s=(s+1)&mask;
+            return append(c, h, s);
+        }
+
+        void reserve(int nRows){
+            // room for nRows rows without rehashing
+            if(viewed) own();
+            coords.reserve((size_t)nRows*width);
+            hashes.reserve(nRows);
+            size_t nSlots = slots.size();
+            while(nSlots < 2*(size_t)nRows) nSlots *= 2;
+            if(nSlots > slots.size()) rehash(nSlots);
+        }
+
+        void own(){
+            // copy and hash the viewed rows, if any - after which lookups no longer change the index
+            if(!viewed) return;
+            const BinCoord* rows = viewed;
+            int nRows = viewedRows;
+            init(width, nRows);
+            coords.assign(rows, rows + (size_t)nRows*width);
+            for(int l=0; l<nRows; l++){
+                hashes.push_back(hashCoords(row(l)));
+            }
+            rehash(slots.size());
+        }
+
+        unsigned long long hashCoords(const BinCoord* c){
+            unsigned long long h = 14695981039346656037ULL;
+            for(int d=0; d<width; d++){
+                h ^= c[d];
+                h *= 1099511628211ULL;
+            }
+            h ^= h >> 33;
+            h *= 0xff51afd7ed558ccdULL;
+            h ^= h >> 33;
+            return h;
+        }
+
+    private:
+        int width;
+        vector<BinCoord> coords;            // size()*width bin coordinates
+        vector<unsigned long long> hashes;  // hash of each row
+        vector<int> slots;                  // row number or -1 if empty
+        const BinCoord* viewed;             // rows owned elsewhere, NULL once they have been copied
+        int viewedRows;
+
+        int append(const BinCoord* c, unsigned long long h, size_t s){
+            // add c as a new row in the empty slot s
+            int l = size();
+            slots[s] = l;
+            coords.insert(coords.end(), c, c+width);
+            hashes.push_back(h);
+            if(2*(size_t)size() > slots.size()) rehash(2*slots.size());
+            return l;
+        }
+
+        bool sameCoords(int l, const BinCoord* c){
+            const BinCoord* r = row(l);
+            for(int d=0; d<width; d++){
+                if(r[d]!=c[d]) return false;
+            }
+            return true;
+        }
+
+        void rehash(size_t nSlots){
+            // slots for the stored hashes, coordinates are not rehashed
+            slots.assign(nSlots, -1);
+            size_t mask = nSlots-1;
+            for(int l=0; l<size(); l++){
+                size_t s = hashes[l]&mask;
+                while(slots[s]!=-1) s=(s+1)&mask;
+                slots[s] = l;
+            }
+        }
+};
+
+class SparseHistogram{
+    // Counts of points in each populated bin, keyed on the bin coordinates
+    // bins and counts can be viewed in memory owned elsewhere, they are copied when first changed
+    public:
+        BinIndex index;
+        int empties; // number of bins whose count has gone down to 0
+
+        void init(int dims, int capacity=0){
+            index.init(dims, capacity);
+            counts.clear();
+            counts.reserve(capacity);
+            viewedCounts = NULL;
+            empties = 0;
+        }
+
+        void view(int dims, const BinCoord* coords, const BinCount* binCounts, int nBins){
+            // use nBins populated bins with coordinates coords and counts binCounts,
+            // which must outlive this histogram or the next init
+            init(dims);
+            index.view(dims, coords, nBins);
+            viewedCounts = binCounts;
+        }
+
+        int size(){return index.size();}
+        const BinCoord* coordinates(int l){return index.row(l);}
+        BinCount count(int l){return viewedCounts ? viewedCounts[l] : counts[l];}
+
+        int increment(const BinCoord* c, long long by=1){
+            // add to count of bin c and return 1 if c was not populated before
+            int added;
+            increment(c, by, added);
+            return added;
+        }
+
+        int increment(const BinCoord* c, long long by, int& added){
+            // add to count of bin c (subtract if by<0) and return its row
+            return increment(c, index.hashCoords(c), by, added);
+        }
+
+        int increment(const BinCoord* c, unsigned long long h, long long by, int& added){
+            // as increment(c, by, added), with h = index.hashCoords(c)
+            own();
+            int l = index.insert(c, h, added);
+            if(added) counts.push_back((BinCount) by);
+            else add(l, by);
+            return l;
+        }
+
+        void add(int l, long long by){
+            // add to count of the bin in row l (subtract if by<0)
+            own();
+            if(counts[l] == 0) empties--;
+            counts[l] += (BinCount) by;
+            if(counts[l] == 0) empties++;
+        }
+
+        int append(const BinCoord* c, unsigned long long h, long long count){
+            // add bin c, which must not have a row yet, with h = index.hashCoords(c), and return its row
+            own();
+            counts.push_back((BinCount) count);
+            return index.append(c, h);
+        }
+
+        void own(){
+            // copy viewed bins and counts, if any - after which lookups no longer change the histogram
+            if(viewedCounts){
+                counts.assign(viewedCounts, viewedCounts + size());
+                viewedCounts = NULL;
+            }
+            index.own();
+        }
+
+        BinCount count(const BinCoord* c){
+            int l = index.find(c);
+            return l < 0 ? 0 : count(l);
+        }
+
+        bool mostlyEmpty(){
+            // whether enough bins have gone down to 0 to be worth dropping
+            return empties > 64 && 2*empties > size();
+        }
+
+        void compact(){
+            // drop bins whose count is 0, keeping the others in the same order
+            SparseHistogram kept;
+            kept.init(index.Width(), size()-empties);
+            for(int l=0; l<size(); l++){
+                if(count(l) != 0) kept.increment(coordinates(l), count(l));
+            }
+            *this = kept;
+        }
+
+        void exportMatrix(TMatrix<double>& into){
+            // dense view with the coordinates of one bin and its count in each row
+            int dims = index.Width();
+            into.SetBounds(1,size(),1,dims+1);
+            for(int l=0; l<size(); l++){
+                const BinCoord* c = coordinates(l);
+                for(int d=0; d<dims; d++){
+                    into[l+1][d+1] = c[d];
+                }
+                into[l+1][dims+1] = count(l);
+            }
+        }
+
+    private:
+        vector<BinCount> counts;
+        const BinCount* viewedCounts; // counts owned elsewhere, NULL once they have been copied
+};
+
+class Marginal{
+    // Data projected onto a subset of dimensions - populated bins that share
+    // coordinates along those dimensions form one group
+    public:
+        vector<int> dims;       // dimensions the data is projected onto (0-indexing)
+        BinIndex index;         // coordinates along dims of each group
+        vector<int> group;      // group of each populated bin (0-indexing)
+        vector<double> counts;  // total count of points in each group
+        vector<int> slots;      // if dense, group of each combination of coordinates along dims, -1 if it has not occurred
+        vector<long> strides;   // if dense, step in slots for one bin along each of dims
+
+        int size(){return counts.size();}
+
+        void init(TVector<int>& atInds, int capacity=0){
+            dims.resize(atInds.Size());
+            for(int i=1; i<=atInds.Size(); i++){
+                dims[i-1] = atInds[i]-1;
+            }
+            index.init(dims.size(), capacity);
+            group.clear();
+            group.reserve(capacity);
+            counts.clear();
+            slots.clear();
+            strides.clear();
+        }
+
+        void makeDense(vector<int>& sizes){
+            // group bins by looking up their coordinates in a flat array instead of index,
+            // with coordinates 0..sizes[i]-1 along dims[i]
+            strides.resize(dims.size());
+            long size = 1;
+            for(int i=dims.size()-1; i>=0; i--){
+                strides[i] = size;
+                size *= sizes[i];
+            }
+            slots.assign(size, -1);
+        }
+
+        void addBins(SparseHistogram& data, int from){
+            // group populated bins from,from+1... of data in the order in which they occur
+            // groups are numbered in the order in which they first occur in data
+            int width = dims.size();
+            if(!slots.empty()){
+                for(int l=from; l<data.size(); l++){
+                    const BinCoord* coords = data.coordinates(l);
+                    long s = 0;
+                    for(int i=0; i<width; i++){
+                        s += coords[dims[i]]*strides[i];
+                    }
+                    int g = slots[s];
+                    if(g < 0){
+                        g = slots[s] = counts.size();
+                        counts.push_back(0.);
+                    }
+                    counts[g] += data.count(l);
+                    group.push_back(g);
+                }
+                return;
+            }
+            vector<BinCoord> pattern(width > 0 ? width : 1);
+            int added;
+            for(int l=from; l<data.size(); l++){
+                const BinCoord* coords = data.coordinates(l);
+                for(int i=0; i<width; i++){
+                    pattern[i] = coords[dims[i]];
+                }
+                int g = index.insert(pattern.data(), added);
+                if(added) counts.push_back(0.);
+                counts[g] += data.count(l);
+                group.push_back(g);
+            }
+        }
+
+        void update(SparseHistogram& data, vector<int>& changedBins, vector<double>& changes){
+            // bring up to date with data, where the counts of changedBins have changed by changes and bins may have been added
+            int grouped = group.size();
+            for(size_t i=0; i<changedBins.size(); i++){
+                int l = changedBins[i];
+                if(l < grouped) counts[group[l]] += changes[l];
+            }
+            addBins(data, grouped);
+        }
+
+        long long bytes(){
+            return sizeof(Marginal) + dims.capacity()*sizeof(int) + index.bytes()
+                + group.capacity()*sizeof(int) + counts.capacity()*sizeof(double)
+                + slots.capacity()*sizeof(int) + strides.capacity()*sizeof(long);
+        }
+};
+
+class MarginalCache{
+    // Marginals that have already been computed, keyed by their (sorted) dimensions.
+    // Least recently used marginals are dropped to stay within a memory budget.
+    // Safe to use from several threads at once
+    public:
+        MarginalCache(){
+            budget = 256LL << 20;
+            usedBytes = hits = misses = 0;
+        }
+
+        shared_ptr<Marginal> get(vector<int>& dims){
+            lock_guard<mutex> guard(lock);
+            map<vector<int>, Entry>::iterator e = entries.find(dims);
+            if(e == entries.end()){
+                misses++;
+                return shared_ptr<Marginal>();
+            }
+            hits++;
+            lru.splice(lru.begin(), lru, e->second.lruPos);
+            return e->second.marginal;
+        }
+
+        shared_ptr<Marginal> put(vector<int>& dims, shared_ptr<Marginal> m){
+            // returns the cached marginal if another thread has put one for dims meanwhile, m otherwise
+            lock_guard<mutex> guard(lock);
+            map<vector<int>, Entry>::iterator found = entries.find(dims);
+            if(found != entries.end()) return found->second.marginal;
+            long long bytes = entryBytes(dims, *m);
+            if(bytes > budget) return m;
+            lru.push_front(dims);
+            Entry& e = entries[dims];
+            e.marginal = m;
+            e.bytes = bytes;
+            e.lruPos = lru.begin();
+            usedBytes += bytes;
+            while(usedBytes > budget) evict();
+            return m;
+        }
+
+        void update(SparseHistogram& data, vector<int>& changedBins, vector<double>& changes){
+            // update all marginals to the current data, see Marginal::update
+            lock_guard<mutex> guard(lock);
+            usedBytes = 0;
+            for(map<vector<int>, Entry>::iterator e=entries.begin(); e!=entries.end(); e++){
+                e->second.marginal->update(data, changedBins, changes);
+                e->second.bytes = entryBytes(e->first, *e->second.marginal);
+                usedBytes += e->second.bytes;
+            }
+            while(usedBytes > budget) evict();
+        }
+
+        bool empty(){
+            lock_guard<mutex> guard(lock);
+            return entries.empty();
+        }
+
+        void clear(){
+            lock_guard<mutex> guard(lock);
+            entries.clear();
+            lru.clear();
+            usedBytes = 0;
+        }
+
+        void setBudget(long long bytes){
+            lock_guard<mutex> guard(lock);
+            budget = bytes;
+            while(usedBytes > budget) evict();
+        }
+
+        void stats(long long& nHits, long long& nMisses, long long& nEntries, long long& nBytes){
+            lock_guard<mutex> guard(lock);
+            nHits = hits;
+            nMisses = misses;
+            nEntries = entries.size();
+            nBytes = usedBytes;
+        }
+
+    private:
+        struct Entry{
+            shared_ptr<Marginal> marginal;
+            long long bytes;
+            list<vector<int> >::iterator lruPos;
+        };
+        map<vector<int>, Entry> entries;
+        list<vector<int> > lru; // most recently used first
+        long long budget, usedBytes;
+        long long hits, misses;
+        mutex lock;
+
+        long long entryBytes(const vector<int>& dims, Marginal& m){
+            return sizeof(Entry) + 2*dims.size()*sizeof(int) + m.bytes();
+        }
+
+        void evict(){
+            map<vector<int>, Entry>::iterator e = entries.find(lru.back());
+            usedBytes -= e->second.bytes;
+            entries.erase(e);
+            lru.pop_back();
+        }
+};
+
+class SpecificProbs{
+    // For each unique x, p(x) and the p(y) and p(x,y) of every y that occurs with it.
+    // Only (x,y) pairs that occur are stored, x after x (compressed rows)
+    public:
+        vector<double> px;        // p(x) for each x
+        vector<int> offsets;      // pairs of x number i are at [offsets[i],offsets[i+1])
+        vector<double> py, pxy;   // p(y) and p(x,y) for each (x,y) pair
+
+        int size(){return px.size();}
+};
+
+class CountTable{
+    // Total count of points with each of the keys 0,1...range-1 that occur, in the order in which they first occur.
+    // Keys are looked up in a flat array with one slot per key (dense), or hashed
+    public:
+        vector<long long> keys;  // each key that occurs
+        vector<double> counts;   // total count of points with each of them
+
+        int size(){return keys.size();}
+
+        void reset(long long range, bool dense, int expected){
+            // start over, for keys in [0,range) of which at most expected occur
+            keys.clear();
+            counts.clear();
+            isDense = dense;
+            if(dense) slots.assign(range, -1);
+            else{
+                size_t nSlots = 16;
+                while(nSlots < 2*(size_t)expected) nSlots *= 2;
+                slots.assign(nSlots, -1);
+            }
+        }
+
+        void add(long long key, double count){
+            size_t s = key;
+            if(!isDense){
+                unsigned long long h = key*0x9e3779b97f4a7c15ULL;
+                size_t mask = slots.size()-1;
+                for(s=(h^(h>>32))&mask; slots[s]!=-1 && keys[slots[s]]!=key; s=(s+1)&mask);
+            }
+            int g = slots[s];
+            if(g < 0){
+                g = slots[s] = keys.size();
+                keys.push_back(key);
+                counts.push_back(0.);
+            }
+            counts[g] += count;
+        }
+
+    private:
+        vector<int> slots; // position of each key in keys, -1 if it has not occurred
+        bool isDense;
+};
+
+/*******************
+* Threads
+*******************/
+int numThreads(int nThreads, long nTasks){
+    // number of threads to use for nTasks, all cores if nThreads<=0
+    if(nThreads <= 0) nThreads = thread::hardware_concurrency();
+    if(nThreads > nTasks) nThreads = nTasks;
+    return nThreads > 0 ? nThreads : 1;
+}
+
+template<class F>
+void parallelFor(long nTasks, int nThreads, F task){
+    // call task(i, threadIndex) for i=0..nTasks-1 on nThreads threads (0-indexing)
+    // tasks are handed out one at a time, so that threads stay busy when tasks take different times
+    atomic<long> next(0);
+    auto work = [&](int threadIndex){
+        for(long i=next++; i<nTasks; i=next++) task(i, threadIndex);
+    };
+    if(nThreads <= 1){
+        work(0);
+        return;
+    }
+    vector<thread> threads;
+    for(int t=1; t<nThreads; t++) threads.push_back(thread(work, t));
+    work(0);
+    for(size_t t=0; t<threads.size(); t++) threads[t].join();
+}
+class AccessLock{
+    // Any number of readers or a single writer at a time.
+    // Readers that arrive while a writer is waiting are let in after it, so that writers are not starved
+    // (so a reader must not take the lock again while holding it)
+    public:
+        AccessLock(){
+            readers = writersWaiting = 0;
+            writing = false;
+        }
+
+        void lockShared(){
+            unique_lock<mutex> guard(lock);
+            changed.wait(guard, [this]{return !writing && writersWaiting == 0;});
+            readers++;
+        }
+
+        void unlockShared(){
+            lock_guard<mutex> guard(lock);
+            if(--readers == 0) changed.notify_all();
+        }
+
+        void lockExclusive(){
+            unique_lock<mutex> guard(lock);
+            writersWaiting++;
+            changed.wait(guard, [this]{return !writing && readers == 0;});
+            writersWaiting--;
+            writing = true;
+        }
+
+        void unlockExclusive(){
+            lock_guard<mutex> guard(lock);
+            writing = false;
+            changed.notify_all();
+        }
+
+    private:
+        mutex lock;
+        condition_variable changed;
+        int readers, writersWaiting;
+        bool writing;
+};
+
+class SharedAccess{
+    // holds an AccessLock shared for as long as it exists
+    public:
+        SharedAccess(AccessLock& l) : held(l){held.lockShared();}
+        ~SharedAccess(){held.unlockShared();}
+    private:
+        AccessLock& held;
+};
+
+class ExclusiveAccess{
+    // holds an AccessLock exclusively for as long as it exists
+    public:
+        ExclusiveAccess(AccessLock& l) : held(l){held.lockExclusive();}
+        ~ExclusiveAccess(){held.unlockExclusive();}
+    private:
+        AccessLock& held;
+};
+
+/*******************
+* Serialization
+*******************/
+#define SAVE_MAGIC "INFOTOOL" // first 8 bytes of a saved state
+#define SAVE_VERSION 2 // version 1 had 4-byte bin counts, and is still read
+
+class ByteWriter{
+    // appends values to a byte buffer or a file, each run of values padded to a multiple of 8 bytes
+    // so that runs of up to 8 byte values are aligned when the buffer or file is mapped
+    public:
+        ByteWriter(vector<char>& out):buffer(&out),file(NULL),written(0){}
+        ByteWriter(ostream& out):buffer(NULL),file(&out),written(0){}
+
+        template<class X>
+        void put(const X* values, size_t n){
+            static const char zeros[8] = {0};
+            write((const char*) values, n*sizeof(X));
+            write(zeros, (8 - written%8)%8);
+        }
+
+        template<class X>
+        void put(X value){put(&value, 1);}
+
+    private:
+        vector<char>* buffer;
+        ostream* file;
+        size_t written;
+
+        void write(const char* bytes, size_t n){
+            if(n == 0) return;
+            if(buffer) buffer->insert(buffer->end(), bytes, bytes + n);
+            else file->write(bytes, n);
+            written += n;
+        }
+};
+
+class ByteReader{
+    // reads back what was written by ByteWriter, ok() is false once the buffer has run out
+    public:
+        ByteReader(const char* buf, size_t len):pos(buf),end(buf+len),valid(true){}
+
+        bool ok(){return valid;}
+        size_t remaining(){return end-pos;}
+
+        template<class X>
+        const char* take(size_t n){
+            // start of the next run of n values of type X, NULL if the buffer is too short
+            size_t bytes = n*sizeof(X), padded = (bytes + 7)/8*8;
+            if(!valid || n > (size_t)(end-pos)/sizeof(X) || padded > (size_t)(end-pos)){
+                valid = false;
+                return NULL;
+            }
+            const char* start = pos;
+            pos += padded;
+            return start;
+        }
+
+        template<class X>
+        const X* view(size_t n){
+            // the next n values in place, the buffer must be aligned to 8 bytes
+            return (const X*) take<X>(n);
+        }
+
+        template<class X>
+        void get(X* values, size_t n){
+            const char* start = take<X>(n);
+            if(start && n > 0) memcpy(values, start, n*sizeof(X));
+        }
+
+        template<class X>
+        X get(){
+            X value = X();
+            get(&value, 1);
+            return value;
+        }
+
+    private:
+        const char *pos, *end;
+        bool valid;
+};
+
+class MappedFile{
+    // read-only contents of a whole file, mapped into memory so that processes
+    // share one copy of it, or read into memory where mapping isn't available
+    public:
+        const char* data;
+        size_t len;
+
+        MappedFile():data(NULL),len(0){}
+
+        bool open(const char* path){
+            #ifndef _WIN32
+            int fd = ::open(path, O_RDONLY);
+            if(fd < 0) return false;
+            struct stat st;
+            if(fstat(fd, &st) == 0 && st.st_size > 0){
+                void* mapped = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+                if(mapped != MAP_FAILED){
+                    data = (const char*) mapped;
+                    len = st.st_size;
+                }
+            }
+            close(fd);
+            return data != NULL;
+            #else
+            ifstream in(path, ios::binary);
+            if(!in) return false;
+            contents.assign(istreambuf_iterator<char>(in), istreambuf_iterator<char>());
+            // copied to 8 byte aligned memory
+            aligned.resize(contents.size()/8 + 1);
+            memcpy(aligned.data(), contents.data(), contents.size());
+            data = (const char*) aligned.data();
+            len = contents.size();
+            vector<char>().swap(contents);
+            return len > 0;
+            #endif
+        }
+
+        ~MappedFile(){
+            #ifndef _WIN32
+            if(data) munmap((void*) data, len);
+            #endif
+        }
+
+    private:
+        #ifdef _WIN32
+        vector<char> contents;
+        vector<double> aligned;
+        #endif
+        MappedFile(const MappedFile&);
+        MappedFile& operator=(const MappedFile&);
+};
+#endif /* DOXYGEN_SHOULD_SKIP_THIS */
+
+//! Information theoretic measures that can be evaluated for several varIDs in one call, see InfoTools::batch (all but PID) and InfoTools::timeResolved
+enum InfoMeasure{ENTROPY=0, MUTUAL_INFO=1, REDUNDANT_INFO=2, UNIQUE_INFO=3, SYNERGY=4, PID=5};
+
 class InfoTools{
     // making everything public to make testing easier
     #if !TESTMODE
@@ -19,16 +787,25 @@ class InfoTools{
     #else
     public:
     #endif
-        int BIN_LIMIT;
+        int expectedBins; // number of bins to reserve space for when the first point is added
         // numShifts(numDims(numBins))
         // to allow different number of bins along different dimensions
         TVector<TVector<TVector<double> > > bins;
-
-        // one matrix for data binned using one list of bins
-        TVector<TMatrix<double> > binnedData; // XXX matrixShape=(None,numDims+1)
-
-        // one matrix averaged across all shifts
-        TMatrix<double> avgBinnedData;
+        // numShifts(numDims) width of bins if they are equally spaced, 0 otherwise
+        TVector<TVector<double> > binWidths;
+        // numShifts(numDims) whether bin margins are in increasing order
+        TVector<TVector<int> > binsSortedFlag;
+
+        // one sparse histogram for data binned using one list of bins
+        TVector<SparseHistogram> binnedData;
+
+        // one sparse histogram with the total counts across all shifts, the average being these divided by nReps
+        // kept up to date as points are added
+        SparseHistogram avgBinnedData;
+        int collapsedLen; // number of bins in avgBinnedData at the last collapse
+        vector<int> changedBins; // bins of avgBinnedData, that existed at the last collapse, whose counts have changed since
+        vector<double> binChanges; // change in count of each of those bins since the last collapse (sized once one changes)
+        vector<char> binChangedFlag; // whether each of those bins is in changedBins
 
         // one matrix for data binned using one list of bins
         //TVector<TMatrix<double> > probs; // all combinations of probabilities
@@ -39,6 +816,20 @@ class InfoTools{
         int nDims, nReps, dataLen;
         int dataInitedFlag, dataReadyFlag;
         TVector<int> binningInitedFlag;
+        vector<BinCoord> binScratch; // bin coordinates, for each shift, of the point being added or removed
+        // sliding window - bin coordinates of the points in the window (nReps*nDims each) and their times, oldest first
+        long windowSize; // maximum number of points, 0 for no limit
+        double windowDuration; // maximum time since the latest point, 0 for no limit
+        deque<BinCoord> windowBins;
+        deque<double> windowTimes;
+        // bin coordinates of every datapoint (nReps*nDims each) if they are being kept, see keepSamples
+        int keepSamplesFlag;
+        vector<BinCoord> sampleBins;
+        shared_ptr<MappedFile> mapping; // file that histograms loaded with load are viewed in
+        MarginalCache marginalCache; // marginals of avgBinnedData that have been computed
+        long denseBudget; // marginals with at most this many combinations of bins are grouped with a flat array
+        mutex collapseLock; // held while checking for and collapsing binned data
+        AccessLock access; // see accessLock
 
     #if !TESTMODE
     public:
@@ -46,25 +837,36 @@ class InfoTools{
         /*******************
         * Inits
         *******************/
-        InfoTools(int dims, int nreps=0){
+        InfoTools(int dims, int nreps=0, int expectedBins=0){
             //!Constructor
             /*! ARGS\n
             *     dims - dimensionality of data (all variables combined)\n
             *     nreps - number of reps on each side of bin boundary to compute average shifted histogram\n
+            *     expectedBins - number of populated bins expected, used to pre-size the bin store (optional, default 500)\n
             */
-            BIN_LIMIT = 500;
+            this->expectedBins = expectedBins>0 ? expectedBins : 500;
 
             // resetting vars
             nDims = dims;
             nReps = nreps*2 + 1;
-            dataLen = 0; // number of non-empty bins, across all shifts
+            dataLen = 0; // number of non-empty bins in avgBinnedData
+            collapsedLen = 0;
             totalPoints = totalAvgPoints = 0;
+            denseBudget = 1L << 18;
 
             bins.SetBounds(1,nReps);
             for(int r=1; r<=nReps; r++){
                 // bins[r] is all bins for a particular shift
                 bins[r].SetBounds(1,nDims);
             }
+            binWidths.SetBounds(1,nReps);
+            binsSortedFlag.SetBounds(1,nReps);
+            for(int r=1; r<=nReps; r++){
+                binWidths[r].SetBounds(1,nDims);
+                binWidths[r].FillContents(0.);
+                binsSortedFlag[r].SetBounds(1,nDims);
+                binsSortedFlag[r].FillContents(0);
+            }
             binnedData.SetBounds(1,nReps);
 
             nBins.SetBounds(1,dims);
@@ -77,6 +879,10 @@ class InfoTools{
             dataReadyFlag = 0;
             binningInitedFlag.SetBounds(1,nDims);
             binningInitedFlag.FillContents(0.);
+            binScratch.resize(nReps*nDims);
+            windowSize = 0;
+            windowDuration = 0.;
+            keepSamplesFlag = 0;
 
             //cout << "Total points = " << totalPoints << endl;
         }
@@ -87,6 +893,11 @@ class InfoTools{
         * Inspection tools
         *******************/
 
+        //!Returns total dimensionality of data (all variables combined)
+        int getNumDims(){
+            return nDims;
+        }
+
         //!Display the config for analyses such as number of bins, dimensionality etc.
         void displayConfig(){
             cout << "************************ CONFIG ************************" << endl;
@@ -109,10 +920,10 @@ class InfoTools{
             cout << "Number of total datapoints added = " << totalPoints << endl;
             cout << "Number of populated bins = " << dataLen << endl;
             if(!dataReadyFlag)
-                cout << "Size of populated bin list = " << binnedData[1].ColumnSize() << endl;
+                cout << "Size of populated bin list = " << binnedData[1].size() << endl;
             cout << "Has data been collapsed across multiple shifted binnings? " << (dataReadyFlag==0 ? "No":"Yes") << endl;
             if(dataReadyFlag)
-                cout << "Size of average binned data = " << avgBinnedData.ColumnSize() << endl;
+                cout << "Size of average binned data = " << avgBinnedData.size() << endl;
             cout << "**********************************************************" << endl;
         }
 
@@ -169,6 +980,10 @@ class InfoTools{
             }
             int bLb = boundaries.LowerBound();
             int bUb = boundaries.UpperBound();
+            if(boundaries.Size()+1 > MAX_BINS_PER_DIM){
+                cerr << "ERROR: At most " << MAX_BINS_PER_DIM << " bins can be used along each dimension (define INFOTHEORY_WIDE_BINS for more)" << endl;
+                exit(1);
+            }
             dimIndex += 1; // indexing is 1 in this library
             nBins[dimIndex] = boundaries.Size()+1;
             int bi = nBins[dimIndex]-1;
@@ -214,6 +1029,14 @@ class InfoTools{
                     //cout << bins[r][d][b] << " ";
                 }
             }
+            // set up faster lookup of bins for this dimension
+            for(r=1; r<=nReps; r++){
+                binWidths[r][dimIndex] = equalBinWidth(bins[r][dimIndex]);
+                binsSortedFlag[r][dimIndex] = 1;
+                for(int b=2; b<=bi; b++){
+                    if(bins[r][dimIndex][b] < bins[r][dimIndex][b-1]) binsSortedFlag[r][dimIndex] = 0;
+                }
+            }
             binningInitedFlag[dimIndex] = 1;
         }
 
@@ -236,108 +1059,17 @@ class InfoTools{
         * Data Handler
         *******************/
         //!Identify bin for given datapoint and add to count of points in that bin
-        /*!     dataPoint - TVector with length=dims contains the datapoint to be added
+        /*!     dataPoint - TVector with length=dims contains the datapoint to be added\n
+        *     time - time of the datapoint, only used with a window of some duration (see setWindow)
         */
-        void addDataPoint(TVector<double>& dp){
-            for(int d=1; d<=nDims; d++){
-                if(binningInitedFlag[d] == 0){
-                    cerr << "ERROR: binning has not been specified for dimension " << d-1 << " (0-indexing)" << endl;
-                    exit(1);
-                }
-            }
-            if(dataReadyFlag){
-                cout << "WARNING: Datapoint is being added after existing collapsing binned data. Previous datapoints will be lost." << endl;
-                cout << "All datapoints need to be added first before using any information theoretic tools" << endl;
-            }
+        void addDataPoint(TVector<double>& dp, double time=0.){
+            checkReadyToAdd();
             if(dp.Size() != nDims){
                 cerr << "ERROR: Each datapoint must be of size = total dimensionality = " << nDims << " *** ";
                 cerr << "Skipping this datapoint" << endl;
                 return;
             }
-
-            // renormalizing bounds
-            TVector<double> dataPoint;
-            normalizeBounds(dataPoint, dp);
-
-            dataReadyFlag = 0;
-            totalPoints++;
-            // locate bin and update counts
-            // may need to do for several bin lists depending on shiftedFlag
-            //cout << "addDataPoint " << endl;
-            //cout << "dataInitedFlag " << dataInitedFlag << endl;
-            if(!dataInitedFlag){
-                //cout << "initing data" << endl;
-                for(int r=1; r<=nReps; r++){
-                    binnedData[r].SetBounds(1,BIN_LIMIT,1,nDims+1);
-                    binnedData[r].FillContents(0);
-                }
-                dataInitedFlag = 1;
-            }
-
-            // bin for this dataPoint
-            TVector<double> this_bin;
-            this_bin.SetBounds(1,nDims);
-            this_bin.FillContents(0);
-
-            //cout << "locating bin " << binSizes << endl;
-            // for each rep
-            for(int r=1; r<=nReps; r++){
-                // for each dimension
-                this_bin.FillContents(0);
-                int valid_dBins=0;
-                for(int d=1; d<=nDims; d++){
-                    // for each bin
-                    for(int b=1; b<=nBins[d]; b++){
-                        //cout << bins[r][d][b] << " " << dataPoint[d] << " " << bins[r][d][b]+binSizes[d] << " " ;
-                        //cout << (bins[r][d][b] <= dataPoint[d] && dataPoint[d] < bins[r][d][b]+binSizes[d]) << endl;
-                        if(b == 1){
-                            // just for the last bin check only right margin
-                            if(dataPoint[d] < bins[r][d][1]){
-                                // found bin for particular d
-                                //cout << "dim" << d << " ";
-                                valid_dBins += 1;
-                                this_bin[d] = b;
-                                break;
-                            }
-                        }
-                        else if(b == nBins[d]){
-                            // just for the last bin check only left margin
-                            if(dataPoint[d] >= bins[r][d][b-1]){
-                                // found bin for particular d
-                                //cout << "dim" << d << " ";
-                                valid_dBins += 1;
-                                this_bin[d] = b;
-                                break;
-                            }
-                        }
-                        else{
-                            //for all other bins, check both margins
-                            if(bins[r][d][b-1] <= dataPoint[d] && dataPoint[d] < bins[r][d][b]){
-                                // found bin for particular d
-                                //cout << "dim" << d << " ";
-                                valid_dBins += 1;
-                                this_bin[d] = b;
-                                break;
-                            }
-                        }
-                    }
-                }
-                //cout << "valid_dBins=" << valid_dBins << endl;
-                if(valid_dBins == nDims){
-                    int added = 0;
-                    // increment or insert this_bin at binnedData[r][data_len,:]
-                    //cout << "nRep = " << r << endl;
-                    added = addOrInsertCoords(this_bin,binnedData[r]);
-                    if(added==1){
-                        dataLen++;
-                    }
-                    //cout << added << " " << dataLen << " " << binnedData[r].ColumnSize() << endl;
-                    //cout << "Before finishing " << r << endl;
-                }
-            }
-
-            //cout << "Finished adding point" << endl << endl;
-            //cout << "Data Length = " << dataLen << " Total Points = " << totalPoints << endl;
+            binDataPoint(&dp[dp.LowerBound()], time);
         }
 
         //! Add list of points at a time
@@ -348,20 +1080,527 @@ class InfoTools{
                 addDataPoint(data[d]);
         }
 
-        /*******************
-        * Information tools
-        *******************/
-        //!Returns entropy of var along dims with varIDs==0
-        /*!Example:
-        if dims = 4, 4D datapoints will be added, but if only the first 2 dimensions make up the variable of interest, then set
-        varIDs[1] = 1; varIDs[2] = 1; varIDs[3] = -1; varIDs[4] = -1\n
-        The dims with varID==-1 will be ignored
+        //! Add a block of points stored one after the other in a contiguous array
+        /*!     data - array of nPoints*dims values (double or float), each run of dims values being one datapoint\n
+        *     nPoints - number of datapoints in data\n
+        *     times - array of nPoints times, one for each datapoint, only used with a window of some duration (see setWindow)\n
+        *     nThreads - number of threads the datapoints are binned on, 0 to use all cores.
+        *         Datapoints are added one after another with a window
         */
-        double entropy(TVector<int>& vIDs){
-            if(vIDs.Size() != nDims){
-                cerr << "varIDs argument must be of size = total dimensionality = " << nDims << endl;
-                cerr << "Skipping this call" << endl;
-                return 0.;
+        template<class T>
+        void addData(const T* data, long nPoints, const double* times=NULL, int nThreads=0){
+            if(nPoints <= 0) return;
+            checkReadyToAdd();
+            // a thread for every 16384 datapoints at most
+            nThreads = numThreads(nThreads, nPoints/16384 + 1);
+            if(nThreads == 1 || windowSize > 0 || windowDuration > 0){
+                for(long i=0; i<nPoints; i++){
+                    binDataPoint(data + i*nDims, times ? times[i] : 0.);
+                }
+                return;
+            }
+            binDataParallel(data, nPoints, nThreads);
+        }
+
+        //! Estimate from only the most recent datapoints - older ones are removed as new ones are added
+        /*!     size - maximum number of datapoints, 0 for no limit\n
+        *     duration - datapoints older than duration before the latest one are removed, 0 for no limit.
+        *         Times must then be given with the datapoints, in non-decreasing order\n
+        * Must be set before adding data
+        */
+        void setWindow(long size, double duration=0.){
+            if(totalPoints > 0){
+                cerr << "ERROR: Cannot set a window after datapoints have been added *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            windowSize = size > 0 ? size : 0;
+            windowDuration = duration > 0 ? duration : 0.;
+        }
+
+        //! Keep the bin coordinates of each datapoint, so that null distributions and bootstrap estimates can be computed without binning data again
+        /*! Takes nReps*dims bin coordinates of memory per datapoint. Must be set before adding data.
+        * Not needed with a window, where the datapoints in the window are kept
+        */
+        void keepSamples(){
+            if(totalPoints > 0){
+                cerr << "ERROR: Cannot keep datapoints after they have been added *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            keepSamplesFlag = 1;
+        }
+
+        //!Identify bin for given datapoint and subtract from count of points in that bin
+        /*!     dataPoint - TVector with length=dims contains a datapoint that was added before\n
+        * Bins that no longer have any points are dropped. Not available with a window, where points are removed automatically
+        */
+        void removeDataPoint(TVector<double>& dp){
+            if(!checkReadyToRemove()) return;
+            if(dp.Size() != nDims){
+                cerr << "ERROR: Each datapoint must be of size = total dimensionality = " << nDims << " *** ";
+                cerr << "Skipping this datapoint" << endl;
+                return;
+            }
+            unbinDataPoint(&dp[dp.LowerBound()]);
+        }
+
+        //! Remove a block of points stored one after the other in a contiguous array
+        /*!     data - array of nPoints*dims values (double or float), each run of dims values being a datapoint that was added before\n
+        *     nPoints - number of datapoints in data
+        */
+        template<class T>
+        void removeData(const T* data, long nPoints){
+            if(nPoints <= 0 || !checkReadyToRemove()) return;
+            for(long i=0; i<nPoints; i++){
+                unbinDataPoint(data + i*nDims);
+            }
+        }
+
+        //! Add the datapoints of another object to this one
+        /*!     other - InfoTools with the same dimensionality, number of shifts and bin boundaries\n
+        * Estimates are then the same as if all the datapoints had been added to this object. Not available with a window
+        */
+        void merge(InfoTools& other){
+            if(!sameBinning(other)){
+                cerr << "ERROR: Only objects with the same dimensionality, number of shifts and bin boundaries can be merged *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            if(windowSize > 0 || windowDuration > 0 || other.windowSize > 0 || other.windowDuration > 0){
+                cerr << "ERROR: Objects with a window cannot be merged *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            if(other.totalPoints == 0) return;
+            // a query on other could otherwise collapse (and compact) its bins while they are read
+            other.ensureCollapsed();
+            if(keepSamplesFlag && !other.keepSamplesFlag){
+                cerr << "ERROR: Datapoints of the other object must be kept to be merged into an object that keeps them (see keepSamples) *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            dataReadyFlag = 0;
+            if(&other == this){
+                mergeSelf();
+                return;
+            }
+            if(keepSamplesFlag) sampleBins.insert(sampleBins.end(), other.sampleBins.begin(), other.sampleBins.end());
+            totalPoints += other.totalPoints;
+            initBinnedData();
+            for(int r=1; r<=nReps; r++){
+                SparseHistogram& h = other.binnedData[r];
+                for(int l=0; l<h.size(); l++){
+                    if(h.count(l) != 0) binnedData[r].increment(h.coordinates(l), h.count(l));
+                }
+            }
+            SparseHistogram& h = other.avgBinnedData;
+            for(int l=0; l<h.size(); l++){
+                if(h.count(l) != 0) countAvgBin(h.coordinates(l), h.count(l));
+            }
+            dataLen = avgBinnedData.size();
+        }
+
+        #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        void mergeSelf(){
+            // merge with this object, doubling every count in place and duplicating the kept samples,
+            // without reading from the buffers being appended to
+            if(keepSamplesFlag){
+                size_t kept = sampleBins.size();
+                sampleBins.resize(2*kept);
+                copy(sampleBins.begin(), sampleBins.begin() + kept, sampleBins.begin() + kept);
+            }
+            totalPoints *= 2;
+            for(int r=1; r<=nReps; r++){
+                SparseHistogram& h = binnedData[r];
+                for(int l=0; l<h.size(); l++){
+                    if(h.count(l) != 0) h.add(l, h.count(l));
+                }
+            }
+            SparseHistogram& h = avgBinnedData;
+            for(int l=0; l<h.size(); l++){
+                long long by = h.count(l);
+                if(by == 0) continue;
+                h.add(l, by);
+                noteAvgChange(l, by);
+            }
+        }
+
+        bool sameBinning(InfoTools& other){
+            if(nDims != other.nDims || nReps != other.nReps || bins.Size() != other.bins.Size()) return false;
+            for(int d=1; d<=nDims; d++){
+                if(binningInitedFlag[d] != other.binningInitedFlag[d] || nBins[d] != other.nBins[d]) return false;
+                for(int r=1; r<=bins.Size(); r++){
+                    for(int b=1; b<nBins[d]; b++){
+                        if(bins[r][d][b] != other.bins[r][d][b]) return false;
+                    }
+                }
+            }
+            return true;
+        }
+
+        void checkReadyToAdd(){
+            for(int d=1; d<=nDims; d++){
+                if(binningInitedFlag[d] == 0){
+                    cerr << "ERROR: binning has not been specified for dimension " << d-1 << " (0-indexing)" << endl;
+                    exit(1);
+                }
+            }
+        }
+
+        bool checkReadyToRemove(){
+            checkReadyToAdd();
+            if(windowSize > 0 || windowDuration > 0){
+                cerr << "ERROR: Datapoints are removed automatically from a window *** ";
+                cerr << "Skipping this call" << endl;
+                return false;
+            }
+            return true;
+        }
+
+        template<class T>
+        BinCoord* locateBins(const T* dataPoint){
+            return locateBins(dataPoint, binScratch.data());
+        }
+
+        template<class T>
+        BinCoord* locateBins(const T* dataPoint, BinCoord* pointBins){
+            // bin coordinates of dataPoint for each shift, one after the other (nReps*nDims, 0-indexing), in pointBins
+            // coordinates are 0 along dimensions where the point does not fall in any bin (nan)
+            for(int r=1; r<=nReps; r++){
+                for(int d=1; d<=nDims; d++){
+                    pointBins[(r-1)*nDims + d-1] = locateBin(r,d,dataPoint[d-1]);
+                }
+            }
+            return pointBins;
+        }
+
+        bool validBin(const BinCoord* c) const{
+            for(int d=0; d<nDims; d++){
+                if(c[d] == 0) return false;
+            }
+            return true;
+        }
+
+        template<class T>
+        void binDataPoint(const T* dataPoint, double time=0.){
+            // dataPoint - pointer to dims values of one datapoint (0-indexing)
+            // locate bin and update counts
+            BinCoord* pointBins = locateBins(dataPoint);
+            countPoint(pointBins);
+
+            if(windowSize > 0 || windowDuration > 0){
+                windowBins.insert(windowBins.end(), pointBins, pointBins + nReps*nDims);
+                windowTimes.push_back(time);
+                expireWindow(time);
+            }
+            else if(keepSamplesFlag){
+                sampleBins.insert(sampleBins.end(), pointBins, pointBins + nReps*nDims);
+            }
+            //cout << "Finished adding point" << endl << endl;
+            //cout << "Data Length = " << dataLen << " Total Points = " << totalPoints << endl;
+        }
+
+        void initBinnedData(){
+            //cout << "dataInitedFlag " << dataInitedFlag << endl;
+            if(!dataInitedFlag){
+                //cout << "initing data" << endl;
+                for(int r=1; r<=nReps; r++){
+                    binnedData[r].init(nDims,expectedBins);
+                }
+                avgBinnedData.init(nDims,expectedBins);
+                dataInitedFlag = 1;
+            }
+        }
+
+        void countPoint(const BinCoord* pointBins, int by=1){
+            // add a point (by times) given its bin coordinates for each shift
+            dataReadyFlag = 0;
+            totalPoints += by;
+            initBinnedData();
+
+            // for each rep
+            for(int r=1; r<=nReps; r++){
+                const BinCoord* this_bin = pointBins + (r-1)*nDims;
+                if(validBin(this_bin)){
+                    // increment or insert this_bin in binnedData[r] and in the total across shifts
+                    countBin(r, this_bin, by);
+                }
+            }
+            dataLen = avgBinnedData.size();
+        }
+
+        void countPointInTotal(const BinCoord* pointBins, int by=1){
+            // add a point (by times) to the total across shifts only, which is all that measures are estimated from,
+            // for objects that datapoints are not removed from or merged out of (such as workers)
+            dataReadyFlag = 0;
+            totalPoints += by;
+            initBinnedData();
+            for(int r=1; r<=nReps; r++){
+                const BinCoord* this_bin = pointBins + (r-1)*nDims;
+                if(validBin(this_bin)) countAvgBin(this_bin, by);
+            }
+            dataLen = avgBinnedData.size();
+        }
+
+        template<class T>
+        void binDataParallel(const T* data, long nPoints, int nThreads){
+            // each of nThreads contiguous blocks of datapoints is binned into a separate histogram for each shift,
+            // with the blocks and shifts shared between threads, and the histograms are then merged in block order
+            vector<vector<SparseHistogram> > partial(nThreads, vector<SparseHistogram>(nReps));
+            long blockSize = (nPoints + nThreads - 1)/nThreads;
+            size_t kept = sampleBins.size();
+            if(keepSamplesFlag) sampleBins.resize(kept + (size_t)nPoints*nReps*nDims);
+            parallelFor((long)nThreads*nReps, nThreads, [&](long task, int){
+                int b = task/nReps, r = task%nReps + 1;
+                long start = b*blockSize, end = min(nPoints, start + blockSize);
+                SparseHistogram& h = partial[b][r-1];
+                h.init(nDims, (int)min((long)expectedBins, end - start));
+                vector<BinCoord> this_bin(nDims);
+                for(long i=start; i<end; i++){
+                    const T* dataPoint = data + i*nDims;
+                    for(int d=1; d<=nDims; d++){
+                        this_bin[d-1] = locateBin(r,d,dataPoint[d-1]);
+                    }
+                    if(validBin(this_bin.data())) h.increment(this_bin.data());
+                    if(keepSamplesFlag){
+                        copy(this_bin.begin(), this_bin.end(), &sampleBins[kept + ((size_t)i*nReps + r-1)*nDims]);
+                    }
+                }
+            });
+
+            dataReadyFlag = 0;
+            totalPoints += nPoints;
+            initBinnedData();
+            // binnedData of each shift, then the total across shifts, each merged into by all threads
+            vector<SparseHistogram*> parts;
+            for(int r=1; r<=nReps; r++){
+                parts.clear();
+                for(int b=0; b<nThreads; b++) parts.push_back(&partial[b][r-1]);
+                mergeHistograms(binnedData[r], parts, nThreads, false);
+            }
+            parts.clear();
+            for(int b=0; b<nThreads; b++){
+                for(int r=1; r<=nReps; r++) parts.push_back(&partial[b][r-1]);
+            }
+            mergeHistograms(avgBinnedData, parts, nThreads, true);
+            dataLen = avgBinnedData.size();
+        }
+
+        void mergeHistograms(SparseHistogram& into, vector<SparseHistogram*>& parts, int nThreads, bool total){
+            // add the bins of parts to into as if they were added one part after another - bins new to into are appended in the order
+            // in which they first occur in parts. Bins are sharded by hash between threads, that total the ones already in into and group
+            // the new ones, so that only appending each new bin once is left to one thread. total if into is avgBinnedData
+            into.own();
+            int nParts = parts.size(), nShards = nThreads;
+            vector<long> offsets(nParts+1, 0);
+            for(int p=0; p<nParts; p++) offsets[p+1] = offsets[p] + parts[p]->size();
+            long nRows = offsets[nParts];
+            // hash of each row of the parts (one after another), its row in into (-1 if new) and the rows of each part in each shard
+            vector<unsigned long long> hashes(nRows);
+            vector<int> found(nRows);
+            vector<vector<int> > shardRows((size_t)nParts*nShards);
+            parallelFor(nParts, nThreads, [&](long p, int){
+                SparseHistogram& h = *parts[p];
+                for(int l=0; l<h.size(); l++){
+                    long i = offsets[p] + l;
+                    hashes[i] = into.index.hashCoords(h.coordinates(l));
+                    found[i] = into.index.find(h.coordinates(l), hashes[i]);
+                    shardRows[p*nShards + hashes[i]%nShards].push_back(l);
+                }
+            });
+            // additions to the rows of into, and the new bins of each shard, with a reference from the first occurrence of each
+            vector<long long> additions(into.size(), 0);
+            vector<SparseHistogram> newBins(nShards);
+            vector<long long> firstOf(nRows, -1); // shard + nShards*row in newBins[shard]
+            parallelFor(nShards, nThreads, [&](long s, int){
+                SparseHistogram& g = newBins[s];
+                g.init(into.index.Width());
+                for(int p=0; p<nParts; p++){
+                    SparseHistogram& h = *parts[p];
+                    vector<int>& rows = shardRows[p*nShards + s];
+                    for(size_t k=0; k<rows.size(); k++){
+                        long i = offsets[p] + rows[k];
+                        if(found[i] >= 0){
+                            // each row of into is in one shard
+                            additions[found[i]] += h.count(rows[k]);
+                            continue;
+                        }
+                        int added;
+                        int l = g.increment(h.coordinates(rows[k]), hashes[i], h.count(rows[k]), added);
+                        if(added) firstOf[i] = s + (long long)nShards*l;
+                    }
+                }
+            });
+            // what is left for one thread, in time linear in the rows of into and the new bins
+            for(int l=0; l<(int)additions.size(); l++){
+                if(additions[l] == 0) continue;
+                into.add(l, additions[l]);
+                if(total) noteAvgChange(l, additions[l]);
+            }
+            int nNew = 0;
+            for(int s=0; s<nShards; s++) nNew += newBins[s].size();
+            into.index.reserve(into.size() + nNew);
+            for(long i=0; i<nRows; i++){
+                if(firstOf[i] < 0) continue;
+                SparseHistogram& g = newBins[firstOf[i]%nShards];
+                int l = firstOf[i]/nShards;
+                into.append(g.coordinates(l), hashes[i], g.count(l));
+                if(total) totalAvgPoints += g.count(l);
+            }
+        }
+
+        template<class T>
+        void unbinDataPoint(const T* dataPoint){
+            // dataPoint - pointer to dims values of one datapoint (0-indexing) that was added before
+            BinCoord* pointBins = locateBins(dataPoint);
+            for(int r=1; r<=nReps; r++){
+                BinCoord* this_bin = pointBins + (r-1)*nDims;
+                if(validBin(this_bin) && (!dataInitedFlag || binnedData[r].count(this_bin) < 1)){
+                    cerr << "ERROR: Datapoint to be removed was not added *** ";
+                    cerr << "Skipping this datapoint" << endl;
+                    return;
+                }
+            }
+            uncountPoint(pointBins);
+            if(keepSamplesFlag) forgetSample(pointBins);
+        }
+
+        void forgetSample(const BinCoord* pointBins){
+            // drop the most recently added sample with bin coordinates pointBins, moving the last sample in its place
+            size_t pointSize = nReps*nDims;
+            for(size_t i=sampleBins.size(); i>=pointSize; i-=pointSize){
+                BinCoord* sample = &sampleBins[i-pointSize];
+                if(equal(sample, sample + pointSize, pointBins)){
+                    copy(sampleBins.end() - pointSize, sampleBins.end(), sample);
+                    sampleBins.resize(sampleBins.size() - pointSize);
+                    return;
+                }
+            }
+        }
+
+        void uncountPoint(const BinCoord* pointBins){
+            // remove a point given its bin coordinates for each shift
+            dataReadyFlag = 0;
+            totalPoints--;
+            for(int r=1; r<=nReps; r++){
+                const BinCoord* this_bin = pointBins + (r-1)*nDims;
+                if(validBin(this_bin)){
+                    countBin(r, this_bin, -1);
+                    if(binnedData[r].mostlyEmpty()) binnedData[r].compact();
+                }
+            }
+        }
+
+        void expireWindow(double now){
+            // remove the oldest points until the window is within its size and duration
+            vector<BinCoord> pointBins(nReps*nDims);
+            while(windowTimes.size() > 0
+                  && ((windowSize > 0 && (long)windowTimes.size() > windowSize)
+                      || (windowDuration > 0 && windowTimes.front() <= now - windowDuration))){
+                for(int i=0; i<nReps*nDims; i++){
+                    pointBins[i] = windowBins.front();
+                    windowBins.pop_front();
+                }
+                windowTimes.pop_front();
+                uncountPoint(pointBins.data());
+            }
+        }
+
+        void countBin(int r, const BinCoord* this_bin, int by){
+            // add by to the count of this_bin in binnedData[r] and in the total across shifts
+            binnedData[r].increment(this_bin, by);
+            countAvgBin(this_bin, by);
+        }
+
+        void countAvgBin(const BinCoord* this_bin, long long by){
+            // add by to the count of this_bin in the total across shifts
+            int added;
+            int l = avgBinnedData.increment(this_bin, by, added);
+            noteAvgChange(l, by);
+        }
+
+        void noteAvgChange(int l, long long by){
+            // by has been added to the count of row l of the total across shifts
+            totalAvgPoints += by;
+            if(l < collapsedLen){
+                // note the change for marginals estimated at the last collapse
+                if((int)binChangedFlag.size() < collapsedLen){
+                    binChanges.resize(collapsedLen, 0.);
+                    binChangedFlag.resize(collapsedLen, 0);
+                }
+                if(!binChangedFlag[l]){
+                    binChangedFlag[l] = 1;
+                    changedBins.push_back(l);
+                }
+                binChanges[l] += by;
+            }
+        }
+
+        int locateBin(int r, int d, double x){
+            // returns the bin along dimension d of shift r that x falls in, 0 if there is none (nan)
+            // bin b covers [bins[r][d][b-1], bins[r][d][b]), left most and right most bins are open
+            if(x != x) return 0;
+            TVector<double>& edges = bins[r][d];
+            int nb = nBins[d];
+            if(nb == 1) return 1;
+            int b;
+            if(binWidths[r][d] > 0){
+                // equal interval bins - compute index and correct for rounding at the margins
+                double guess = floor((x - edges[1])/binWidths[r][d]) + 2;
+                b = guess < 1 ? 1 : (guess > nb ? nb : (int)guess);
+                while(b > 1 && x < edges[b-1]) b--;
+                while(b < nb && x >= edges[b]) b++;
+            }
+            else if(binsSortedFlag[r][d]){
+                // binary search for the number of left margins <= x
+                int lo = 1, hi = nb;
+                while(lo < hi){
+                    int mid = (lo+hi)/2;
+                    if(edges[mid] <= x) lo = mid+1;
+                    else hi = mid;
+                }
+                b = lo;
+            }
+            else{
+                // shifted margins can overlap for unequal bins - first bin that x falls in
+                if(x < edges[1]) return 1;
+                for(b=2; b<nb; b++){
+                    if(edges[b-1] <= x && x < edges[b]) return b;
+                }
+                if(x >= edges[nb-1]) return nb;
+                return 0;
+            }
+            return b;
+        }
+
+        double equalBinWidth(TVector<double>& edges){
+            // width of bins if margins in edges are equally spaced, otherwise 0
+            int ne = edges.Size();
+            if(ne < 2) return 0.;
+            double width = (edges[ne]-edges[1])/(ne-1);
+            if(!(width > 0)) return 0.;
+            for(int e=2; e<ne; e++){
+                if(fabs(edges[e] - (edges[1] + (e-1)*width)) > 1e-6*width) return 0.;
+            }
+            return width;
+        }
+        #endif /* DOXYGEN_SHOULD_SKIP_THIS */
+
+        /*******************
+        * Information tools
+        *******************/
+        //!Returns entropy of var along dims with varIDs==0
+        /*!Example:
+        if dims = 4, 4D datapoints will be added, but if only the first 2 dimensions make up the variable of interest, then set
+        varIDs[1] = 1; varIDs[2] = 1; varIDs[3] = -1; varIDs[4] = -1\n
+        The dims with varID==-1 will be ignored
+        */
+        double entropy(TVector<int>& vIDs){
+            if(vIDs.Size() != nDims){
+                cerr << "varIDs argument must be of size = total dimensionality = " << nDims << endl;
+                cerr << "Skipping this call" << endl;
+                return 0.;
             }
 
             TVector<int> varIDs;
@@ -402,7 +1641,9 @@ class InfoTools{
             // parse through each unique data point
             for (int i = 1; i <= p_xy.ColumnSize(); i++)
             {
-                mi += p_xy[i][3]*log2(p_xy[i][3]/(p_xy[i][1]*p_xy[i][2]));
+                // bins may be empty after datapoints have been removed
+                if(p_xy[i][3] > 0)
+                    mi += p_xy[i][3]*log2(p_xy[i][3]/(p_xy[i][1]*p_xy[i][2]));
                 //cout << "from mi = " << p_xy[i][3]*log2(p_xy[i][3]/(p_xy[i][1]*p_xy[i][2])) << endl;
             }
             return mi;
@@ -413,20 +1654,22 @@ class InfoTools{
             // specific info for var values identified by varIDs==0, in si
 
             // ID 0 is the one we want specific information about
-            TVector<TVector<TVector<double> > > px;
+            SpecificProbs px;
             //cout << "in specific info " << endl;
             computeSpecProbs(px, varIDs);
             //cout << " Back in spec info " << endl;
 
-            si.SetBounds(1,px.Size());
+            si.SetBounds(1,px.size());
 
-            for (int x = 1; x <= px.Size(); x++)
+            for (int x = 1; x <= px.size(); x++)
             {
+                double p = px.px[x-1];
                 si[x] = 0.0;
-                for (int y = 1; y <= px[x][2].Size(); y++)
+                for (int y = px.offsets[x-1]; y < px.offsets[x]; y++)
                 {
-                    si[x] += (px[x][3][y]/px[x][1][1]) * log2(px[x][3][y] / (px[x][1][1] * px[x][2][y]));
-                    //cout << px[x][1][1] << " " << px[x][2][y] << " " << px[x][3][y] << " " << px[x][3][y] * log2( px[x][3][y] / (px[x][1][1] * px[x][2][y])) << endl;
+                    // bins may be empty after datapoints have been removed
+                    if(px.pxy[y] > 0)
+                        si[x] += (px.pxy[y]/p) * log2(px.pxy[y] / (p * px.py[y]));
                 }
                 //si[x]=si[x]/px[x][1][1]; //XXX not really specific information
             }
@@ -495,22 +1738,22 @@ class InfoTools{
             mi123 = mutualInfo(vi123);
 
             // other redundant infos
-            TVector<TVector<TVector<double> > > py;
+            TVector<double> py;
             TVector<double> spec12, spec13, spec23;
-            computeSpecProbs(py, viY);
+            computeIndProbs(py, viY);
             specificInfo(spec12, vi12);
             specificInfo(spec13, vi13);
             specificInfo(spec23, vi23);
             for (int l = 1; l <= spec12.Size(); l++){
                 // 2-2 redundant infos
-                r12r13 += py[l][1][1]*(spec12[l]<spec13[l]?spec12[l]:spec13[l]);
-                r13r23 += py[l][1][1]*(spec13[l]<spec23[l]?spec13[l]:spec23[l]);
-                r12r23 += py[l][1][1]*(spec12[l]<spec23[l]?spec12[l]:spec23[l]);
+                r12r13 += py[l]*(spec12[l]<spec13[l]?spec12[l]:spec13[l]);
+                r13r23 += py[l]*(spec13[l]<spec23[l]?spec13[l]:spec23[l]);
+                r12r23 += py[l]*(spec12[l]<spec23[l]?spec12[l]:spec23[l]);
 
                 // 2-3 redundant infos
-                if(spec12[l] <= spec13[l] && spec12[l] <= spec23[l]) r12r13r23 += py[l][1][1]*spec12[l];
-                else if(spec13[l] <= spec12[l] && spec13[l] <= spec23[l]) r12r13r23 += py[l][1][1]*spec13[l];
-                else r12r13r23 += py[l][1][1]*spec23[l];
+                if(spec12[l] <= spec13[l] && spec12[l] <= spec23[l]) r12r13r23 += py[l]*spec12[l];
+                else if(spec13[l] <= spec12[l] && spec13[l] <= spec23[l]) r12r13r23 += py[l]*spec13[l];
+                else r12r13r23 += py[l]*spec23[l];
             }
 
             // estimate synergy
@@ -587,13 +1830,12 @@ class InfoTools{
             }
 
             // set up
-            //TVector<double> py;
-            TVector<TVector<TVector<double> > > py;
+            TVector<double> py;
             TVector<double> siX1;
             TVector<double> siX2;
             TVector<double> siX3;
 
-            computeSpecProbs(py, varIDsY);
+            computeIndProbs(py, varIDsY);
             specificInfo(siX1,varIDsX1);
             specificInfo(siX2,varIDsX2);
             if(multivariateDim == 3){
@@ -605,14 +1847,14 @@ class InfoTools{
             // estimating ri
             if(multivariateDim == 2){
                 for (int l = 1; l <= siX1.Size(); l++){
-                    ri += py[l][1][1]*(siX1[l]<siX2[l]?siX1[l]:siX2[l]);
+                    ri += py[l]*(siX1[l]<siX2[l]?siX1[l]:siX2[l]);
                 }
             }
             if(multivariateDim == 3){
                 for (int l = 1; l <= siX1.Size(); l++){
-                    if(siX1[l] <= siX2[l] && siX1[l] <= siX3[l]) ri += py[l][1][1]*siX1[l];
-                    else if(siX2[l] <= siX1[l] && siX2[l] <= siX3[l]) ri += py[l][1][1]*siX2[l];
-                    else ri += py[l][1][1]*siX3[l];
+                    if(siX1[l] <= siX2[l] && siX1[l] <= siX3[l]) ri += py[l]*siX1[l];
+                    else if(siX2[l] <= siX1[l] && siX2[l] <= siX3[l]) ri += py[l]*siX2[l];
+                    else ri += py[l]*siX3[l];
                 }
             }
             //cout << "returning ri" << endl;
@@ -728,11 +1970,13 @@ class InfoTools{
         }
 
         //! Estimates complete info decomposition in infos, returns
-        /*!     total mutual information about varIDs==0, from varIDs==1 and varIDs==2\n
+        /*!     total mutual information about varIDs==0, from varIDs==1, varIDs==2 (and varIDs==3)\n
         *     unique info about varIDs==0 in varIDs==1\n
         *     unique info about varIDs==0 in varIDs==2\n
-        *     redundant info about varIDs==0, from varIDs==1 and varIDs==2\n
-        *     synergistic info about varIDs==0, from varIDs==1 and varIDs==2\n
+        *     unique info about varIDs==0 in varIDs==3 (only in the case of three sources)\n
+        *     redundant info about varIDs==0, from varIDs==1, varIDs==2 (and varIDs==3)\n
+        *     synergistic info about varIDs==0, from varIDs==1, varIDs==2 (and varIDs==3)\n
+        * Each measure is the same as from the corresponding function, but the probability tables they share are only estimated once\n
         * Set other varIDs of dims to be ignored to -1
         */
         void pid(TVector<int>& vIDs, TVector<double>& infos){
@@ -745,219 +1989,964 @@ class InfoTools{
             TVector<int> varIDs;
             normalizeBounds(varIDs, vIDs);
 
-            TVector<int> varIDsX1, varIDsX2, varCommon;
-            varIDsX1.SetBounds(1,varIDs.Size());
-            varIDsX2.SetBounds(1,varIDs.Size());
-            varCommon.SetBounds(1,varIDs.Size());
+            // making sure there are a target and exactly 2 or 3 sources
+            int nInfos = pidSize(varIDs);
+            if(nInfos == 0){
+                cerr << "For PID measures, there needs to be at least 3 (at most 4) variables identified in varIDs using [0, 1, 2,] or [0, 1, 2, 3] in case of 4" << endl;
+                exit(1);
+            }
+            int multivariateDim = nInfos - 3;
+
+            // p(y) and specific information about each y from every combination of sources
+            TVector<double> py;
+            TVector<int> viY;
+            sourceVarIDs(viY, varIDs, 0);
+            computeIndProbs(py, viY);
+
+            TVector<TVector<double> > si;
+            int nCombinations = (1 << multivariateDim) - 1;
+            si.SetBounds(1,nCombinations);
+            for(int c=1; c<=nCombinations; c++){
+                TVector<int> vi;
+                sourceVarIDs(vi, varIDs, c);
+                specificInfo(si[c], vi);
+            }
+
+            // mutual information from each combination of sources
+            TVector<double> mi;
+            mi.SetBounds(1,nCombinations);
+            for(int c=1; c<=nCombinations; c++){
+                mi[c] = 0.;
+                for(int l=1; l<=py.Size(); l++){
+                    mi[c] += py[l]*si[c][l];
+                }
+            }
 
-            for(int d=1; d<=varIDs.Size(); d++){
-                // spec Y
-                if(varIDs[d]==0) {
-                    varIDsX1[d] = 0;
-                    varIDsX2[d] = 0;
-                    varCommon[d] = 1;
+            if(multivariateDim == 2){
+                // sources 1, 2 and 12 are combinations 1, 2 and 3
+                double redun = expectedMin(py, si[1], si[2]);
+
+                infos.SetBounds(1,5);
+                infos[1] = mi[3];
+                infos[2] = mi[1] - redun; // unique X1
+                infos[3] = mi[2] - redun; // unique X2
+                infos[4] = redun;
+                infos[5] = mi[3] - mi[1] - mi[2] + redun; // because redun is subtracted twice
+            }
+            else{
+                // combinations - 1:1, 2:2, 3:12, 4:3, 5:13, 6:23, 7:123
+                double r12r13 = expectedMin(py, si[3], si[5]);
+                double r13r23 = expectedMin(py, si[5], si[6]);
+                double r12r23 = expectedMin(py, si[3], si[6]);
+                double r12r13r23 = expectedMin(py, si[3], si[5], si[6]);
+
+                infos.SetBounds(1,6);
+                infos[1] = mi[7];
+                infos[2] = mi[1] - expectedMin(py, si[1], si[6]); // unique X1
+                infos[3] = mi[2] - expectedMin(py, si[2], si[5]); // unique X2
+                infos[4] = mi[4] - expectedMin(py, si[4], si[3]); // unique X3
+                infos[5] = expectedMin(py, si[1], si[2], si[4]);
+                infos[6] = mi[7] - (mi[3] + mi[5] + mi[6] - r12r13 - r12r23 - r13r23 + r12r13r23);
+            }
+        }
+
+        //! Evaluate one measure for several varIDs
+        /*! ARGS\n
+        *     measure - one of InfoMeasure\n
+        *     specs - nSpecs*dims varIDs, one set of varIDs after another (0-indexing)\n
+        *     nSpecs - number of sets of varIDs\n
+        *     results - nSpecs values of the measure, one per set of varIDs (0-indexing)\n
+        * Values are the same as from the corresponding function, but marginals shared between the sets of varIDs are estimated once (within the cache budget)
+        */
+        void batch(int measure, const int* specs, long nSpecs, double* results){
+            if(measure < ENTROPY || measure > SYNERGY){
+                cerr << "ERROR: unknown measure " << measure << endl;
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            TVector<int> varIDs(1,nDims);
+            for(long i=0; i<nSpecs; i++){
+                for(int d=1; d<=nDims; d++){
+                    varIDs[d] = specs[i*nDims + d-1];
                 }
-                // in X1
-                if(varIDs[d]==1) {
-                    varIDsX1[d] = 1;
-                    varIDsX2[d] = -1;
-                    varCommon[d] = 0;
+                evaluate(measure, varIDs, results + i);
+            }
+        }
+
+        //! Evaluate one measure at each timestep of data recorded over several trials
+        /*! ARGS\n
+        *     data - array of nTrials*nTimes*dims values (double or float), the datapoint of each timestep of one trial after another\n
+        *     nTrials, nTimes - number of trials and of timesteps in each trial\n
+        *     measure - one of InfoMeasure\n
+        *     varIDs - as for the corresponding function\n
+        *     results - nTimes values of the measure, one per timestep (0-indexing). For PID, the nInfos values from pid for each timestep, one timestep after another\n
+        *     nThreads - number of threads the timesteps are shared between, 0 to use all cores\n
+        * The datapoints of the trials at each timestep are estimated from separately, with the binning of this object. Data already added to this object is not used.
+        * Each datapoint is binned only once.
+        */
+        template<class T>
+        void timeResolved(const T* data, long nTrials, long nTimes, int measure, TVector<int>& varIDs, double* results, int nThreads=0){
+            int nInfos = checkMeasure(measure, ENTROPY, varIDs);
+            if(nInfos == 0) return;
+            checkReadyToAdd();
+            if(nTrials <= 0 || nTimes <= 0) return;
+
+            // bin coordinates of every datapoint, for each shift
+            int pointSize = nReps*nDims;
+            vector<BinCoord> pointBins;
+            locateAllBins(data, nTrials*nTimes, pointBins, nThreads);
+
+            // one object with the same binning for each thread, reused for each timestep
+            nThreads = numThreads(nThreads, nTimes);
+            vector<shared_ptr<InfoTools> > workers;
+            makeWorkers(workers, nThreads);
+            parallelFor(nTimes, nThreads, [&](long t, int w){
+                InfoTools& it = *workers[w];
+                it.clearBinnedData();
+                for(long i=0; i<nTrials; i++){
+                    it.countPointInTotal(&pointBins[(i*nTimes + t)*pointSize]);
                 }
-                // in X2
-                if(varIDs[d]==2) {
-                    varIDsX1[d] = -1;
-                    varIDsX2[d] = 1;
-                    varCommon[d] = 0;
+                it.evaluate(measure, varIDs, results + t*nInfos);
+            });
+        }
+
+        //! Null distribution of a measure, from the datapoints added with the variable identified by 0 in varIDs shuffled across them
+        /*! ARGS\n
+        *     measure - one of InfoMeasure other than ENTROPY\n
+        *     varIDs - as for the corresponding function\n
+        *     nPerms - number of permutations\n
+        *     seed - seed of the random permutations, the same seed giving the same permutations whatever the number of threads\n
+        *     nulls - nPerms values of the measure, one per permutation (0-indexing). For PID, the nInfos values from pid for each permutation, one permutation after another\n
+        *     pValues - fraction of permutations with a value at least as large as the measure on the datapoints, (1+count)/(1+nPerms). For PID, one for each value from pid\n
+        *     nThreads - number of threads the permutations are shared between, 0 to use all cores\n
+        * Datapoints must have been kept as they were added (see keepSamples) or be in a window. They are not binned again.
+        * Returns false, with every null and p-value NAN, if the arguments are not valid or there are no kept datapoints
+        */
+        bool nullDistribution(int measure, TVector<int>& varIDs, long nPerms, unsigned long long seed, double* nulls, double* pValues, int nThreads=0){
+            int nInfos = checkMeasure(measure, MUTUAL_INFO, varIDs);
+            if(nInfos == 0 || nPerms <= 0) return false;
+            vector<BinCoord> windowed;
+            long nPoints;
+            const BinCoord* samples = keptSamples(windowed, nPoints);
+            if(samples == NULL){
+                fill(nulls, nulls + nPerms*nInfos, NAN);
+                fill(pValues, pValues + nInfos, NAN);
+                return false;
+            }
+            int pointSize = nReps*nDims;
+            vector<double> observed(nInfos);
+            evaluate(measure, varIDs, observed.data());
+
+            // coordinates of the shuffled variable, for each shift
+            vector<int> shuffled;
+            for(int r=0; r<nReps; r++){
+                for(int d=1; d<=nDims; d++){
+                    if(varIDs[d] == 0) shuffled.push_back(r*nDims + d-1);
+                }
+            }
+            nThreads = numThreads(nThreads, nPerms);
+            vector<shared_ptr<InfoTools> > workers;
+            makeWorkers(workers, nThreads);
+            parallelFor(nPerms, nThreads, [&](long p, int w){
+                InfoTools& it = *workers[w];
+                mt19937_64 rng = permutationRng(seed, p);
+                vector<long> order(nPoints);
+                for(long i=0; i<nPoints; i++) order[i] = i;
+                shuffle(order.begin(), order.end(), rng);
+                vector<BinCoord> pointBins(pointSize);
+                it.clearBinnedData();
+                for(long i=0; i<nPoints; i++){
+                    const BinCoord* sample = samples + i*pointSize;
+                    const BinCoord* other = samples + order[i]*pointSize;
+                    copy(sample, sample + pointSize, pointBins.begin());
+                    for(size_t k=0; k<shuffled.size(); k++) pointBins[shuffled[k]] = other[shuffled[k]];
+                    it.countPointInTotal(pointBins.data());
+                }
+                it.evaluate(measure, varIDs, nulls + p*nInfos);
+            });
+            for(int k=0; k<nInfos; k++){
+                long atLeast = 0;
+                for(long p=0; p<nPerms; p++){
+                    // values equal up to rounding count as at least as large
+                    if(nulls[p*nInfos + k] >= observed[k] - 1e-12) atLeast++;
                 }
+                pValues[k] = (1. + atLeast)/(1. + nPerms);
             }
+            return true;
+        }
 
-            double mi = mutualInfo(varCommon);
-            double infoX1 = mutualInfo(varIDsX1);
-            double infoX2 = mutualInfo(varIDsX2);
-            double redun = redundantInfo(varIDs);
+        //! Bootstrap distribution of a measure, from resamples (with replacement) of the datapoints added
+        /*! ARGS\n
+        *     measure - one of InfoMeasure\n
+        *     varIDs - as for the corresponding function\n
+        *     nResamples - number of resamples\n
+        *     seed - seed of the random resamples, the same seed giving the same resamples whatever the number of threads\n
+        *     replicates - nResamples values of the measure, one per resample (0-indexing). For PID, the nInfos values from pid for each resample, one resample after another\n
+        *     nThreads - number of threads the resamples are shared between, 0 to use all cores\n
+        * Datapoints must have been kept as they were added (see keepSamples) or be in a window. They are not binned again -
+        * datapoints that fall in the same bins are counted together and each resample draws multinomial counts of these.
+        * Returns false, with every replicate NAN, if the arguments are not valid or there are no kept datapoints
+        */
+        bool bootstrapDistribution(int measure, TVector<int>& varIDs, long nResamples, unsigned long long seed, double* replicates, int nThreads=0){
+            int nInfos = checkMeasure(measure, ENTROPY, varIDs);
+            if(nInfos == 0 || nResamples <= 0) return false;
+            vector<BinCoord> windowed;
+            long nPoints;
+            const BinCoord* samples = keptSamples(windowed, nPoints);
+            if(samples == NULL){
+                fill(replicates, replicates + nResamples*nInfos, NAN);
+                return false;
+            }
+
+            // datapoints with the same bins in every shift, and how many there are of each
+            int pointSize = nReps*nDims;
+            SparseHistogram unique;
+            unique.init(pointSize);
+            for(long i=0; i<nPoints; i++){
+                unique.increment(samples + i*pointSize);
+            }
+
+            nThreads = numThreads(nThreads, nResamples);
+            vector<shared_ptr<InfoTools> > workers;
+            makeWorkers(workers, nThreads);
+            parallelFor(nResamples, nThreads, [&](long b, int w){
+                InfoTools& it = *workers[w];
+                mt19937_64 rng = permutationRng(seed, b);
+                it.clearBinnedData();
+                // multinomial counts, as binomial counts of each group of datapoints out of those not yet drawn
+                long left = nPoints, leftMass = nPoints;
+                for(int j=0; j<unique.size() && left > 0; j++){
+                    long c = unique.count(j), k = left;
+                    if(c < leftMass){
+                        binomial_distribution<long> draw(left, (double)c/leftMass);
+                        k = draw(rng);
+                    }
+                    leftMass -= c;
+                    left -= k;
+                    if(k > 0) it.countPointInTotal(unique.coordinates(j), k);
+                }
+                it.evaluate(measure, varIDs, replicates + b*nInfos);
+            });
+            return true;
+        }
 
-            double synergy = mi - infoX1 - infoX2 + redun; // because redun is subtracted twice
+        #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        int checkMeasure(int measure, int first, TVector<int>& varIDs){
+            // number of values of measure (one of InfoMeasure from first to PID) for varIDs, 0 with an error printed if they are not valid
+            if(measure < first || measure > PID){
+                cerr << "ERROR: unknown measure " << measure << endl;
+                cerr << "Skipping this call" << endl;
+                return 0;
+            }
+            if(varIDs.Size() != nDims){
+                cerr << "varIDs argument must be of size = total dimensionality = " << nDims << endl;
+                cerr << "Skipping this call" << endl;
+                return 0;
+            }
+            int nInfos = measure == PID ? pidSize(varIDs) : 1;
+            if(nInfos == 0){
+                cerr << "For PID measures, there needs to be at least 3 (at most 4) variables identified in varIDs using [0, 1, 2,] or [0, 1, 2, 3] in case of 4" << endl;
+                cerr << "Skipping this call" << endl;
+            }
+            return nInfos;
+        }
 
-            infos.SetBounds(1,5);
-            infos[1] = mi;
-            infos[2] = infoX1 - redun; // unique X1
-            infos[3] = infoX2 - redun; // unique X2
-            infos[4] = redun;
-            infos[5] = synergy;
+        void evaluate(int measure, TVector<int>& varIDs, double* out){
+            // value(s) of measure (one of InfoMeasure) for varIDs, in out
+            switch(measure){
+                case ENTROPY: *out = entropy(varIDs); break;
+                case MUTUAL_INFO: *out = mutualInfo(varIDs); break;
+                case REDUNDANT_INFO: *out = redundantInfo(varIDs); break;
+                case UNIQUE_INFO: *out = uniqueInfo(varIDs); break;
+                case SYNERGY: *out = synergy(varIDs); break;
+                case PID:{
+                    TVector<double> infos;
+                    pid(varIDs, infos);
+                    for(int k=1; k<=infos.Size(); k++) out[k-1] = infos[k];
+                    break;
+                }
+            }
         }
 
-        #ifndef DOXYGEN_SHOULD_SKIP_THIS
-        double transfer_entropy_1_delay(TVector<int> varIDs){
-            // one delay transfer entropy from varIDs==0 to varIDs==1
-            double te = 0.;
+        void makeWorkers(vector<shared_ptr<InfoTools> >& workers, int nThreads){
+            // one object with the same binning and no cache for each thread
+            workers.resize(nThreads);
+            for(int w=0; w<nThreads; w++){
+                workers[w] = shared_ptr<InfoTools>(new InfoTools(nDims, (nReps-1)/2));
+                workers[w]->copyBinning(*this);
+                workers[w]->setCacheBudget(0);
+                workers[w]->denseBudget = denseBudget;
+            }
+        }
 
-            return te;
+        const BinCoord* keptSamples(vector<BinCoord>& windowed, long& nPoints){
+            // bin coordinates of every datapoint, copied to windowed with a window, and their number in nPoints
+            // NULL with an error printed if they were not kept or there are none
+            nPoints = keptSampleCount();
+            if(nPoints < 0){
+                cerr << "ERROR: Datapoints must be kept as they are added, see keepSamples *** ";
+                cerr << "Skipping this call" << endl;
+                return NULL;
+            }
+            if(nPoints == 0){
+                cerr << "ERROR: No datapoints have been added *** ";
+                cerr << "Skipping this call" << endl;
+                return NULL;
+            }
+            if(windowSize > 0 || windowDuration > 0){
+                windowed.assign(windowBins.begin(), windowBins.end());
+                return windowed.data();
+            }
+            return sampleBins.data();
         }
-        #endif /*  DOXYGEN_SHOULD_SKIP_THIS */
 
-        /*******************
-        * Utils
-        *******************/
-        //! Clear all data and start over - create another object instead
-        void clearAllData(){
-            bins.SetSize(0);
-            binnedData.SetSize(0);
-            avgBinnedData.SetSize(0,0);
+        static mt19937_64 permutationRng(unsigned long long seed, long i){
+            // random numbers for the i-th permutation or resample from seed
+            seed_seq seq{(unsigned)seed, (unsigned)(seed >> 32), (unsigned)i, (unsigned)((unsigned long long)i >> 32)};
+            return mt19937_64(seq);
         }
+        #endif /* DOXYGEN_SHOULD_SKIP_THIS */
 
-        #ifndef DOXYGEN_SHOULD_SKIP_THIS
-        void normalizeBounds(TVector<double>& normVec, TVector<double>& vec){
-            normVec.SetBounds(1,vec.Size());
-            int d1=1;
-            for(int d=vec.LowerBound();d<=vec.UpperBound();d++){
-                normVec[d1] = vec[d];
-                d1+=1;
+        //! Number of datapoints kept for nullDistribution and bootstrapDistribution - those in the window with a window, -1 if they are not kept (see keepSamples)
+        long keptSampleCount(){
+            if(windowSize > 0 || windowDuration > 0) return windowBins.size()/(nReps*nDims);
+            if(!keepSamplesFlag) return -1;
+            return sampleBins.size()/(nReps*nDims);
+        }
+
+        //! Number of values returned by pid for varIDs - 5 with two sources, 6 with three and 0 if varIDs are invalid
+        /*! varIDs are valid if they identify the target with 0 and the sources with exactly 1, 2 or 1, 2, 3
+        */
+        int pidSize(TVector<int>& varIDs){
+            bool present[4] = {false, false, false, false};
+            int multivariateDim = 0;
+            for(int d=varIDs.LowerBound(); d<=varIDs.UpperBound(); d++){
+                if(varIDs[d] > 3) return 0;
+                if(varIDs[d] >= 0) present[varIDs[d]] = true;
+                multivariateDim = varIDs[d]>multivariateDim?varIDs[d]:multivariateDim;
+            }
+            for(int v=0; v<=multivariateDim; v++){
+                if(!present[v]) return 0;
             }
+            if(multivariateDim == 2) return 5;
+            if(multivariateDim == 3) return 6;
+            return 0;
         }
-        void normalizeBounds(TVector<int>& normVec, TVector<int>& vec){
-            normVec.SetBounds(1,vec.Size());
-            int d1=1;
-            for(int d=vec.LowerBound();d<=vec.UpperBound();d++){
-                normVec[d1] = vec[d];
-                d1+=1;
+
+        //! Mutual information between the variable identified by 0 in varIDs and the variable identified by 1 lagged behind it, at each of several lags
+        /*! ARGS\n
+        *     data - array of nTrials*nTimes*dims values (double or float), the datapoint of each timestep of one trial after another\n
+        *     nTrials, nTimes - number of trials and of timesteps in each trial\n
+        *     varIDs - list with length=dims, 0 for the dims of the source, 1 for those of the target and -1 for those to be ignored\n
+        *     lags - nLags lags, the mutual information for lag l being between the source at t-l and the target at t, pooled across t and trials.
+        *         Negative lags have the target leading\n
+        *     results - nLags values, one per lag (0-indexing)\n
+        *     nThreads - number of threads the lags are shared between, 0 to use all cores\n
+        * Uses the binning of this object, but not data added to it. Each datapoint is binned only once for all lags.
+        */
+        template<class T>
+        void laggedMutualInfo(const T* data, long nTrials, long nTimes, TVector<int>& varIDs, const int* lags, int nLags, double* results, int nThreads=0){
+            lagSweep(data, nTrials, nTimes, varIDs, lags, nLags, 0, 1, results, nThreads);
+        }
+
+        //! Transfer entropy from the variable identified by 0 in varIDs to the variable identified by 1, at each of several lags
+        /*! ARGS\n
+        *     data, nTrials, nTimes, varIDs - as for laggedMutualInfo\n
+        *     lags - nLags lags (at least 1), the transfer entropy for lag l being the mutual information between the target at t and
+        *         the source at t-l...t-l-sourceHistory+1, given the target at t-1...t-targetHistory\n
+        *     targetHistory, sourceHistory - number of past timesteps of the target and of the source (embedding lengths)\n
+        *     results - nLags values, one per lag (0-indexing)\n
+        *     nThreads - number of threads the lags are shared between, 0 to use all cores\n
+        * Uses the binning of this object, but not data added to it. Each datapoint is binned only once for all lags.
+        */
+        template<class T>
+        void transferEntropy(const T* data, long nTrials, long nTimes, TVector<int>& varIDs, const int* lags, int nLags, int targetHistory, int sourceHistory, double* results, int nThreads=0){
+            for(int i=0; i<nLags; i++){
+                if(lags[i] < 1){
+                    cerr << "ERROR: Lags of transfer entropy must be at least 1 *** ";
+                    cerr << "Skipping this call" << endl;
+                    return;
+                }
             }
+            if(targetHistory < 1 || sourceHistory < 1){
+                cerr << "ERROR: Histories of transfer entropy must be at least 1 *** ";
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            lagSweep(data, nTrials, nTimes, varIDs, lags, nLags, targetHistory, sourceHistory, results, nThreads);
         }
 
-        int addOrInsertCoords(TVector<double>& coordinates, TMatrix<double>& intoMatrix){
-            // given bin indices (i.e. bin index along each dim),
-            // if bin is already in the list populated bins i.e. in intoMatrix
-            //     add 1 to count of number of points in that bin
-            // else
-            //     insert this bin as a new entry to list with number of points = 1
-
-            int breakFlag, foundFlag, added=0;
-            //cout << "in updateBinnedData " << intoMatrix.ColumnSize() << endl;
-
-            int dims = intoMatrix.RowSize()-1;
-            int rowLim = intoMatrix.ColumnSize();
-            // check for bins because that might be less likely
-            foundFlag = 0;
-            for(int l=1; l<=intoMatrix.ColumnSize(); l++){
-                breakFlag = 0;
-                //cout << "\t l=" << l << " intoMatrix[l]=" << intoMatrix[l][1] << " " <<  intoMatrix[l][2] << " coords=" << coordinates << endl;
-                // inserting coordinates - didn't find
-                if(intoMatrix[l][1] == 0){
-                    //cout << "inserting coordinates - didn't find - " << coordinates << endl;
-                    for(int d=1; d<=dims; d++){
-                        intoMatrix[l][d] = coordinates[d];
+        #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        template<class T>
+        void lagSweep(const T* data, long nTrials, long nTimes, TVector<int>& varIDs, const int* lags, int nLags, int targetHistory, int sourceHistory, double* results, int nThreads){
+            // I(target(t); source(t-lag-i), i<sourceHistory | target(t-j), 0<j<=targetHistory) for each lag,
+            // from objects whose dims are copies of the source and target dims at each of those timesteps
+            if(varIDs.Size() != nDims){
+                cerr << "varIDs argument must be of size = total dimensionality = " << nDims << endl;
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            vector<int> sourceDims, targetDims;
+            for(int d=1; d<=nDims; d++){
+                if(varIDs[varIDs.LowerBound() + d-1] == 0) sourceDims.push_back(d-1);
+                if(varIDs[varIDs.LowerBound() + d-1] == 1) targetDims.push_back(d-1);
+            }
+            if(sourceDims.empty() || targetDims.empty()){
+                cerr << "varIDs must identify a source with 0 and a target with 1" << endl;
+                cerr << "Skipping this call" << endl;
+                return;
+            }
+            checkReadyToAdd();
+            if(nTrials <= 0 || nTimes <= 0 || nLags <= 0) return;
+
+            // each dim of the lagged objects is a dim of data at some offset back in time: the target now, its history, then the source history
+            vector<int> laggedDims, offsets;
+            TVector<int> laggedIDs, historyIDs;
+            for(int j=0; j<=targetHistory; j++){
+                for(size_t i=0; i<targetDims.size(); i++){
+                    laggedDims.push_back(targetDims[i]);
+                    offsets.push_back(j);
+                }
+            }
+            int nHistory = laggedDims.size();
+            for(int j=0; j<sourceHistory; j++){
+                for(size_t i=0; i<sourceDims.size(); i++){
+                    laggedDims.push_back(sourceDims[i]);
+                    offsets.push_back(j); // added to the lag
+                }
+            }
+            int lDims = laggedDims.size();
+            laggedIDs.SetBounds(1,lDims);
+            historyIDs.SetBounds(1,lDims);
+            for(int j=0; j<lDims; j++){
+                int now = j < (int)targetDims.size();
+                laggedIDs[j+1] = now ? 0 : 1;
+                historyIDs[j+1] = now ? 0 : (j < nHistory ? 1 : -1);
+            }
+
+            int pointSize = nReps*nDims;
+            vector<BinCoord> pointBins;
+            locateAllBins(data, nTrials*nTimes, pointBins, nThreads);
+
+            nThreads = numThreads(nThreads, nLags);
+            vector<shared_ptr<InfoTools> > workers(nThreads);
+            for(int w=0; w<nThreads; w++){
+                workers[w] = shared_ptr<InfoTools>(new InfoTools(lDims, (nReps-1)/2));
+                workers[w]->copyBinning(*this, laggedDims);
+                workers[w]->denseBudget = denseBudget;
+            }
+            parallelFor(nLags, nThreads, [&](long k, int w){
+                InfoTools& it = *workers[w];
+                int lag = lags[k];
+                // offset of each lagged dim and the timesteps at which all of them are in the trial
+                vector<int> back(offsets);
+                for(int j=nHistory; j<lDims; j++) back[j] += lag;
+                int first = max(0, *max_element(back.begin(), back.end()));
+                long last = nTimes - 1 + min(0, *min_element(back.begin(), back.end()));
+                it.clearBinnedData();
+                vector<BinCoord> lagged(nReps*lDims);
+                for(long trial=0; trial<nTrials; trial++){
+                    for(long t=first; t<=last; t++){
+                        for(int r=0; r<nReps; r++){
+                            for(int j=0; j<lDims; j++){
+                                lagged[r*lDims + j] = pointBins[(trial*nTimes + t - back[j])*pointSize + r*nDims + laggedDims[j]];
+                            }
+                        }
+                        it.countPointInTotal(lagged.data());
                     }
-                    intoMatrix[l][dims+1] = 1;
-                    foundFlag = 1;
-                    added = 1;
-                    //cout << "inserting at " << l << endl;
-                    return 1; // return added
                 }
-                else{
-                    breakFlag = 0;
-                    //cout << "\t" << intoMatrix[l] << ": " << coordinates << endl;
-                    // finding matching coordinate
-                    for(int d=1; d<=dims; d++){
-                        //cout << intoMatrix[l][d] << " " << coordinates[d] << " " << (intoMatrix[l][d] == coordinates[d]) << endl;
-                        if(intoMatrix[l][d] == coordinates[d]){
-                            breakFlag += 1;
+                if(it.totalPoints == 0){
+                    results[k] = NAN;
+                    return;
+                }
+                results[k] = it.mutualInfo(laggedIDs);
+                if(targetHistory > 0) results[k] -= it.mutualInfo(historyIDs);
+            });
+        }
+        #endif /*  DOXYGEN_SHOULD_SKIP_THIS */
+
+        /*******************
+        * All pairs and triples of dims
+        *******************/
+        //! Mutual information between every pair of dims of the datapoints added so far
+        /*! ARGS\n
+        *     results - nDims*nDims values (0-indexing), results[i*nDims + j] being the mutual information between dims i and j
+        *         and results[i*nDims + i] the entropy of dim i\n
+        *     nThreads - number of threads the pairs are shared between, 0 to use all cores\n
+        * The bins of each dim are gathered into a column once, and the points of each pair are counted in one pass over them,
+        * in a flat array of its combinations of bins if that is within the dense budget (see setDenseBudget) and at most 8 times
+        * the number of populated bins, and in a hash table otherwise
+        */
+        void mutualInfoMatrix(double* results, int nThreads=0){
+            vector<vector<BinCoord> > columns;
+            vector<double> counts;
+            binColumns(columns, counts);
+            vector<vector<int> > idOf;
+            vector<vector<double> > dimCounts;
+            vector<double> h;
+            countDims(columns, counts, idOf, dimCounts, h);
+
+            long nPairs = (long)nDims*nDims;
+            nThreads = numThreads(nThreads, nPairs);
+            vector<CountTable> tables(nThreads);
+            parallelFor(nPairs, nThreads, [&](long k, int w){
+                int i = k/nDims, j = k%nDims;
+                if(j < i) return; // filled in with (j,i)
+                double mi = h[i];
+                if(i != j){
+                    countPairs(tables[w], columns, counts, i, j);
+                    mi += h[j] - tableEntropy(tables[w]);
+                }
+                results[(long)i*nDims + j] = results[(long)j*nDims + i] = mi;
+            });
+        }
+
+        //! Synergy about each dim from every pair of other dims, for the datapoints added so far
+        /*! ARGS\n
+        *     results - nDims*nDims*nDims values (0-indexing), results[(i*nDims + j)*nDims + k] being the synergy about dim i
+        *         from dims j and k, as from synergy with varIDs 0 for dim i, 1 for dim j and 2 for dim k. NAN if any two of i, j, k are the same\n
+        *     nThreads - number of threads the targets are shared between, 0 to use all cores\n
+        * The bins of each dim are gathered into a column once. The entropy of each pair of dims, and the mutual and specific information
+        * between each target and each source, are computed once, so that each triple takes one pass over the columns to count its points
+        * (counted as in mutualInfoMatrix)
+        */
+        void synergyTensor(double* results, int nThreads=0){
+            vector<vector<BinCoord> > columns;
+            vector<double> counts;
+            binColumns(columns, counts);
+            vector<vector<int> > idOf;
+            vector<vector<double> > dimCounts;
+            vector<double> h;
+            countDims(columns, counts, idOf, dimCounts, h);
+
+            // entropy of each pair of dims
+            long nPairs = (long)nDims*nDims;
+            vector<double> hPairs(nPairs, 0.);
+            int pairThreads = numThreads(nThreads, nPairs);
+            vector<CountTable> tables(pairThreads);
+            parallelFor(nPairs, pairThreads, [&](long k, int w){
+                int i = k/nDims, j = k%nDims;
+                if(j <= i) return;
+                countPairs(tables[w], columns, counts, i, j);
+                hPairs[k] = hPairs[(long)j*nDims + i] = tableEntropy(tables[w]);
+            });
+
+            nThreads = numThreads(nThreads, nDims);
+            tables.resize(nThreads);
+            vector<vector<double> > mis(nThreads), specs(nThreads);
+            parallelFor(nDims, nThreads, [&](long i, int w){
+                CountTable& table = tables[w];
+                int ni = nBins[i+1]+1, nt = dimCounts[i].size();
+                // mutual information between target i and each source j, and the part of it from each value t of the target,
+                // which is p(t) times the specific information about t from j
+                vector<double>& mi = mis[w];
+                vector<double>& spec = specs[w];
+                mi.assign(nDims, 0.);
+                spec.assign((size_t)nDims*nt, 0.);
+                for(int j=0; j<nDims; j++){
+                    if(j == i) continue;
+                    countPairs(table, columns, counts, i, j);
+                    int nj = nBins[j+1]+1;
+                    for(int g=0; g<table.size(); g++){
+                        double p = table.counts[g]/totalAvgPoints;
+                        if(p <= 0) continue;
+                        int t = idOf[i][table.keys[g]/nj], s = idOf[j][table.keys[g]%nj];
+                        double part = p*log2(p/((dimCounts[i][t]/totalAvgPoints)*(dimCounts[j][s]/totalAvgPoints)));
+                        mi[j] += part;
+                        spec[(size_t)j*nt + t] += part;
+                    }
+                }
+                for(int j=0; j<nDims; j++){
+                    for(int k=0; k<nDims; k++){
+                        long n = ((long)i*nDims + j)*nDims + k;
+                        if(i == j || i == k || j == k){
+                            results[n] = NAN;
+                            continue;
                         }
-                        else{
-                            break;
+                        if(k < j) continue; // filled in with (i,j,k)
+                        int nj = nBins[j+1]+1, nk = nBins[k+1]+1;
+                        const BinCoord *ci = columns[i].data(), *cj = columns[j].data(), *ck = columns[k].data();
+                        table.reset((long long)ni*nj*nk, denseTableFits((long long)ni*nj*nk), counts.size());
+                        for(size_t l=0; l<counts.size(); l++){
+                            table.add(((long long)ci[l]*nj + cj[l])*nk + ck[l], counts[l]);
                         }
-                    }
-                    if(breakFlag==dims){
-                        //cout << "match found - increment coordinate" << endl;
-                        intoMatrix[l][dims+1] += 1;
-                        foundFlag = 1;
-                        //cout << "incrementing at " << l << endl;
-                        return 0; // return added
+                        // I(i;j,k) - I(i;j) - I(i;k) + redundancy, as in synergy3D
+                        double syn = h[i] + hPairs[(long)j*nDims + k] - tableEntropy(table) - mi[j] - mi[k];
+                        for(int t=0; t<nt; t++){
+                            double specJ = spec[(size_t)j*nt + t], specK = spec[(size_t)k*nt + t];
+                            syn += specJ<specK?specJ:specK;
+                        }
+                        results[n] = results[((long)i*nDims + k)*nDims + j] = syn;
                     }
                 }
+            });
+        }
+
+        #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        bool denseTableFits(long long cells){
+            // whether the points of a table with cells combinations of bins are to be counted in a flat array -
+            // it must be within the dense budget and not much larger than the number of populated bins, since it is cleared in full
+            return cells <= denseBudget && cells <= 8LL*dataLen;
+        }
+
+        void binColumns(vector<vector<BinCoord> >& columns, vector<double>& counts){
+            // bins of the populated (averaged) bins along each dim, one column per dim, and the number of points in each
+            ensureCollapsed();
+            columns.assign(nDims, vector<BinCoord>(dataLen));
+            counts.resize(dataLen);
+            for(int l=0; l<dataLen; l++){
+                const BinCoord* c = avgBinnedData.coordinates(l);
+                for(int d=0; d<nDims; d++) columns[d][l] = c[d];
+                counts[l] = avgBinnedData.count(l);
             }
+        }
 
-            //if(foundFlag==0){
-            // ran out of space to add new entry - expand bin size
-            //cerr << "********************************** BIN_LIMIT REACHED **********************************" << endl;
-            //exit(0);
-            int l = rowLim+1;
-            TMatrix<double> _intoMatrix;
-            _intoMatrix.SetBounds(1,rowLim,1,dims+1);
-            for(int i=1;i<=rowLim;i++){
-                for(int d=1; d<=dims+1; d++){
-                    _intoMatrix[i][d] = intoMatrix[i][d];
+        void countDims(vector<vector<BinCoord> >& columns, vector<double>& counts, vector<vector<int> >& idOf, vector<vector<double> >& dimCounts, vector<double>& h){
+            // number of points in each bin of each dim that occurs and the entropy of each dim,
+            // idOf[d][b] being the position of bin b of dim d in dimCounts[d] (-1 if it does not occur)
+            idOf.resize(nDims);
+            dimCounts.resize(nDims);
+            h.assign(nDims, 0.);
+            for(int d=0; d<nDims; d++){
+                idOf[d].assign(nBins[d+1]+1, -1); // bin 0 holds nan values
+                dimCounts[d].clear();
+                for(size_t l=0; l<counts.size(); l++){
+                    int& id = idOf[d][columns[d][l]];
+                    if(id < 0){
+                        id = dimCounts[d].size();
+                        dimCounts[d].push_back(0.);
+                    }
+                    dimCounts[d][id] += counts[l];
                 }
-            }
-            //cout << "expanding BIN_LIMIT" << endl;
-            intoMatrix.SetBounds(1,int(rowLim*1.5),1,dims+1);
-            intoMatrix.FillContents(0.);
-            for(int i=1;i<=rowLim;i++){
-                for(int d=1; d<=dims+1; d++){
-                    intoMatrix[i][d] = _intoMatrix[i][d];
+                for(size_t b=0; b<dimCounts[d].size(); b++){
+                    double p = dimCounts[d][b]/totalAvgPoints;
+                    if(p > 0) h[d] -= p*log2(p);
                 }
             }
+        }
 
-            for(int d=1; d<=dims; d++){
-                intoMatrix[l][d] = coordinates[d];
+        void countPairs(CountTable& table, vector<vector<BinCoord> >& columns, vector<double>& counts, int i, int j){
+            // number of points in each combination of bins of dims i and j, keyed on bin of i * (nBins of j + 1) + bin of j
+            long long cells = (long long)(nBins[i+1]+1)*(nBins[j+1]+1);
+            int nj = nBins[j+1]+1;
+            const BinCoord *ci = columns[i].data(), *cj = columns[j].data();
+            table.reset(cells, denseTableFits(cells), counts.size());
+            for(size_t l=0; l<counts.size(); l++){
+                table.add((long long)ci[l]*nj + cj[l], counts[l]);
             }
-            intoMatrix[l][dims+1] = 1;
-            foundFlag = 1;
-            added = 1;
-            //cout << "Expanded intoMatric to - " << intoMatrix.ColumnSize() << endl;
-            //cout << "binned data is now - " << binnedData[1].ColumnSize() << endl;
-            //cout << binnedData[1] << endl;
-            //}
-            //else{
-                //cout << "found/inserted entry for " << coordinates << endl;
-            //}
-            return added;
+        }
 
+        double tableEntropy(CountTable& table){
+            double entropy = 0.;
+            for(int g=0; g<table.size(); g++){
+                double p = table.counts[g]/totalAvgPoints;
+                if(p > 0) entropy -= p*log2(p);
+            }
+            return entropy;
         }
+        #endif /* DOXYGEN_SHOULD_SKIP_THIS */
 
-        int indexOf(TMatrix<double>& inWhat, TVector<double>& pattern, TVector<int>& atInds){
-            // if a specific pattern (pattern) exists in a matrix (inWhat) at specific colukmns (atInds)
-            //     return its row number
-            // else
-            //     return -1
+        /*******************
+        * Utils
+        *******************/
+        //! Clear all data and start over - create another object instead
+        void clearAllData(){
+            clearBinnedData();
+            bins.SetSize(0);
+            binnedData.SetSize(0);
+        }
 
-            for(int l=1; l<=inWhat.ColumnSize(); l++){
-                int matchCount = 0;
-                // for each value in pattern
-                for(int p=1; p<=pattern.Size(); p++){
-                    if(inWhat[l][atInds[p]]!=pattern[p]){
-                        break;
-                    }
-                    matchCount++;
-                }
-                if(matchCount == pattern.Size()){
-                    // found pattern
-                    return l;
+        //! Set the memory (in bytes) that can be used to keep marginal distributions for reuse across calls, 0 to disable
+        /*! Least recently used marginals are dropped when the budget is exceeded. Marginals are updated with only the bins that new datapoints fall in.
+        */
+        void setCacheBudget(long long bytes){
+            marginalCache.setBudget(bytes);
+        }
+
+        //! Set the largest number of combinations of bins of the dims a measure is computed over, for which points are counted in a flat array
+        /*! Measures over dims with few bins between them (e.g. 10x10x10 bins for a PID) are computed by looking up the bins of points
+        * in a flat array of counts, and those over other dims by searching the populated bins. The choice is made for each call from the number
+        * of bins along its dims. 0 to always search the populated bins (default 262144).
+        * Also limits the dense tables of mutualInfoMatrix and synergyTensor
+        */
+        void setDenseBudget(long combinations){
+            denseBudget = combinations;
+        }
+
+        //! Lock for using this object from several threads at once - methods do not take it themselves
+        /*! Callers hold it shared (SharedAccess) while computing measures or reading the data, and exclusively (ExclusiveAccess)
+        * while adding or removing datapoints, merging, clearing, or changing the binning, window or settings.
+        * Measures computed at the same time then share the data safely. The Python module does this for every call
+        */
+        AccessLock& accessLock(){
+            return access;
+        }
+
+        //! Returns number of times a marginal was found in or missing from the cache, and number of marginals and bytes held by it
+        void getCacheStats(long long& hits, long long& misses, long long& entries, long long& bytes){
+            marginalCache.stats(hits, misses, entries, bytes);
+        }
+
+        //! Write the binning, the datapoints added so far and the window, if any, to a buffer
+        /*!     out - the state is appended to this, and can be read back with fromBytes
+        */
+        void toBytes(vector<char>& out){
+            ByteWriter w(out);
+            writeState(w);
+        }
+
+        //! Create an object from a buffer written by toBytes, returns NULL if it is not one
+        /*!     buf - the buffer\n
+        *     len - its length in bytes
+        */
+        static InfoTools* fromBytes(const char* buf, size_t len){
+            ByteReader rd(buf, len);
+            return readState(rd, false);
+        }
+
+        //! Save the binning, the datapoints added so far and the window, if any, to a file. Returns false if it could not be written
+        /*!     path - file to write, an existing file is replaced once the new one has been written\n
+        * The file has the same contents as toBytes and can be loaded with load
+        */
+        bool save(const char* path){
+            string tmpPath = string(path) + ".tmp";
+            ofstream out(tmpPath.c_str(), ios::binary);
+            if(out){
+                ByteWriter w(out);
+                writeState(w);
+                out.close();
+            }
+            // objects loaded from an existing file keep using its contents after it is replaced
+            if(!out || rename(tmpPath.c_str(), path) != 0){
+                cerr << "ERROR: Could not write " << path << endl;
+                remove(tmpPath.c_str());
+                return false;
+            }
+            return true;
+        }
+
+        //! Create an object from a file written by save, returns NULL if it could not be read
+        /*!     path - the file\n
+        * The file is mapped into memory read-only and its populated bins are used in place, so that loading is
+        * near-instant and processes loading the same file share it. Bins are copied when datapoints are added or removed.
+        * The file must not be changed while the object exists (save replaces rather than changes files)
+        */
+        static InfoTools* load(const char* path){
+            shared_ptr<MappedFile> mapping(new MappedFile());
+            if(!mapping->open(path)){
+                cerr << "ERROR: Could not read " << path << endl;
+                return NULL;
+            }
+            ByteReader rd(mapping->data, mapping->len);
+            InfoTools* it = readState(rd, true);
+            if(it) it->mapping = mapping;
+            return it;
+        }
+
+        //! Averaged binned data as a matrix with the bin coordinates and the (averaged) number of points in each row
+        void getAvgBinnedData(TMatrix<double>& into){
+            ensureCollapsed();
+            avgBinnedData.exportMatrix(into);
+            for(int l=1; l<=into.ColumnSize(); l++){
+                into[l][nDims+1] /= nReps;
+            }
+        }
+
+        #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        void clearBinnedData(){
+            // remove all datapoints, keeping the binning
+            avgBinnedData.init(nDims);
+            marginalCache.clear();
+            changedBins.clear();
+            binChanges.clear();
+            binChangedFlag.clear();
+            dataLen = collapsedLen = 0;
+            totalPoints = totalAvgPoints = 0;
+            dataInitedFlag = dataReadyFlag = 0;
+            windowBins.clear();
+            windowTimes.clear();
+            sampleBins.clear();
+        }
+
+        void writeState(ByteWriter& w){
+            // what toBytes and save write
+            // collapsed first, so that a query at the same time does not compact the bins while they are written
+            ensureCollapsed();
+            w.put(SAVE_MAGIC, 8);
+            w.put((long long) SAVE_VERSION);
+            w.put((long long) sizeof(BinCoord));
+            w.put((long long) nDims);
+            w.put((long long) nReps);
+            // bins of the unshifted binning, the shifted ones are set up from them
+            for(int d=1; d<=nDims; d++){
+                long long inited = binningInitedFlag[d] && bins.Size() > 0;
+                w.put(inited);
+                if(!inited) continue;
+                w.put((long long) nBins[d]);
+                w.put(&bins[1][d][1], nBins[d]-1);
+            }
+            w.put(totalPoints);
+            w.put(totalAvgPoints);
+            w.put((long long) windowSize);
+            w.put(windowDuration);
+            w.put((long long) windowTimes.size());
+            vector<BinCoord> windowed(windowBins.begin(), windowBins.end());
+            w.put(windowed.data(), windowed.size());
+            vector<double> times(windowTimes.begin(), windowTimes.end());
+            w.put(times.data(), times.size());
+            w.put((long long) keepSamplesFlag);
+            w.put((long long) sampleBins.size());
+            w.put(sampleBins.data(), sampleBins.size());
+            // populated bins for each shift and in total, in the order they were first populated
+            for(int r=1; r<=nReps+1; r++){
+                SparseHistogram& h = r <= nReps ? binnedData[r] : avgBinnedData;
+                long long nRows = dataInitedFlag ? h.size() - h.empties : 0;
+                vector<BinCoord> coords;
+                vector<BinCount> counts;
+                coords.reserve(nRows*nDims);
+                counts.reserve(nRows);
+                for(int l=0; nRows > 0 && l<h.size(); l++){
+                    if(h.count(l) == 0) continue;
+                    coords.insert(coords.end(), h.coordinates(l), h.coordinates(l) + nDims);
+                    counts.push_back(h.count(l));
                 }
+                w.put(nRows);
+                w.put(coords.data(), coords.size());
+                w.put(counts.data(), counts.size());
             }
-            return -1;
         }
 
-        double fetchTotalValue(TMatrix<double>& from, TVector<double>& pattern, TVector<int>& atInds, int index){
-            // matches pattern in rows of from at specified atInds columns, and returns the sum of index columns' value of matching row
-            // returns 0 if no match found
-            double totalValue = 0.;
+        static InfoTools* readState(ByteReader& rd, bool inPlace){
+            // new object from what writeState wrote, with its histograms viewing the buffer if inPlace, NULL if it is not valid
+            char magic[8];
+            rd.get(magic, 8);
+            long long version = rd.get<long long>();
+            if(!rd.ok() || memcmp(magic, SAVE_MAGIC, 8) != 0 || version < 1 || version > SAVE_VERSION){
+                cerr << "ERROR: Not a saved InfoTools state" << endl;
+                return NULL;
+            }
+            if(rd.get<long long>() != (long long) sizeof(BinCoord)){
+                cerr << "ERROR: Saved InfoTools state was built with a different INFOTHEORY_WIDE_BINS setting" << endl;
+                return NULL;
+            }
+            long long dims = rd.get<long long>(), reps = rd.get<long long>();
+            InfoTools* it = NULL;
+            if(rd.ok() && dims > 0 && reps > 0 && reps%2 == 1){
+                it = new InfoTools(dims, (reps-1)/2);
+                if(it->readData(rd, inPlace && version == SAVE_VERSION, version)) return it;
+            }
+            cerr << "ERROR: Saved InfoTools state is corrupt" << endl;
+            delete it;
+            return NULL;
+        }
 
-            //cout << "from.RowSize() " << from.ColumnSize() << " " << pattern.Size() << " ";
-            for(int l=1; l<=from.ColumnSize(); l++){
-                int matchCount = 0;
-                // for each value in pattern
-                for(int p=1; p<=pattern.Size(); p++){
-                    if(from[l][atInds[p]]!=pattern[p]){
-                        break;
+        bool readData(ByteReader& rd, bool inPlace, long long version){
+            // the rest of the state, after the dimensionality and number of shifts
+            for(int d=1; d<=nDims && rd.ok(); d++){
+                if(!rd.get<long long>()) continue;
+                long long nb = rd.get<long long>();
+                if(!rd.ok() || nb < 1 || nb > MAX_BINS_PER_DIM) return false;
+                TVector<double> boundaries;
+                boundaries.SetBounds(1,nb-1);
+                if(nb > 1) rd.get(&boundaries[1], nb-1);
+                setBinBoundaries(boundaries, d-1);
+            }
+            totalPoints = rd.get<double>();
+            double avgPoints = rd.get<double>();
+            windowSize = rd.get<long long>();
+            windowDuration = rd.get<double>();
+            long long nWindowed = rd.get<long long>();
+            if(!rd.ok() || nWindowed < 0 || nWindowed > (long long) rd.remaining()) return false;
+            vector<BinCoord> windowed(nWindowed*nReps*nDims);
+            vector<double> times(nWindowed);
+            rd.get(windowed.data(), windowed.size());
+            rd.get(times.data(), times.size());
+            windowBins.assign(windowed.begin(), windowed.end());
+            windowTimes.assign(times.begin(), times.end());
+            keepSamplesFlag = rd.get<long long>();
+            long long nKept = rd.get<long long>();
+            if(!rd.ok() || nKept < 0 || nKept > (long long) rd.remaining()) return false;
+            sampleBins.resize(nKept);
+            rd.get(sampleBins.data(), sampleBins.size());
+            initBinnedData();
+            for(int r=1; r<=nReps+1 && rd.ok(); r++){
+                SparseHistogram& h = r <= nReps ? binnedData[r] : avgBinnedData;
+                long long nRows = rd.get<long long>();
+                if(!rd.ok() || nRows < 0 || nRows > (long long) rd.remaining()) return false;
+                if(inPlace){
+                    const BinCoord* coords = rd.view<BinCoord>(nRows*nDims);
+                    const BinCount* counts = rd.view<BinCount>(nRows);
+                    if(rd.ok()) h.view(nDims, coords, counts, nRows);
+                }
+                else{
+                    // buffer may not be aligned
+                    vector<BinCoord> coords(nRows*nDims);
+                    vector<BinCount> counts(nRows);
+                    rd.get(coords.data(), coords.size());
+                    if(version == 1){
+                        vector<unsigned int> narrow(nRows);
+                        rd.get(narrow.data(), narrow.size());
+                        counts.assign(narrow.begin(), narrow.end());
+                    }
+                    else rd.get(counts.data(), counts.size());
+                    for(long long l=0; l<nRows && rd.ok(); l++){
+                        h.increment(&coords[l*nDims], counts[l]);
                     }
-                    matchCount++;
                 }
-                if(matchCount == pattern.Size()){
-                    // found pattern
-                    totalValue += from[l][index];
+            }
+            totalAvgPoints = avgPoints;
+            dataLen = avgBinnedData.size();
+            return rd.ok();
+        }
+
+        void copyBinning(InfoTools& other){
+            // use the same bins as other
+            bins = other.bins;
+            binWidths = other.binWidths;
+            binsSortedFlag = other.binsSortedFlag;
+            nBins = other.nBins;
+            binningInitedFlag = other.binningInitedFlag;
+        }
+
+        void copyBinning(InfoTools& other, const vector<int>& dimsOf){
+            // use the bins of dim dimsOf[d-1] (0-indexing) of other along each dim d
+            for(int d=1; d<=nDims; d++){
+                int od = dimsOf[d-1] + 1;
+                for(int r=1; r<=nReps; r++){
+                    bins[r][d] = other.bins[r][od];
+                    binWidths[r][d] = other.binWidths[r][od];
+                    binsSortedFlag[r][d] = other.binsSortedFlag[r][od];
                 }
+                nBins[d] = other.nBins[od];
+                binningInitedFlag[d] = other.binningInitedFlag[od];
             }
+        }
 
-            return totalValue;
+        template<class T>
+        void locateAllBins(const T* data, long nPoints, vector<BinCoord>& pointBins, int nThreads){
+            // bin coordinates of each of nPoints datapoints for each shift, one datapoint after another, in pointBins
+            int pointSize = nReps*nDims;
+            pointBins.resize((size_t)nPoints*pointSize);
+            parallelFor(nPoints, numThreads(nThreads, nPoints/1024+1), [&](long i, int){
+                locateBins(data + i*nDims, &pointBins[i*pointSize]);
+            });
+        }
+
+        void normalizeBounds(TVector<double>& normVec, TVector<double>& vec){
+            normVec.SetBounds(1,vec.Size());
+            int d1=1;
+            for(int d=vec.LowerBound();d<=vec.UpperBound();d++){
+                normVec[d1] = vec[d];
+                d1+=1;
+            }
+        }
+        void normalizeBounds(TVector<int>& normVec, TVector<int>& vec){
+            normVec.SetBounds(1,vec.Size());
+            int d1=1;
+            for(int d=vec.LowerBound();d<=vec.UpperBound();d++){
+                normVec[d1] = vec[d];
+                d1+=1;
+            }
         }
 
         void getXYInds(TVector<int>& xInds, TVector<int>& yInds, TVector<int>& xyInds, TVector<int>& xyDims, TVector<int>& varIDs){
@@ -1000,89 +2989,71 @@ class InfoTools{
             }
         }
 
+        void ensureCollapsed(){
+            // collapse binned data if points have been added since the last collapse,
+            // so that several threads can call the information theory tools at once
+            lock_guard<mutex> guard(collapseLock);
+            if(dataReadyFlag==0){
+                collapseBinnedData();
+            }
+        }
+
         void collapseBinnedData(){
-            // After adding all points, before using any infotheory tools,
-            // estimate average shifted bin counts here and
+            // After adding points, before using any infotheory tools,
+            // bring the marginals estimated so far up to date with the points added since the last collapse and
             // set dataReadyFlag
-
-            // average across all binnings
-            TMatrix<double> _avgBinnedData;
-            _avgBinnedData.SetBounds(1,dataLen,1,nDims+1);
-
-            TVector<double> this_bin;
-            this_bin.SetBounds(1,nDims);
-
-            TVector<int> atInds;
-            atInds.SetBounds(1,nDims);
-
-            int avgLen = 1;
-            if(nReps>1){
-                for(int r=1; r<=nReps; r++){
-                    for(int l=1; l<=binnedData[r].ColumnSize(); l++){
-                        if(binnedData[r][l][1] > 0){
-                            //cout << "looping " << l << endl;
-                            for(int d=1; d<=nDims; d++){
-                                this_bin[d] = binnedData[r][l][d];
-                                atInds[d] = d;
-                            }
-                            int binExist = indexOf(_avgBinnedData,this_bin,atInds);
-                            //cout << !binExist << " [" << this_bin << "] ";
-                            if(binExist == -1){
-                                // for each dimension
-                                for(int d=1; d<=nDims; d++){
-                                    //cout << binnedData[r][l][d] << " ";
-                                    _avgBinnedData[avgLen][d] = binnedData[r][l][d];
-                                }
-                                _avgBinnedData[avgLen][nDims+1] = 0;
-                                for(int r=1; r<=nReps; r++){
-                                    double counts = fetchTotalValue(binnedData[r],this_bin,atInds,nDims+1);
-                                    _avgBinnedData[avgLen][nDims+1] += counts;
-                                    //cout << " (" << counts << ") ";
-                                }
-                                _avgBinnedData[avgLen][nDims+1] /= nReps;
-                                //cout << _avgBinnedData[avgLen][nDims+1];
-                                totalAvgPoints += _avgBinnedData[avgLen][nDims+1];
-                                avgLen++;
-                            }
-                        }
-                    }
-                }
-                avgLen--;// removing the last unnecessary ++
-                dataLen = avgLen;
+            // the total across all shifts is kept up to date in avgBinnedData as points are added
+            if(avgBinnedData.mostlyEmpty()){
+                // drop bins that no longer have points, marginals are then estimated afresh
+                avgBinnedData.compact();
+                marginalCache.clear();
             }
-            else{
-                //cout << "nReps else part - dataLen = " << dataLen << " AvgLEn = " << avgLen << endl;
-                avgLen = dataLen;
-                //cout << "nReps else part - dataLen = " << dataLen << " AvgLEn = " << avgLen << endl;
-                //cout << "_avgBinnedData: " << _avgBinnedData.ColumnSize() << " " << _avgBinnedData.RowSize() << endl;
-                //cout << "binnedData: " << binnedData[1].ColumnSize() << " " << binnedData[1].RowSize() << endl;
-                for(int l=1;l<=dataLen;l++){
-                    for(int d=1; d<=nDims+1; d++){
-                        _avgBinnedData[l][d] = binnedData[1][l][d];
-                    }
-                    totalAvgPoints += binnedData[1][l][nDims+1];
-                }
-                //cout << "nReps else part - Done" << endl;
+            else if(!marginalCache.empty()){
+                marginalCache.update(avgBinnedData, changedBins, binChanges);
             }
-
-            avgBinnedData.SetBounds(1,dataLen,1,nDims+1);
-            //cout << "Done creating _avgBinnedData " << avgLen << endl;
-            for(int l=1;l<=dataLen;l++){
-                for(int d=1; d<=nDims+1; d++){
-                    //cout << l << " " << d << " ";
-                    //cout << avgBinnedData[l][d] << " " << _avgBinnedData[l][d] << endl;
-                    avgBinnedData[l][d] = _avgBinnedData[l][d];
-                }
+            for(size_t i=0; i<changedBins.size(); i++){
+                binChanges[changedBins[i]] = 0.;
+                binChangedFlag[changedBins[i]] = 0;
             }
-            //cout << "end of collapse " << avgBinnedData.ColumnSize() << " " << avgBinnedData.RowSize() << endl;
-            //cout << "from collapse " << endl << avgBinnedData << endl;
-
+            changedBins.clear();
+            dataLen = collapsedLen = avgBinnedData.size();
+            //cout << "end of collapse " << avgBinnedData.size() << endl;
 
-            // set flag for data ready and delete binnedData
+            // set flag for data ready
             dataReadyFlag = 1;
-            binnedData.SetSize(0); // XXX unable to delete
             //cout << "Done Collapsing data" << endl;
         }
+        void sourceVarIDs(TVector<int>& vi, TVector<int>& varIDs, int sources){
+            // varIDs with target (varIDs==0) as 0 and all sources in bitmask sources combined as 1,
+            // source k is included if bit k-1 is set
+            vi.SetBounds(1,varIDs.Size());
+            for(int d=1; d<=varIDs.Size(); d++){
+                if(varIDs[d] == 0) vi[d] = 0;
+                else if(varIDs[d] > 0 && (sources & (1 << (varIDs[d]-1)))) vi[d] = 1;
+                else vi[d] = -1;
+            }
+        }
+
+        double expectedMin(TVector<double>& py, TVector<double>& si1, TVector<double>& si2){
+            // sum over y of p(y)*min(si1(y),si2(y))
+            double ri = 0.;
+            for(int l=1; l<=py.Size(); l++){
+                ri += py[l]*(si1[l]<si2[l]?si1[l]:si2[l]);
+            }
+            return ri;
+        }
+
+        double expectedMin(TVector<double>& py, TVector<double>& si1, TVector<double>& si2, TVector<double>& si3){
+            // sum over y of p(y)*min(si1(y),si2(y),si3(y))
+            double ri = 0.;
+            for(int l=1; l<=py.Size(); l++){
+                if(si1[l] <= si2[l] && si1[l] <= si3[l]) ri += py[l]*si1[l];
+                else if(si2[l] <= si1[l] && si2[l] <= si3[l]) ri += py[l]*si2[l];
+                else ri += py[l]*si3[l];
+            }
+            return ri;
+        }
+
         void makeAllVarIDCombinations(TVector<int>& varIDs, TVector<int>& viY, TVector<int>& vi1, TVector<int>& vi2, TVector<int>& vi3, TVector<int>& vi12, TVector<int>& vi23, TVector<int>& vi13, TVector<int>&vi123){
             // makes all varID combinations for 4D data
             viY.SetBounds(1,varIDs.Size());
@@ -1158,279 +3129,128 @@ class InfoTools{
         * Computing probs
         *******************/
         #ifndef DOXYGEN_SHOULD_SKIP_THIS
+        shared_ptr<Marginal> getMarginal(TVector<int>& atInds){
+            // marginal along dims atInds from the cache, computing it if it isn't there
+            vector<int> key(atInds.Size());
+            for(int i=1; i<=atInds.Size(); i++){
+                key[i-1] = atInds[i];
+            }
+            shared_ptr<Marginal> m = marginalCache.get(key);
+            if(!m){
+                m = shared_ptr<Marginal>(new Marginal);
+                marginalize(*m, atInds);
+                m = marginalCache.put(key, m);
+            }
+            return m;
+        }
+
+        void marginalize(Marginal& m, TVector<int>& atInds){
+            // group populated bins by their coordinates along dims atInds, in one pass over avgBinnedData
+            // groups are numbered in the order in which they first occur in avgBinnedData
+            // coordinates are looked up in a flat array if there are few enough combinations of bins along atInds
+            vector<int> sizes(atInds.Size());
+            long combinations = 1;
+            for(int i=1; i<=atInds.Size(); i++){
+                sizes[i-1] = nBins[atInds[i]]+1; // bin 0 holds nan values
+                if(combinations <= denseBudget) combinations *= sizes[i-1];
+            }
+            bool dense = combinations <= denseBudget;
+            m.init(atInds, dense ? 0 : dataLen);
+            if(dense){
+                m.makeDense(sizes);
+                m.group.reserve(dataLen);
+            }
+            m.addBins(avgBinnedData, 0);
+        }
+
         void computeIndProbs(TVector<double>& p_x, TVector<int>& varIDs){
             // compute individual probabilties for all data dimensions have varIDs==0, in p_x
 
-            if(dataReadyFlag==0){
-                collapseBinnedData();
-            }
+            ensureCollapsed();
 
             TVector<int> xInds, yInds, xyDims, xyInds;
             getXYInds(xInds,yInds,xyInds,xyDims,varIDs);
-            int xDim = xyDims[1];
-
-            TVector<double> xpattern;
-            xpattern.SetBounds(1,xDim);
 
-            int uniqueXCounts=1,added;
-            TVector<double> _p_x;
-            _p_x.SetBounds(1,dataLen);
-            TMatrix<double> trackerVar;
-            trackerVar.SetBounds(1,dataLen,1,xDim+1);
-            trackerVar.FillContents(0.);
+            shared_ptr<Marginal> px = getMarginal(xInds);
+            Marginal& mx = *px;
 
-            for(int l=1; l<=dataLen; l++){
-                // construct pattern for x
-                for(int xi=1; xi<=xDim; xi++){
-                    xpattern[xi] = avgBinnedData[l][xInds[xi]];
-                }
-                //cout << xpattern << " ";
-                // see if we have already seen this pattern
-                added = addOrInsertCoords(xpattern,trackerVar);
-                if(added==1){
-                    //cout << "is new" << endl;
-                    // new x pattern
-                    _p_x[uniqueXCounts] = fetchTotalValue(avgBinnedData,xpattern,xInds,nDims+1)/totalAvgPoints;
-                    uniqueXCounts++;
-                }
-                //else{
-                //    cout << "is old" << endl;
-                //}
-            }
-
-            uniqueXCounts--;
-            // write into actual TVec
-            p_x.SetBounds(1,uniqueXCounts);
-            for(int xi=1; xi<=uniqueXCounts; xi++){
-                p_x[xi] = _p_x[xi];
+            p_x.SetBounds(1,mx.size());
+            for(int xi=1; xi<=mx.size(); xi++){
+                p_x[xi] = mx.counts[xi-1]/totalAvgPoints;
             }
             //cout << "p_x " << endl << p_x << endl;
         }
 
         void computeJointProbs(TMatrix<double>& p_xy, TVector<int>& varIDs){
             // Compute joint probabilties for data dims given by varIDs==0 and varIDs==1, in p_xy
+            // one row for each unique (x,y) with p(x), p(y) and p(x,y)
 
-            if(dataReadyFlag==0){
-                collapseBinnedData();
-            }
-            //cout << "from computeJointProbs " << endl << avgBinnedData << endl;
+            ensureCollapsed();
             //cout << "Totals = " << dataLen << " " << totalAvgPoints << endl;
 
             TVector<int> xInds, yInds, xyDims, xyInds;
             getXYInds(xInds,yInds,xyInds,xyDims,varIDs);
-            int xDim = xyDims[1];
-            int yDim = xyDims[2];
 
-            //cout << "XYInds " << xInds << "==" << yInds << "==" << xyInds << endl;
-            TVector<double> xypattern;
-            xypattern.SetBounds(1,xDim+yDim);
-            TVector<double> xpattern;
-            xpattern.SetBounds(1,xDim);
-            TVector<double> ypattern;
-            ypattern.SetBounds(1,yDim);
-
-            int uniqueXYcounts=1,added;
-            TMatrix<double> _p_xy;
-            _p_xy.SetBounds(1,dataLen,1,3);
-            TMatrix<double> trackerVar;
-            trackerVar.SetBounds(1,dataLen,1,xDim+yDim+1);
-            trackerVar.FillContents(0.);
-            //cout << "Total points = " << totalPoints << endl;
-            //cout << "Total Average points = " << totalAvgPoints << endl;
-            // go through whole list and compute the probs
-            for(int l=1; l<=avgBinnedData.ColumnSize(); l++){
-                //for(int d=1; d<=nDims+1; d++)
-                    //cout << avgBinnedData[l][d] << " ";
-                // construct pattern for x
-                int xyi=1;
-                for(int i=1; i<=varIDs.Size(); i++){
-                    if(varIDs[i]==0 || varIDs[i]==1){
-                        xypattern[xyi] = avgBinnedData[l][i];
-                        xyi++;
-                    }
-                }
-                //cout << "xypattern = " << xypattern << endl;
-                // will add this pattern to trackerVar if it already doesnt exist
-                added = addOrInsertCoords(xypattern,trackerVar);
-                if(added==1){
-                    // then we haven't looked at this combination xbin and ybin
-                    // so insert it into _p_xy
-                    _p_xy[uniqueXYcounts][3] = fetchTotalValue(avgBinnedData,xypattern,xyInds,nDims+1)/totalAvgPoints;
-
-                    // construct pattern for x
-                    for(int xi=1; xi<=xDim; xi++){
-                        xpattern[xi] = avgBinnedData[l][xInds[xi]];
-                    }
-                    _p_xy[uniqueXYcounts][1] = fetchTotalValue(avgBinnedData,xpattern,xInds,nDims+1)/totalAvgPoints;
-
-                    // construct pattern for y
-                    for(int yi=1; yi<=yDim; yi++){
-                        ypattern[yi] = avgBinnedData[l][yInds[yi]];
-                    }
-                    _p_xy[uniqueXYcounts][2] = fetchTotalValue(avgBinnedData,ypattern,yInds,nDims+1)/totalAvgPoints;
+            shared_ptr<Marginal> px = getMarginal(xInds), py = getMarginal(yInds), pxy = getMarginal(xyInds);
+            Marginal &mx = *px, &my = *py, &mxy = *pxy;
 
+            p_xy.SetBounds(1,mxy.size(),1,3);
+            // first row with each (x,y) gives its x and y
+            int uniqueXYcounts = 0;
+            for(int l=0; l<dataLen; l++){
+                if(mxy.group[l] == uniqueXYcounts){
                     uniqueXYcounts++;
+                    p_xy[uniqueXYcounts][1] = mx.counts[mx.group[l]]/totalAvgPoints;
+                    p_xy[uniqueXYcounts][2] = my.counts[my.group[l]]/totalAvgPoints;
+                    p_xy[uniqueXYcounts][3] = mxy.counts[mxy.group[l]]/totalAvgPoints;
                 }
-                //cout << _p_xy[l][1] << " " << _p_xy[l][2] << " " << _p_xy[l][3] << endl;
-            }
-            //cout << "trackerVar..." << endl << trackerVar << endl;
-
-            uniqueXYcounts--;
-            p_xy.SetBounds(1,uniqueXYcounts,1,3);
-            for(int l=1; l<=uniqueXYcounts; l++){
-                for(int d=1; d<=3; d++)
-                    p_xy[l][d] = _p_xy[l][d];
             }
 
             //cout << "Done" << endl << p_xy <<endl;
         }
 
-        void computeSpecProbs(TVector<TVector<TVector<double> > >& p_x, TVector<int>& varIDs){
-            if(dataReadyFlag==0){
-                collapseBinnedData();
-            }
-            // p_x :TVector: reference to object to populate and return
+        void computeSpecProbs(SpecificProbs& p_x, TVector<int>& varIDs){
+            ensureCollapsed();
+            // p_x :SpecificProbs: reference to object to populate and return
             // varIDs :TVector: identifiers for dims of data
-            // returns matrix with three columns
+            // populates, in the order in which x values occur in avgBinnedData
             //    p(x) :double: for each value of x for which specific prob is computed
-            //    p(y) :TVector: for all y, under this value of x, its p(y), NOT p(y\x)
-            //    p(x,y) :TVector: for each X=x, and all y, this is p(X=x,y)
-
-            //cout << "from computeSpecProbs " << endl << avgBinnedData << endl;
-
-            //cout << "in compute probs - " << dataReadyFlag << endl;
-            TVector<TVector<TVector<double> > > _p_x;
-            _p_x.SetBounds(1,dataLen);
-            for(int l=1; l<=dataLen; l++){
-                _p_x[l].SetBounds(1,3);
-                _p_x[l][1].SetBounds(1,1);
-                _p_x[l][2].SetBounds(1,dataLen);
-                _p_x[l][3].SetBounds(1,dataLen);
-                _p_x[l][1].FillContents(0.);
-                _p_x[l][2].FillContents(0.);
-                _p_x[l][3].FillContents(0.);;
-            }
+            //    p(y) :for all y that occur with this value of x, its p(y), NOT p(y\x)
+            //    p(x,y) :for each X=x, and all y that occur with it, this is p(X=x,y)
 
             TVector<int> xInds, yInds, xyInds, xyDims;
             getXYInds(xInds,yInds,xyInds,xyDims,varIDs);
-            int xDim = xyDims[1];
-            int yDim = xyDims[2];
             //cout << "XYInds " << xInds << "==" << yInds << "==" << xyInds << endl;
 
-            int uniqueXcounts = 1;
-            int added, xyAdded;
-
-            TMatrix<double> trackerVar;
-            trackerVar.SetBounds(1,dataLen,1,xDim+1);
-            trackerVar.FillContents(0.);
-
-            TMatrix<double> xytrackerVar;
-            xytrackerVar.SetBounds(1,dataLen,1,xDim+yDim+1);
-            xytrackerVar.FillContents(0.);
-
-            TVector<int> uniqueXYcounts;
-            uniqueXYcounts.SetBounds(1,dataLen);
-            uniqueXYcounts.FillContents(2.); // since it will only be used from idnex of 2 onwards
-
-            TVector<double> this_xbin,this_ybin,this_xybin;
-            TVector<int> trackDim;
-            this_xbin.SetBounds(1,xDim);
-            trackDim.SetBounds(1,xDim);
-            this_ybin.SetBounds(1,yDim);
-            this_xybin.SetBounds(1,xDim+yDim);
-
-            //cout << "dataLen = " << dataLen << endl;
-
-            for(int l=1; l<=dataLen; l++){
-                //cout << "********************** " << l << endl;
-                // spec x
-                for(int xi=1; xi<=xDim; xi++){
-                    this_xbin[xi] = avgBinnedData[l][xInds[xi]];
-                    trackDim[xi] = xi;
+            shared_ptr<Marginal> px = getMarginal(xInds), py = getMarginal(yInds), pxy = getMarginal(xyInds);
+            Marginal &mx = *px, &my = *py, &mxy = *pxy;
+
+            // number of (x,y) pairs for each x
+            p_x.px.resize(mx.size());
+            p_x.offsets.assign(mx.size()+1, 0);
+            int uniqueXYseen = 0;
+            for(int l=0; l<dataLen; l++){
+                if(mxy.group[l] == uniqueXYseen){
+                    p_x.offsets[mx.group[l]+1]++;
+                    uniqueXYseen++;
                 }
-                //cout << this_xbin << endl;
-
-                for(int yi=1; yi<=yDim; yi++){
-                    this_ybin[yi] = avgBinnedData[l][yInds[yi]];
-                }
-
-                int index=1;
-                for(int i=1; i<=varIDs.Size(); i++){
-                    if(varIDs[i]==0 || varIDs[i]==1){
-                        this_xybin[index] = avgBinnedData[l][i];
-                        index++;
-                    }
-                }
-
-                //cout << "Sizes - " << this_xbin.Size() << " " << trackerVar.RowSize() << endl;
-
-                // these x coordinates are inserted or added into trackerVar
-                added = addOrInsertCoords(this_xbin,trackerVar);
-                //cout << "added = " << added << " unqCounts = " << uniqueXcounts << endl;
-                if(added==1){
-                    //cout << "new xbin " << this_xbin << endl;
-                    // then this is the first occurence of this bin
-                    // so add it and add the corresponding y
-                    ///_p_x[uniqueXcounts].SetBounds(1,dataLen);
-                    // prob of x
-                    //_p_x[uniqueXcounts][1].SetBounds(1,1);
-                    _p_x[uniqueXcounts][1][1] = fetchTotalValue(avgBinnedData,this_xbin,xInds,nDims+1)/totalAvgPoints;
-                    //cout << "added px " << endl;
-
-                    //_p_x[uniqueXcounts][2].SetBounds(1,dataLen);
-                    _p_x[uniqueXcounts][2][1] = fetchTotalValue(avgBinnedData,this_ybin,yInds,nDims+1)/totalAvgPoints;
-                    //cout << "added py " << endl;
-
-                    //_p_x[uniqueXcounts][3].SetBounds(1,dataLen);
-                    _p_x[uniqueXcounts][3][1] = fetchTotalValue(avgBinnedData,this_xybin,xyInds,nDims+1)/totalAvgPoints;
-                    //cout << "added pxy " << endl;
-
-                    xyAdded = addOrInsertCoords(this_xybin,xytrackerVar);
-                    //cout << "xytrackerVar" << endl << xytrackerVar << endl;
-                    //cout << "*************" << endl;
-                    uniqueXcounts++;
-                }
-                else{
-                    //cout << "existing xbin " << this_xybin << " ";
-                    //cout << this_xbin << endl;
-                    //cout << trackerVar << endl;
-                    // this bin has alrady occured before
-                    // find index of where it was
-                    xyAdded = addOrInsertCoords(this_xybin,xytrackerVar);
-                    if(xyAdded==1){
-                        int ind = indexOf(trackerVar,this_xbin,trackDim);
-                        // get its py index
-                        //int pyInd = trackerVar[ind][xDim+1];
-                        //cout << "and also new xybin to be inserted at " << uniqueXYcounts[ind] << " of " << ind << endl;
-                        //cout << ind << " " << pyInd << " " << _p_x.ColumnSize() << " " << _p_x[ind][2].Size() << " " << dataLen << endl;
-                        _p_x[ind][2][uniqueXYcounts[ind]] = fetchTotalValue(avgBinnedData,this_ybin,yInds,nDims+1)/totalAvgPoints;
-                        _p_x[ind][3][uniqueXYcounts[ind]] = fetchTotalValue(avgBinnedData,this_xybin,xyInds,nDims+1)/totalAvgPoints;
-                        uniqueXYcounts[ind]++;
-                    }
-                    else{
-                        //cout << endl;
-                    }
-                    //cout << "xytrackerVar" << endl << xytrackerVar << endl;
-                    //cout << "*************" << endl;
-                    //trackerVar[ind][xDim+1]++; // XXX check this
-                }
-                //cout << "********************** " << l << endl << _p_x << endl << "********************** " << endl;
-            }
-            uniqueXcounts--;
-
-            // could now shorten all arrays - p_x, p_x[i][2] and p_x[i][3]
-            p_x.SetBounds(1,uniqueXcounts);
-            //cout <<  _p_x[uniqueXcounts][1][1] << endl;
-            for(int l=1; l<=uniqueXcounts; l++){
-                p_x[l].SetBounds(1,3);
-                p_x[l][1].SetBounds(1,1);
-                p_x[l][1][1] = _p_x[l][1][1];
-                //cout << "p_x[" << l << "][1][1] = " << _p_x[l][1][1] <<endl;
-                for(int d=2; d<=3; d++){
-                    p_x[l][d].SetBounds(1,uniqueXYcounts[l]-1);
-                    for(int i=1; i<=uniqueXYcounts[l]-1; i++){
-                        p_x[l][d][i] =_p_x[l][d][i];
-                    }
+            }
+            for(int x=0; x<mx.size(); x++){
+                p_x.px[x] = mx.counts[x]/totalAvgPoints;
+                p_x.offsets[x+1] += p_x.offsets[x];
+            }
+
+            // fill in each (x,y) pair under its x in order of first occurence
+            vector<int> next(p_x.offsets.begin(), p_x.offsets.end()-1);
+            p_x.py.resize(mxy.size());
+            p_x.pxy.resize(mxy.size());
+            uniqueXYseen = 0;
+            for(int l=0; l<dataLen; l++){
+                if(mxy.group[l] == uniqueXYseen){
+                    int i = next[mx.group[l]]++;
+                    p_x.py[i] = my.counts[my.group[l]]/totalAvgPoints;
+                    p_x.pxy[i] = mxy.counts[mxy.group[l]]/totalAvgPoints;
+                    uniqueXYseen++;
                 }
             }
         }
@@ -1,107 +1,773 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
 #include "VectorMatrix.h"
 #include "InfoTools.h"
 
-extern "C"
-{
-    // __init__ or constructor
-    InfoTools* InfoTools_new(int dims, int nreps){return new InfoTools(dims, nreps);}
+// InfoTools exposed to Python as infotheoryClass.InfoTools
+// methods take positional arguments only (fast calls) and have the same names as in InfoTools.h
 
-    // destructor
-    void delete_instance_of_class(InfoTools* ptr){
-        try{
-            delete ptr;
-        }
-        catch (const std::exception& e) {
-            std::cout << "Exception caught while trying to delete pointer " << std::endl << e.what() << std::endl;
+typedef struct {
+    PyObject_HEAD
+    InfoTools* it;
+} PyInfoTools;
+
+static PyTypeObject PyInfoToolsType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "infotheoryClass.InfoTools", // tp_name
+    sizeof(PyInfoTools),         // tp_basicsize
+};
+
+/****************
+local utils
+****************/
+static int check_nargs(const char* name, Py_ssize_t nargs, Py_ssize_t min, Py_ssize_t max){
+    // returns 0 with an exception set if the number of arguments is not in [min, max]
+    if(nargs < min || nargs > max){
+        PyErr_Format(PyExc_TypeError, "%s takes %zd to %zd arguments (%zd given)", name, min, max, nargs);
+        return 0;
+    }
+    return 1;
+}
+
+static int to_tvector_int(TVector<int> &linkerList, PyObject* arg){
+    // copy a sequence of ints to a tvector, returns 0 with an exception set if it isn't one
+    PyObject* seq = PySequence_Fast(arg, "expected a sequence of ints");
+    if(seq == NULL) return 0;
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(seq);
+    PyObject** items = PySequence_Fast_ITEMS(seq);
+    linkerList.SetBounds(1,count);
+    for (Py_ssize_t i=0; i<count; i++) {
+        linkerList[i+1] = PyLong_AsLong(items[i]);
+    }
+    Py_DECREF(seq);
+    return !PyErr_Occurred();
+}
+
+static int to_tvector_double(TVector<double> &linkerList, PyObject* arg){
+    // copy a sequence of numbers to a tvector, returns 0 with an exception set if it isn't one
+    PyObject* seq = PySequence_Fast(arg, "expected a sequence of numbers");
+    if(seq == NULL) return 0;
+    Py_ssize_t count = PySequence_Fast_GET_SIZE(seq);
+    PyObject** items = PySequence_Fast_ITEMS(seq);
+    linkerList.SetBounds(1,count);
+    for (Py_ssize_t i=0; i<count; i++) {
+        linkerList[i+1] = PyFloat_AsDouble(items[i]);
+    }
+    Py_DECREF(seq);
+    return !PyErr_Occurred();
+}
+
+static int get_data_buffer(InfoTools* it, Py_buffer* view, PyObject* data, int ndim){
+    // view of data as a C-contiguous buffer of float64 or float32 with ndim dimensions, the last one being dims
+    // returns 0 with an exception set if data is not one
+    if(PyObject_GetBuffer(data, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0){
+        return 0;
+    }
+    if(view->ndim != ndim || view->shape[ndim-1] != it->getNumDims()){
+        if(ndim == 2) PyErr_SetString(PyExc_ValueError, "data must be 2D with shape (number_of_datapoints, dims)");
+        else PyErr_SetString(PyExc_ValueError, "data must be 3D with shape (number_of_trials, number_of_timesteps, dims)");
+    }
+    else if(strcmp(view->format, "d") != 0 && strcmp(view->format, "f") != 0){
+        PyErr_SetString(PyExc_TypeError, "data must be float64 or float32");
+    }
+    else{
+        return 1;
+    }
+    PyBuffer_Release(view);
+    return 0;
+}
+
+static int get_results_buffer(Py_buffer* view, PyObject* results, Py_ssize_t size){
+    // view of results as a writable C-contiguous float64 buffer of size values
+    // returns 0 with an exception set if results is not one
+    if(PyObject_GetBuffer(results, view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT | PyBUF_WRITABLE) != 0){
+        return 0;
+    }
+    if(strcmp(view->format, "d") != 0 || view->len != size*(Py_ssize_t)sizeof(double)){
+        PyErr_SetString(PyExc_ValueError, "results must be float64 with one value for each result");
+        PyBuffer_Release(view);
+        return 0;
+    }
+    return 1;
+}
+
+/****************
+constructor and destructor
+****************/
+static PyObject* PyInfoTools_new(PyTypeObject* type, PyObject* args, PyObject* kwds){
+    // it is created here and not in __init__, so that it is never NULL, and is not replaced under threads using it
+    static const char* kwlist[] = {"dims", "nreps", "expected_bins", NULL};
+    int dims, nreps = 0, expectedBins = 0;
+    if(!PyArg_ParseTupleAndKeywords(args, kwds, "i|ii", (char**) kwlist, &dims, &nreps, &expectedBins)){
+        return NULL;
+    }
+    PyInfoTools* self = (PyInfoTools*) type->tp_alloc(type, 0);
+    if(self == NULL) return NULL;
+    self->it = new InfoTools(dims, nreps, expectedBins);
+    return (PyObject*) self;
+}
+
+static void PyInfoTools_dealloc(PyInfoTools* self){
+    delete self->it;
+    Py_TYPE(self)->tp_free((PyObject*) self);
+}
+
+/****************
+inspection tools
+****************/
+static PyObject* PyInfoTools_getNumDims(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("getNumDims", nargs, 0, 0)) return NULL;
+    return PyLong_FromLong(self->it->getNumDims());
+}
+
+static PyObject* PyInfoTools_displayConfig(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("displayConfig", nargs, 0, 0)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->displayConfig();
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_displaySnapshot(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("displaySnapshot", nargs, 0, 0)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->displaySnapshot();
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+/****************
+binning methods
+****************/
+static PyObject* PyInfoTools_setEqualIntervalBinning(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // nbins, mins, maxs
+    if(!check_nargs("setEqualIntervalBinning", nargs, 3, 3)) return NULL;
+    TVector<int> t_nbins;
+    TVector<double> t_mins, t_maxs;
+    if(!to_tvector_int(t_nbins, args[0]) || !to_tvector_double(t_mins, args[1]) || !to_tvector_double(t_maxs, args[2])){
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->setEqualIntervalBinning(t_nbins, t_mins, t_maxs);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_setBinBoundaries(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // boundaries, dimIndex
+    if(!check_nargs("setBinBoundaries", nargs, 2, 2)) return NULL;
+    TVector<double> t_boundaries;
+    if(!to_tvector_double(t_boundaries, args[0])) return NULL;
+    int dimIndex = PyLong_AsLong(args[1]);
+    if(PyErr_Occurred()) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->setBinBoundaries(t_boundaries, dimIndex);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+/****************
+data handlers
+****************/
+static PyObject* PyInfoTools_addDataPoint(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // dataPoint, [time]
+    if(!check_nargs("addDataPoint", nargs, 1, 2)) return NULL;
+    TVector<double> t_dataPoint;
+    if(!to_tvector_double(t_dataPoint, args[0])) return NULL;
+    double time = nargs > 1 ? PyFloat_AsDouble(args[1]) : 0.;
+    if(PyErr_Occurred()) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->addDataPoint(t_dataPoint, time);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_addData(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // data - C-contiguous 2D buffer of float64 or float32 with shape (number_of_datapoints, dims)
+    // [times] - None or C-contiguous 1D buffer of float64 with one time per datapoint
+    // [nThreads] - number of threads to bin on, 0 to use all cores
+    if(!check_nargs("addData", nargs, 1, 3)) return NULL;
+    int nThreads = nargs > 2 ? PyLong_AsLong(args[2]) : 0;
+    if(PyErr_Occurred()) return NULL;
+    Py_buffer view, t_view;
+    if(!get_data_buffer(self->it, &view, args[0], 2)) return NULL;
+    const double* t_times = NULL;
+    if(nargs > 1 && args[1] != Py_None){
+        if(!get_results_buffer(&t_view, args[1], view.shape[0])){
+            PyBuffer_Release(&view);
+            return NULL;
         }
+        t_times = (const double*) t_view.buf;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    if(strcmp(view.format, "d") == 0){
+        self->it->addData((const double*) view.buf, (long) view.shape[0], t_times, nThreads);
+    }
+    else{
+        self->it->addData((const float*) view.buf, (long) view.shape[0], t_times, nThreads);
+    }
+    Py_END_ALLOW_THREADS
+    if(t_times) PyBuffer_Release(&t_view);
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_setWindow(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // size, [duration]
+    if(!check_nargs("setWindow", nargs, 1, 2)) return NULL;
+    long size = PyLong_AsLong(args[0]);
+    double duration = nargs > 1 ? PyFloat_AsDouble(args[1]) : 0.;
+    if(PyErr_Occurred()) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->setWindow(size, duration);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_keepSamples(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("keepSamples", nargs, 0, 0)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->keepSamples();
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_removeDataPoint(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("removeDataPoint", nargs, 1, 1)) return NULL;
+    TVector<double> t_dataPoint;
+    if(!to_tvector_double(t_dataPoint, args[0])) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->removeDataPoint(t_dataPoint);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_removeData(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // data - C-contiguous 2D buffer of float64 or float32 with shape (number_of_datapoints, dims)
+    if(!check_nargs("removeData", nargs, 1, 1)) return NULL;
+    Py_buffer view;
+    if(!get_data_buffer(self->it, &view, args[0], 2)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    if(strcmp(view.format, "d") == 0){
+        self->it->removeData((const double*) view.buf, (long) view.shape[0]);
     }
+    else{
+        self->it->removeData((const float*) view.buf, (long) view.shape[0]);
+    }
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&view);
+    Py_RETURN_NONE;
+}
 
-    /****************
-    local utils
-    ****************/
-    void to_tvector_int(TVector<int> &linkerList, PyObject* arg){
-        // get reference to pyobject and map to tvector reference
-        int count = PyList_GET_SIZE(arg);
-        linkerList.SetBounds(1,count);
-        for (int i=0; i<count; i++) {
-            linkerList[i+1] = PyLong_AsLong(PyList_GET_ITEM(arg,i));
+static PyObject* PyInfoTools_clearAllData(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("clearAllData", nargs, 0, 0)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->clearAllData();
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+/****************
+merging and serialization
+****************/
+static PyObject* PyInfoTools_merge(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // other - InfoTools with the same binning
+    if(!check_nargs("merge", nargs, 1, 1)) return NULL;
+    if(!PyObject_TypeCheck(args[0], &PyInfoToolsType)){
+        PyErr_SetString(PyExc_TypeError, "can only merge another InfoTools");
+        return NULL;
+    }
+    InfoTools* other = ((PyInfoTools*) args[0])->it;
+    int same;
+    Py_BEGIN_ALLOW_THREADS
+    // this object is changed and other read, locked in a fixed order so that merges each way at once do not deadlock
+    AccessLock &mine = self->it->accessLock(), &theirs = other->accessLock();
+    if(&mine == &theirs) mine.lockExclusive();
+    else if(&mine < &theirs){
+        mine.lockExclusive();
+        theirs.lockShared();
+    }
+    else{
+        theirs.lockShared();
+        mine.lockExclusive();
+    }
+    same = self->it->sameBinning(*other);
+    if(same) self->it->merge(*other);
+    if(&mine != &theirs) theirs.unlockShared();
+    mine.unlockExclusive();
+    Py_END_ALLOW_THREADS
+    if(!same){
+        PyErr_SetString(PyExc_ValueError, "can only merge objects with the same dimensionality, number of shifts and bin boundaries");
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_toBytes(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("toBytes", nargs, 0, 0)) return NULL;
+    vector<char> out;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->toBytes(out);
+    Py_END_ALLOW_THREADS
+    return PyBytes_FromStringAndSize(out.data(), out.size());
+}
+
+static PyObject* PyInfoTools_save(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // path
+    if(!check_nargs("save", nargs, 1, 1)) return NULL;
+    const char* path = PyUnicode_AsUTF8(args[0]);
+    if(path == NULL) return NULL;
+    bool saved;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    saved = self->it->save(path);
+    Py_END_ALLOW_THREADS
+    if(!saved){
+        PyErr_Format(PyExc_OSError, "could not write %s", path);
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* wrap(InfoTools* it){
+    // new InfoTools object that owns it
+    PyInfoTools* self = (PyInfoTools*) PyInfoToolsType.tp_alloc(&PyInfoToolsType, 0);
+    if(self == NULL){
+        delete it;
+        return NULL;
+    }
+    self->it = it;
+    return (PyObject*) self;
+}
+
+static PyObject* fromBytes(PyObject* module, PyObject* arg){
+    // new InfoTools from any buffer written by toBytes
+    Py_buffer view;
+    if(PyObject_GetBuffer(arg, &view, PyBUF_C_CONTIGUOUS) != 0) return NULL;
+    InfoTools* it = InfoTools::fromBytes((const char*) view.buf, view.len);
+    PyBuffer_Release(&view);
+    if(it == NULL){
+        PyErr_SetString(PyExc_ValueError, "not a saved InfoTools state");
+        return NULL;
+    }
+    return wrap(it);
+}
+
+static PyObject* load(PyObject* module, PyObject* arg){
+    // new InfoTools from a file written by save
+    const char* path = PyUnicode_AsUTF8(arg);
+    if(path == NULL) return NULL;
+    InfoTools* it = InfoTools::load(path);
+    if(it == NULL){
+        PyErr_Format(PyExc_OSError, "could not load an InfoTools state from %s", path);
+        return NULL;
+    }
+    return wrap(it);
+}
+
+/****************
+cache of marginals
+****************/
+static PyObject* PyInfoTools_setCacheBudget(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("setCacheBudget", nargs, 1, 1)) return NULL;
+    long long bytes = PyLong_AsLongLong(args[0]);
+    if(PyErr_Occurred()) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->setCacheBudget(bytes);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_setDenseBudget(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    if(!check_nargs("setDenseBudget", nargs, 1, 1)) return NULL;
+    long combinations = PyLong_AsLong(args[0]);
+    if(PyErr_Occurred()) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    ExclusiveAccess access(self->it->accessLock());
+    self->it->setDenseBudget(combinations);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_getCacheStats(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // (hits, misses, entries, bytes)
+    if(!check_nargs("getCacheStats", nargs, 0, 0)) return NULL;
+    long long hits, misses, entries, bytes;
+    self->it->getCacheStats(hits, misses, entries, bytes);
+    return Py_BuildValue("(LLLL)", hits, misses, entries, bytes);
+}
+
+/****************
+info theory tools
+varIDs are copied into native arrays and the GIL is released while the measure is computed,
+so that several threads can compute measures on the same object. Measures hold the object's access lock shared,
+and calls that change the data hold it exclusively, so that they wait for each other
+****************/
+typedef double (InfoTools::*Measure)(TVector<int>&);
+
+static PyObject* call_measure(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs, const char* name, Measure measure){
+    if(!check_nargs(name, nargs, 1, 1)) return NULL;
+    TVector<int> t_varIDs;
+    if(!to_tvector_int(t_varIDs, args[0])) return NULL;
+    double info;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    info = (self->it->*measure)(t_varIDs);
+    Py_END_ALLOW_THREADS
+    return PyFloat_FromDouble(info);
+}
+
+static PyObject* PyInfoTools_entropy(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    return call_measure(self, args, nargs, "entropy", &InfoTools::entropy);
+}
+
+static PyObject* PyInfoTools_mutualInfo(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    return call_measure(self, args, nargs, "mutualInfo", &InfoTools::mutualInfo);
+}
+
+static PyObject* PyInfoTools_redundantInfo(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    return call_measure(self, args, nargs, "redundantInfo", &InfoTools::redundantInfo);
+}
+
+static PyObject* PyInfoTools_uniqueInfo(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    return call_measure(self, args, nargs, "uniqueInfo", &InfoTools::uniqueInfo);
+}
+
+static PyObject* PyInfoTools_synergy(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    return call_measure(self, args, nargs, "synergy", &InfoTools::synergy);
+}
+
+static PyObject* PyInfoTools_pid(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // list of all PID values, in the order of InfoTools::pid
+    if(!check_nargs("pid", nargs, 1, 1)) return NULL;
+    TVector<int> t_varIDs;
+    TVector<double> t_infos;
+    if(!to_tvector_int(t_varIDs, args[0])) return NULL;
+    // InfoTools::pid exits on invalid varIDs
+    if(t_varIDs.Size() != self->it->getNumDims()){
+        PyErr_Format(PyExc_ValueError, "varIDs must be of size = total dimensionality = %d", self->it->getNumDims());
+        return NULL;
+    }
+    if(self->it->pidSize(t_varIDs) == 0){
+        PyErr_SetString(PyExc_ValueError, "varIDs must identify the target with 0 and 2 or 3 sources with 1, 2 (and 3) for pid");
+        return NULL;
+    }
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->pid(t_varIDs, t_infos);
+    Py_END_ALLOW_THREADS
+    PyObject* infos = PyList_New(t_infos.Size());
+    if(infos == NULL) return NULL;
+    for (int i=0; i<t_infos.Size(); i++) {
+        PyList_SET_ITEM(infos, i, PyFloat_FromDouble(t_infos[i+1]));
+    }
+    return infos;
+}
+
+static PyObject* PyInfoTools_batch(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // measure, specs, results
+    // specs - C-contiguous 2D buffer of int with shape (number_of_specs, dims)
+    // results - C-contiguous float64 buffer with number_of_specs values
+    if(!check_nargs("batch", nargs, 3, 3)) return NULL;
+    int measure = PyLong_AsLong(args[0]);
+    if(PyErr_Occurred()) return NULL;
+    Py_buffer s_view, r_view;
+    if(PyObject_GetBuffer(args[1], &s_view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0){
+        return NULL;
+    }
+    if(s_view.ndim != 2 || s_view.shape[1] != self->it->getNumDims()){
+        PyErr_SetString(PyExc_ValueError, "varIDs must be 2D with shape (number_of_specs, dims)");
+    }
+    else if(s_view.itemsize != sizeof(int) || strchr("il", s_view.format[strlen(s_view.format)-1]) == NULL){
+        PyErr_SetString(PyExc_TypeError, "varIDs must be of C int type");
+    }
+    else if(get_results_buffer(&r_view, args[2], s_view.shape[0])){
+        Py_BEGIN_ALLOW_THREADS
+        SharedAccess access(self->it->accessLock());
+        self->it->batch(measure, (const int*) s_view.buf, (long) s_view.shape[0], (double*) r_view.buf);
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&r_view);
+    }
+    PyBuffer_Release(&s_view);
+    if(PyErr_Occurred()) return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_timeResolved(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // data, measure, varIDs, results, nThreads
+    // data - C-contiguous 3D buffer of float64 or float32 with shape (number_of_trials, number_of_timesteps, dims)
+    // results - C-contiguous float64 buffer with number_of_timesteps rows of one value (or all PID values)
+    if(!check_nargs("timeResolved", nargs, 5, 5)) return NULL;
+    int measure = PyLong_AsLong(args[1]);
+    int nThreads = PyLong_AsLong(args[4]);
+    TVector<int> t_varIDs;
+    if(PyErr_Occurred() || !to_tvector_int(t_varIDs, args[2])) return NULL;
+    int nInfos = measure == PID ? self->it->pidSize(t_varIDs) : 1;
+    Py_buffer view, r_view;
+    if(!get_data_buffer(self->it, &view, args[0], 3)) return NULL;
+    if(get_results_buffer(&r_view, args[3], view.shape[1]*nInfos)){
+        long nTrials = view.shape[0], nTimes = view.shape[1];
+        Py_BEGIN_ALLOW_THREADS
+        SharedAccess access(self->it->accessLock());
+        if(strcmp(view.format, "d") == 0){
+            self->it->timeResolved((const double*) view.buf, nTrials, nTimes, measure, t_varIDs, (double*) r_view.buf, nThreads);
         }
+        else{
+            self->it->timeResolved((const float*) view.buf, nTrials, nTimes, measure, t_varIDs, (double*) r_view.buf, nThreads);
+        }
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&r_view);
     }
-    void to_tvector_double(TVector<double> &linkerList, PyObject* arg){
-        // get reference to pyobject and map to tvector reference
-        int count = PyList_GET_SIZE(arg);
-        linkerList.SetBounds(1,count);
-        for (int i=0; i<count; i++) {
-            linkerList[i+1] = PyFloat_AsDouble(PyList_GET_ITEM(arg,i));
+    PyBuffer_Release(&view);
+    if(PyErr_Occurred()) return NULL;
+    Py_RETURN_NONE;
+}
+
+static void set_skipped_error(const char* name, long kept){
+    // ValueError for a call on the kept datapoints that was skipped, kept being their number (-1 if they are not kept)
+    if(kept < 0){
+        PyErr_SetString(PyExc_ValueError, "datapoints must be kept as they are added (see keep_samples) or be in a window");
+    }
+    else if(kept == 0) PyErr_SetString(PyExc_ValueError, "no datapoints have been added");
+    else PyErr_Format(PyExc_ValueError, "%s was skipped, see the error printed", name);
+}
+
+static PyObject* PyInfoTools_nullDistribution(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // measure, varIDs, nPerms, seed, nulls, pValues, nThreads
+    // nulls - C-contiguous float64 buffer with nPerms rows of one value (or all PID values)
+    // pValues - C-contiguous float64 buffer with one value (or one for each PID value)
+    if(!check_nargs("nullDistribution", nargs, 7, 7)) return NULL;
+    int measure = PyLong_AsLong(args[0]);
+    long nPerms = PyLong_AsLong(args[2]);
+    unsigned long long seed = PyLong_AsUnsignedLongLongMask(args[3]);
+    int nThreads = PyLong_AsLong(args[6]);
+    TVector<int> t_varIDs;
+    if(PyErr_Occurred() || !to_tvector_int(t_varIDs, args[1])) return NULL;
+    if(nPerms <= 0){
+        PyErr_SetString(PyExc_ValueError, "nPerms must be positive");
+        return NULL;
+    }
+    int nInfos = measure == PID ? self->it->pidSize(t_varIDs) : 1;
+    Py_buffer n_view, p_view;
+    if(!get_results_buffer(&n_view, args[4], nPerms*nInfos)) return NULL;
+    if(get_results_buffer(&p_view, args[5], nInfos)){
+        bool done;
+        long kept;
+        Py_BEGIN_ALLOW_THREADS
+        SharedAccess access(self->it->accessLock());
+        done = self->it->nullDistribution(measure, t_varIDs, nPerms, seed, (double*) n_view.buf, (double*) p_view.buf, nThreads);
+        kept = self->it->keptSampleCount();
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&p_view);
+        if(!done) set_skipped_error("nullDistribution", kept);
+    }
+    PyBuffer_Release(&n_view);
+    if(PyErr_Occurred()) return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_bootstrapDistribution(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // measure, varIDs, nResamples, seed, replicates, nThreads
+    // replicates - C-contiguous float64 buffer with nResamples rows of one value (or all PID values)
+    if(!check_nargs("bootstrapDistribution", nargs, 6, 6)) return NULL;
+    int measure = PyLong_AsLong(args[0]);
+    long nResamples = PyLong_AsLong(args[2]);
+    unsigned long long seed = PyLong_AsUnsignedLongLongMask(args[3]);
+    int nThreads = PyLong_AsLong(args[5]);
+    TVector<int> t_varIDs;
+    if(PyErr_Occurred() || !to_tvector_int(t_varIDs, args[1])) return NULL;
+    if(nResamples <= 0){
+        PyErr_SetString(PyExc_ValueError, "nResamples must be positive");
+        return NULL;
+    }
+    int nInfos = measure == PID ? self->it->pidSize(t_varIDs) : 1;
+    Py_buffer r_view;
+    if(!get_results_buffer(&r_view, args[4], nResamples*nInfos)) return NULL;
+    bool done;
+    long kept;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    done = self->it->bootstrapDistribution(measure, t_varIDs, nResamples, seed, (double*) r_view.buf, nThreads);
+    kept = self->it->keptSampleCount();
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&r_view);
+    if(!done){
+        set_skipped_error("bootstrapDistribution", kept);
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* lag_sweep(PyInfoTools* self, PyObject* const* args, int targetHistory, int sourceHistory, PyObject* results, int nThreads){
+    // data, varIDs, lags from args, with transfer entropy if targetHistory > 0, lagged mutual information otherwise
+    // data - C-contiguous 3D buffer of float64 or float32 with shape (number_of_trials, number_of_timesteps, dims)
+    // results - C-contiguous float64 buffer with one value per lag
+    TVector<int> t_varIDs, t_lags;
+    if(PyErr_Occurred() || !to_tvector_int(t_varIDs, args[1]) || !to_tvector_int(t_lags, args[2])) return NULL;
+    if(t_lags.Size() == 0) Py_RETURN_NONE;
+    Py_buffer view, r_view;
+    if(!get_data_buffer(self->it, &view, args[0], 3)) return NULL;
+    if(get_results_buffer(&r_view, results, t_lags.Size())){
+        long nTrials = view.shape[0], nTimes = view.shape[1];
+        int nLags = t_lags.Size();
+        const int* lags = &t_lags[1];
+        double* r = (double*) r_view.buf;
+        Py_BEGIN_ALLOW_THREADS
+        SharedAccess access(self->it->accessLock());
+        if(strcmp(view.format, "d") == 0){
+            const double* data = (const double*) view.buf;
+            if(targetHistory > 0) self->it->transferEntropy(data, nTrials, nTimes, t_varIDs, lags, nLags, targetHistory, sourceHistory, r, nThreads);
+            else self->it->laggedMutualInfo(data, nTrials, nTimes, t_varIDs, lags, nLags, r, nThreads);
         }
+        else{
+            const float* data = (const float*) view.buf;
+            if(targetHistory > 0) self->it->transferEntropy(data, nTrials, nTimes, t_varIDs, lags, nLags, targetHistory, sourceHistory, r, nThreads);
+            else self->it->laggedMutualInfo(data, nTrials, nTimes, t_varIDs, lags, nLags, r, nThreads);
+        }
+        Py_END_ALLOW_THREADS
+        PyBuffer_Release(&r_view);
+    }
+    PyBuffer_Release(&view);
+    if(PyErr_Occurred()) return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_laggedMutualInfo(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // data, varIDs, lags, results, nThreads
+    if(!check_nargs("laggedMutualInfo", nargs, 5, 5)) return NULL;
+    int nThreads = PyLong_AsLong(args[4]);
+    return lag_sweep(self, args, 0, 1, args[3], nThreads);
+}
+
+static PyObject* PyInfoTools_transferEntropy(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // data, varIDs, lags, targetHistory, sourceHistory, results, nThreads
+    if(!check_nargs("transferEntropy", nargs, 7, 7)) return NULL;
+    int targetHistory = PyLong_AsLong(args[3]);
+    int sourceHistory = PyLong_AsLong(args[4]);
+    int nThreads = PyLong_AsLong(args[6]);
+    if(!PyErr_Occurred() && (targetHistory < 1 || sourceHistory < 1)){
+        PyErr_SetString(PyExc_ValueError, "target_history and source_history must be at least 1");
     }
+    return lag_sweep(self, args, targetHistory, sourceHistory, args[5], nThreads);
+}
+
+static PyObject* PyInfoTools_mutualInfoMatrix(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // results, nThreads
+    // results - C-contiguous float64 buffer with dims*dims values
+    if(!check_nargs("mutualInfoMatrix", nargs, 2, 2)) return NULL;
+    int nThreads = PyLong_AsLong(args[1]);
+    if(PyErr_Occurred()) return NULL;
+    long nDims = self->it->getNumDims();
+    Py_buffer r_view;
+    if(!get_results_buffer(&r_view, args[0], nDims*nDims)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->mutualInfoMatrix((double*) r_view.buf, nThreads);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&r_view);
+    Py_RETURN_NONE;
+}
+
+static PyObject* PyInfoTools_synergyTensor(PyInfoTools* self, PyObject* const* args, Py_ssize_t nargs){
+    // results, nThreads
+    // results - C-contiguous float64 buffer with dims*dims*dims values
+    if(!check_nargs("synergyTensor", nargs, 2, 2)) return NULL;
+    int nThreads = PyLong_AsLong(args[1]);
+    if(PyErr_Occurred()) return NULL;
+    long nDims = self->it->getNumDims();
+    Py_buffer r_view;
+    if(!get_results_buffer(&r_view, args[0], nDims*nDims*nDims)) return NULL;
+    Py_BEGIN_ALLOW_THREADS
+    SharedAccess access(self->it->accessLock());
+    self->it->synergyTensor((double*) r_view.buf, nThreads);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&r_view);
+    Py_RETURN_NONE;
+}
+
+/****************
+type and module
+****************/
+#define FASTCALL_METHOD(name) {#name, (PyCFunction)(void(*)(void)) PyInfoTools_##name, METH_FASTCALL, NULL}
+
+static PyMethodDef PyInfoTools_methods[] = {
+    FASTCALL_METHOD(getNumDims),
+    FASTCALL_METHOD(displayConfig),
+    FASTCALL_METHOD(displaySnapshot),
+    FASTCALL_METHOD(setEqualIntervalBinning),
+    FASTCALL_METHOD(setBinBoundaries),
+    FASTCALL_METHOD(addDataPoint),
+    FASTCALL_METHOD(addData),
+    FASTCALL_METHOD(setWindow),
+    FASTCALL_METHOD(keepSamples),
+    FASTCALL_METHOD(removeDataPoint),
+    FASTCALL_METHOD(removeData),
+    FASTCALL_METHOD(clearAllData),
+    FASTCALL_METHOD(merge),
+    FASTCALL_METHOD(toBytes),
+    FASTCALL_METHOD(save),
+    FASTCALL_METHOD(setCacheBudget),
+    FASTCALL_METHOD(getCacheStats),
+    FASTCALL_METHOD(setDenseBudget),
+    FASTCALL_METHOD(entropy),
+    FASTCALL_METHOD(mutualInfo),
+    FASTCALL_METHOD(redundantInfo),
+    FASTCALL_METHOD(uniqueInfo),
+    FASTCALL_METHOD(synergy),
+    FASTCALL_METHOD(pid),
+    FASTCALL_METHOD(batch),
+    FASTCALL_METHOD(timeResolved),
+    FASTCALL_METHOD(nullDistribution),
+    FASTCALL_METHOD(bootstrapDistribution),
+    FASTCALL_METHOD(laggedMutualInfo),
+    FASTCALL_METHOD(transferEntropy),
+    FASTCALL_METHOD(mutualInfoMatrix),
+    FASTCALL_METHOD(synergyTensor),
+    {NULL}
+};
+
+static PyMethodDef module_methods[] = {
+    {"fromBytes", (PyCFunction) fromBytes, METH_O, NULL},
+    {"load", (PyCFunction) load, METH_O, NULL},
+    {NULL}
+};
+
+static struct PyModuleDef infotheoryModule = {
+    PyModuleDef_HEAD_INIT,
+    "infotheoryClass",
+    "Native InfoTools, see infotheory.InfoTools for the documented interface",
+    -1,
+    module_methods,
+};
+
+PyMODINIT_FUNC PyInit_infotheoryClass(void){
+    PyInfoToolsType.tp_dealloc = (destructor) PyInfoTools_dealloc;
+    PyInfoToolsType.tp_flags = Py_TPFLAGS_DEFAULT;
+    PyInfoToolsType.tp_doc = "InfoTools(dims, nreps=0, expected_bins=0)";
+    PyInfoToolsType.tp_methods = PyInfoTools_methods;
+    PyInfoToolsType.tp_new = PyInfoTools_new;
+    if(PyType_Ready(&PyInfoToolsType) < 0) return NULL;
 
-    /****************
-    inspection tools
-    ****************/
-    void displayConfig_c_wrapper(InfoTools* it){
-        it->displayConfig();
-    }
-    void displaySnapshot_c_wrapper(InfoTools* it){
-        it->displaySnapshot();
-    }
-
-    /****************
-    binning methods
-    ****************/
-    void setEqualIntervalBinning_c_wrapper(InfoTools* it, PyObject* nbins, PyObject* mins, PyObject* maxs){
-        TVector<int> t_nbins;
-        to_tvector_int(t_nbins, nbins);
-        TVector<double> t_mins, t_maxs;
-        to_tvector_double(t_mins, mins);
-        to_tvector_double(t_maxs, maxs);
-        it->setEqualIntervalBinning(t_nbins, t_mins, t_maxs);
-    }
-    void setBinBoundaries_c_wrapper(InfoTools* it, PyObject* boundaries, int dim_index){
-        TVector<double> t_boundaries;
-        to_tvector_double(t_boundaries, boundaries);
-        it->setBinBoundaries(t_boundaries, dim_index);
-    }
-
-    /****************
-    data handlers
-    ****************/
-    void addDataPoint_c_wrapper(InfoTools* it, PyObject* dataPoint){
-        TVector<double> t_dataPoint;
-        to_tvector_double(t_dataPoint, dataPoint);
-        it->addDataPoint(t_dataPoint);
-    }
-    void clearAllData_c_wrapper(InfoTools* it){
-        it->clearAllData(); // TODO
-    }
-
-    /****************
-    info theory tools
-    ****************/
-    PyObject* entropy_c_wrapper(InfoTools* it, PyObject* varIDs){
-        TVector<int> t_varIDs;
-        to_tvector_int(t_varIDs, varIDs);
-        return PyFloat_FromDouble(it->entropy(t_varIDs));
-    }
-    PyObject* mutualInfo_c_wrapper(InfoTools* it, PyObject* varIDs){
-        TVector<int> t_varIDs;
-        to_tvector_int(t_varIDs, varIDs);
-        return PyFloat_FromDouble(it->mutualInfo(t_varIDs));
-    }
-    PyObject* redundantInfo_c_wrapper(InfoTools* it, PyObject* varIDs){
-        TVector<int> t_varIDs;
-        to_tvector_int(t_varIDs, varIDs);
-        return PyFloat_FromDouble(it->redundantInfo(t_varIDs));
-    }
-    PyObject* uniqueInfo_c_wrapper(InfoTools* it, PyObject* varIDs){
-        TVector<int> t_varIDs;
-        to_tvector_int(t_varIDs, varIDs);
-        return PyFloat_FromDouble(it->uniqueInfo(t_varIDs));
-    }
-    PyObject* synergy_c_wrapper(InfoTools* it, PyObject* varIDs){
-        TVector<int> t_varIDs;
-        to_tvector_int(t_varIDs, varIDs);
-        return PyFloat_FromDouble(it->synergy(t_varIDs));
+    PyObject* module = PyModule_Create(&infotheoryModule);
+    if(module == NULL) return NULL;
+    Py_INCREF(&PyInfoToolsType);
+    if(PyModule_AddObject(module, "InfoTools", (PyObject*) &PyInfoToolsType) < 0){
+        Py_DECREF(&PyInfoToolsType);
+        Py_DECREF(module);
+        return NULL;
     }
+    return module;
 }
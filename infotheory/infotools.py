@@ -12,49 +12,110 @@ Contains InfoTools class that allows estimation of
 """
 import os
 import glob
-from ctypes import cdll, c_void_p, c_int, py_object, py_object, c_double
+from array import array
+import importlib.util
 
 __version__ = "1.0.1"
 
+# measures that can be evaluated in a batch or over time, same as InfoMeasure in InfoTools.h
+_ENTROPY, _MUTUAL_INFO, _REDUNDANT_INFO, _UNIQUE_INFO, _SYNERGY, _PID = range(6)
+_MEASURES = {
+    "entropy": _ENTROPY,
+    "mutual_info": _MUTUAL_INFO,
+    "redundant_info": _REDUNDANT_INFO,
+    "unique_info": _UNIQUE_INFO,
+    "synergy": _SYNERGY,
+    "pid": _PID,
+}
+
+
+# the native extension module, see _native
+_native_module = None
+
+
+def _native():
+    """ the native extension module, loaded on first use, once per process """
+    global _native_module
+    if _native_module is None:
+        dll_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        dll_files = glob.glob(os.path.join(dll_dir, "infotheoryClass*.so"))
+        if not dll_files:
+            raise ImportError(
+                "Compiled library infotheoryClass*.so not found in {}. Build it with 'python setup.py build_ext --inplace' or install the package with pip".format(
+                    dll_dir
+                )
+            )
+        spec = importlib.util.spec_from_file_location("infotheoryClass", dll_files[0])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _native_module = module
+    return _native_module
+
+
+def _is_bulk_buffer(data):
+    """ True if data exposes a C-contiguous 2D float64/float32 buffer that can be binned in one native call """
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return False
+    with view:
+        return view.ndim == 2 and view.c_contiguous and view.format in ("d", "f")
+
+
+def _n_infos(measure, var_IDs):
+    """ number of values of measure for var_IDs, raises ValueError if measure is unknown """
+    if measure not in _MEASURES:
+        raise ValueError(
+            "measure must be one of {}".format(", ".join(sorted(_MEASURES)))
+        )
+    if measure != "pid":
+        return 1
+    # the sources must be exactly 1, 2 (and 3), with a target 0
+    sources = sorted(set(v for v in var_IDs if v > 0))
+    n_infos = {2: 5, 3: 6}.get(len(sources), 0)
+    if n_infos == 0 or sources != list(range(1, len(sources) + 1)) or 0 not in var_IDs:
+        raise ValueError(
+            "varIDs must identify the target with 0 and 2 or 3 sources with 1, 2 (and 3) for pid"
+        )
+    return n_infos
+
+
+def _pid_names(n_infos):
+    """ keys for the n_infos values of a partial information decomposition, in the order they are estimated in """
+    names = ["mutual_info"]
+    names += ["unique_{}".format(i + 1) for i in range(n_infos - 3)]
+    return names + ["redundant_info", "synergy"]
+
 
 class InfoTools(object):
     """ Python Wrapper class for InfoTools.h
 
-    This class loads the .so file from the compiled InfoTools.h that allows functions written in C++ to be called from Python. Create and object of this class to call associated functions.
+    This class wraps the extension type compiled from InfoTools.h (infotheoryClass*.so) that allows functions written in C++ to be called from Python. Create and object of this class to call associated functions.
     """
 
-    def __init__(self, dims, nreps=0):
-        """ reads in .so file and creates object of InfoTools cpp class
+    def __init__(self, dims, nreps=0, expected_bins=0):
+        """ loads the compiled extension and creates object of InfoTools cpp class
 
         ARGS
         dims: (int) total dimensionality of all variables
         nreps: (int) number of shifted binnings over which data is binned and averaged
+        expected_bins: (int) number of non-empty bins expected; the bin store is pre-sized to hold
+                        these so that it does not have to grow while data is being added (optional)
         """
         self.dims = dims
-        dll_dir = "/".join(os.path.dirname(__file__).split("/")[:-1])
-        dll_file = glob.glob(os.path.join(dll_dir, "infotheoryClass*.so"))[0]
-        self.libc = cdll.LoadLibrary(dll_file)
-
         # creating object of cpp class
-        class_ctor_wrapper = self.libc.InfoTools_new
-        class_ctor_wrapper.argtypes = [c_int, c_int]
-        class_ctor_wrapper.restype = c_void_p
-        self._obj = c_void_p(class_ctor_wrapper(dims, nreps))
+        self._obj = _native().InfoTools(dims, nreps, expected_bins)
 
     # ****************
     # Inspection utils
     # ****************
     def display_config(self):
         """ Display the config for analyses such as number of bins, dimensionality etc. """
-        displayConfig_wrapper = self.libc.displayConfig_c_wrapper
-        displayConfig_wrapper.argtypes = [c_void_p]
-        displayConfig_wrapper(self._obj)
+        self._obj.displayConfig()
 
     def display_snapshot(self):
         """ Display current status such as number of points added, number of non-empty bins etc. """
-        displaySnapshot_wrapper = self.libc.displaySnapshot_c_wrapper
-        displaySnapshot_wrapper.argtypes = [c_void_p]
-        displaySnapshot_wrapper(self._obj)
+        self._obj.displaySnapshot()
 
     # ****************
     # Binning methods
@@ -67,14 +128,7 @@ class InfoTools(object):
         mins: (list,length=dims) list with the minimum values along each dimension
         maxs: (list,length=dims) list with the maximum values along each dimension
         """
-        setEqualIntervalBinning_wrapper = self.libc.setEqualIntervalBinning_c_wrapper
-        setEqualIntervalBinning_wrapper.argtypes = [
-            c_void_p,
-            py_object,
-            py_object,
-            py_object,
-        ]
-        setEqualIntervalBinning_wrapper(self._obj, list(nbins), list(mins), list(maxs))
+        self._obj.setEqualIntervalBinning(nbins, mins, maxs)
 
     def set_bin_boundaries(self, boundaries, dim_index=None):
         """ set the left margin of each bin for each dimension
@@ -84,10 +138,8 @@ class InfoTools(object):
                 Length of list = number_of_bins-1, left most bin is (-inf,list[0]) and right most bin is (list[-1],inf)
         dim_index: (int, default=None) denoting the dimension for which the bins are being set, if boundaries is a single list of boundaries
         """
-        set_bin_boundaries_wrapper = self.libc.setBinBoundaries_c_wrapper
-        set_bin_boundaries_wrapper.argtypes = [c_void_p, py_object, c_int]
         if dim_index:
-            set_bin_boundaries_wrapper(self._obj, list(boundaries), int(dim_index))
+            self._obj.setBinBoundaries(boundaries, int(dim_index))
         else:
             assert (
                 len(boundaries) == self.dims
@@ -95,45 +147,190 @@ class InfoTools(object):
                 self.dims
             )
             for dim_ind, boundary_list in enumerate(boundaries):
-                set_bin_boundaries_wrapper(self._obj, list(boundary_list), int(dim_ind))
+                self._obj.setBinBoundaries(boundary_list, int(dim_ind))
 
     # ****************
     # Data handlers
     # ****************
-    def add_data_point(self, datapoint):
+    def add_data_point(self, datapoint, time=None):
         """ add one data point to analyses
 
         ARGS
         datapoint: (list-like, size=dims) the datapoint to be added
+        time: (float) time of the datapoint, required with a window of some duration (see set_window)
         """
-        addDataPoint_wrapper = self.libc.addDataPoint_c_wrapper
-        addDataPoint_wrapper.argtypes = [c_void_p, py_object]
-        addDataPoint_wrapper(self._obj, list(datapoint))
+        self._obj.addDataPoint(datapoint, 0.0 if time is None else float(time))
 
-    def add_data(self, data):
+    def add_data(self, data, times=None, n_threads=0):
         """ add several data points at once
 
+        A C-contiguous 2D float64 or float32 numpy array (or any object supporting the buffer protocol with that layout) is binned in one native call, on several threads for large arrays. Other list-likes are added one datapoint at a time.
+
         ARGS
         data: (list-like, size=[number_of_datapoints, dims]) list of datapoints to be added
+        times: (list-like, size=number_of_datapoints) time of each datapoint, required with a window of some duration (see set_window)
+        n_threads: (int) number of threads to bin an array on, 0 to use all cores. Datapoints are binned one after another with a window
+        """
+        if _is_bulk_buffer(data):
+            self._obj.addData(
+                data, None if times is None else array("d", times), int(n_threads)
+            )
+        elif times is None:
+            for datapoint in data:
+                self.add_data_point(datapoint)
+        else:
+            for datapoint, time in zip(data, times):
+                self.add_data_point(datapoint, time)
+
+    def set_window(self, size=None, duration=None):
+        """ estimate from only the most recent datapoints - older ones are removed as new ones are added
+
+        Must be called before adding any data.
+
+        ARGS
+        size: (int) maximum number of datapoints to keep
+        duration: (float) datapoints older than duration before the latest one are removed. Times must then be given when adding data, in non-decreasing order
+
+        Example:
+        it.set_window(size=1000) estimates from the last 1000 datapoints added
+        """
+        self._obj.setWindow(int(size or 0), float(duration or 0))
+
+    def keep_samples(self):
+        """ keep the bins of each datapoint added, so that null distributions (e.g. mutual_info_null) can be estimated without binning data again
+
+        Takes 2*(2*nreps+1)*dims bytes of memory per datapoint. Must be called before adding any data. Not needed with a window, where the datapoints in the window are kept
+        """
+        self._obj.keepSamples()
+
+    def remove_data_point(self, datapoint):
+        """ remove one data point that was added before from analyses
+
+        Not available with a window, where datapoints are removed automatically
+
+        ARGS
+        datapoint: (list-like, size=dims) the datapoint to be removed
+        """
+        self._obj.removeDataPoint(datapoint)
+
+    def remove_data(self, data):
+        """ remove several data points that were added before at once
+
+        ARGS
+        data: (list-like, size=[number_of_datapoints, dims]) list of datapoints to be removed
         """
-        for datapoint in data:
-            self.add_data_point(datapoint)
+        if _is_bulk_buffer(data):
+            self._obj.removeData(data)
+        else:
+            for datapoint in data:
+                self.remove_data_point(datapoint)
 
     def clearAllData(self):
         """ clear all data added so far and start afresh
 
         It is recommended to create a new object instead
         """
-        clearAllData_wrapper = self.libc.clearAllData_c_wrapper
-        clearAllData_wrapper.argtypes = [c_void_p]
-        clearAllData_wrapper(self._obj)
+        self._obj.clearAllData()
+
+    def set_cache_budget(self, nbytes):
+        """ set the memory available to keep marginal distributions for reuse across calls
+
+        Marginals are computed once, reused by later calls on the same varIDs and updated with only the bins that new datapoints fall in. Least recently used marginals are dropped when the budget is exceeded.
+
+        ARGS
+        nbytes: (int) memory budget in bytes, 0 to disable caching
+        """
+        self._obj.setCacheBudget(int(nbytes))
+
+    def cache_stats(self):
+        """ statistics of the cache of marginal distributions
+
+        RETURNS:
+        dict with "hits", "misses" - number of times a marginal was found in or missing from the cache, "entries", "bytes" - number of marginals and memory held in the cache
+        """
+        stats = self._obj.getCacheStats()
+        return dict(zip(["hits", "misses", "entries", "bytes"], stats))
+
+    def set_dense_budget(self, n_combinations):
+        """ set the largest number of combinations of bins for which datapoints are counted in a flat array
 
-    def __del__(self):
-        """ deletes the cpp pointer """
-        delete_ptr_wrapper = self.libc.delete_instance_of_class
-        delete_ptr_wrapper.argtypes = [c_void_p]
-        delete_ptr_wrapper.restype = c_void_p
-        delete_ptr_wrapper(self._obj)
+        Measures over dims with few bins between them (e.g. 10x10x10 bins for a PID) look up the bins of datapoints in a flat array of counts, much faster than searching the populated bins, which is done for all other measures. The choice is made for each call from the number of bins along the dims in var_IDs. Also limits the dense tables of mutual_info_matrix and synergy_tensor.
+
+        ARGS
+        n_combinations: (int) largest product of the number of bins (plus one for nan) along the dims of a marginal to count in a flat array, 0 to always search the populated bins. Default 262144
+        """
+        self._obj.setDenseBudget(int(n_combinations))
+
+    # ****************
+    # Merging, serialization and saving
+    # ****************
+    def merge(self, other):
+        """ add the datapoints of another object to this one
+
+        Estimates are then the same as if all datapoints had been added to this object, so that data can be binned in separate processes and combined. Not available with a window
+
+        ARGS
+        other: (InfoTools) object with the same dimensionality, nreps and bin boundaries
+        """
+        self._obj.merge(other._obj)
+
+    def to_bytes(self):
+        """ binning, datapoints added so far and window settings, to be restored with InfoTools.from_bytes
+
+        Objects can also be pickled, e.g. to be returned from a process pool
+
+        RETURNS:
+        bytes
+        """
+        return self._obj.toBytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """ create an object from the output of to_bytes
+
+        ARGS
+        data: (bytes-like) output of to_bytes
+
+        RETURNS:
+        InfoTools
+        """
+        it = cls.__new__(cls)
+        it.__setstate__(data)
+        return it
+
+    def save(self, path):
+        """ save binning, datapoints added so far and window settings to a file, to be loaded with InfoTools.load
+
+        An existing file is replaced once the new one has been written
+
+        ARGS
+        path: (str) file to write
+        """
+        self._obj.save(str(path))
+
+    @classmethod
+    def load(cls, path):
+        """ create an object from a file written by save
+
+        The file is memory-mapped read-only and used in place, so loading is near-instant and processes that load the same file share it in memory. Populated bins are copied only when datapoints are added or removed. The file must not be modified while the object is in use.
+
+        ARGS
+        path: (str) file written by save
+
+        RETURNS:
+        InfoTools
+        """
+        it = cls.__new__(cls)
+        it._obj = _native().load(str(path))
+        it.dims = it._obj.getNumDims()
+        return it
+
+    def __getstate__(self):
+        return self.to_bytes()
+
+    def __setstate__(self, state):
+        self._obj = _native().fromBytes(state)
+        self.dims = self._obj.getNumDims()
 
     # ****************
     # Info theory tools
@@ -152,10 +349,7 @@ class InfoTools(object):
         varIDs = [1,1,-1,-1]
         The dims with varID==-1 will be ignored
         """
-        entropy_wrapper = self.libc.entropy_c_wrapper
-        entropy_wrapper.argtypes = [c_void_p, py_object]
-        entropy_wrapper.restype = c_double
-        return entropy_wrapper(self._obj, list(var_IDs))
+        return self._obj.entropy(var_IDs)
 
     def mutual_info(self, var_IDs):
         """ Compute mutual information between two random vars for datapoints that have already been added.
@@ -173,10 +367,7 @@ class InfoTools(object):
         varIDs = [0,0,1,1]
         The dims with varID==-1 will be ignored
         """
-        mutualInfo_wrapper = self.libc.mutualInfo_c_wrapper
-        mutualInfo_wrapper.argtypes = [c_void_p, py_object]
-        mutualInfo_wrapper.restype = c_double
-        return mutualInfo_wrapper(self._obj, list(var_IDs))
+        return self._obj.mutualInfo(var_IDs)
 
     def redundant_info(self, var_IDs):
         """ Compute redundant information about a random var from two (or three) random vars for datapoints that have already been added.
@@ -195,10 +386,7 @@ class InfoTools(object):
         varIDs = [0,1,2,-1]
         The dims with varID==-1 will be ignored
         """
-        redundantInfo_wrapper = self.libc.redundantInfo_c_wrapper
-        redundantInfo_wrapper.argtypes = [c_void_p, py_object]
-        redundantInfo_wrapper.restype = c_double
-        return redundantInfo_wrapper(self._obj, list(var_IDs))
+        return self._obj.redundantInfo(var_IDs)
 
     def unique_info(self, var_IDs):
         """ Compute unique information about a random var from two (or three) random vars for datapoints that have already been added.
@@ -216,10 +404,7 @@ class InfoTools(object):
         if dims = 4, 4D datapoints will be added. If the first dimension denotes the target and the second and third denote the two sources, then set
         varIDs = [0,1,2,-1]
         """
-        uniqueInfo_wrapper = self.libc.uniqueInfo_c_wrapper
-        uniqueInfo_wrapper.argtypes = [c_void_p, py_object]
-        uniqueInfo_wrapper.restype = c_double
-        return uniqueInfo_wrapper(self._obj, list(var_IDs))
+        return self._obj.uniqueInfo(var_IDs)
 
     def synergy(self, var_IDs):
         """ Compute synergistic information about a random var from two (or three) random vars for datapoints that have already been added.
@@ -237,7 +422,367 @@ class InfoTools(object):
         if dims = 4, 4D datapoints will be added. If the first dimension denotes the target and the second and third denote the two sources, then set
         varIDs = [0,1,2,-1]
         """
-        synergy_wrapper = self.libc.synergy_c_wrapper
-        synergy_wrapper.argtypes = [c_void_p, py_object]
-        synergy_wrapper.restype = c_double
-        return synergy_wrapper(self._obj, list(var_IDs))
+        return self._obj.synergy(var_IDs)
+
+    def pid(self, var_IDs):
+        """ Compute the complete partial information decomposition about a random var from two (or three) random vars for datapoints that have already been added.
+        Probability tables shared between the measures are estimated only once, making this faster than calling each of them separately.
+        The target random var is identified by varIDs==0
+        The sources are identified by varIDs==1 and varIDs==2 (optionally varIDs==3 in the case of three sources)
+        Set varIDs=-1 for dimensions to be ignored.
+
+        ARGS:
+        varIDs: (list-like, size=dims) list of length equal to dimensionality of data
+
+        RETURNS:
+        dict with the same values as the individual measures would return for this varIDs -
+            "mutual_info": total mutual information about varIDs==0 from all sources
+            "unique_1", "unique_2" (and "unique_3"): unique information from varIDs==1, varIDs==2 (and varIDs==3)
+            "redundant_info": redundant information
+            "synergy": synergistic information
+
+        Example:
+        if dims = 4, 4D datapoints will be added. If the first dimension denotes the target and the second and third denote the two sources, then set
+        varIDs = [0,1,2,-1]
+        """
+        var_IDs = list(var_IDs)
+        _n_infos("pid", var_IDs)
+        infos = self._obj.pid(var_IDs)
+        return dict(zip(_pid_names(len(infos)), infos))
+
+    # ****************
+    # Batch evaluation
+    # ****************
+    def _batch(self, measure, var_IDs):
+        """ evaluate one measure for each row of var_IDs in one native call and return the results as a numpy array """
+        import numpy as np
+
+        specs = np.ascontiguousarray(var_IDs, dtype=np.intc)
+        if specs.ndim == 1 and specs.size == 0:
+            specs = specs.reshape(0, self.dims)
+        results = np.zeros(len(specs))
+        self._obj.batch(measure, specs, results)
+        return results
+
+    def entropy_batch(self, var_IDs):
+        """ Compute entropy for several sets of varIDs, see entropy.
+        Marginals shared between the sets of varIDs are estimated only once, making this faster than calling entropy for each of them.
+
+        ARGS:
+        varIDs: (2D int array-like, size=[number_of_specs, dims]) one list of varIDs per row
+
+        RETURNS:
+        numpy array of size number_of_specs with the entropy for each row of varIDs
+        """
+        return self._batch(_ENTROPY, var_IDs)
+
+    def mutual_info_batch(self, var_IDs):
+        """ Compute mutual information for several sets of varIDs, see mutual_info.
+        Marginals shared between the sets of varIDs are estimated only once, making this faster than calling mutual_info for each of them.
+
+        ARGS:
+        varIDs: (2D int array-like, size=[number_of_specs, dims]) one list of varIDs per row
+
+        RETURNS:
+        numpy array of size number_of_specs with the mutual information for each row of varIDs
+
+        Example:
+        if dims = 3, the mutual information between all pairs of dimensions is given by
+        mutual_info_batch([[0,1,-1],[0,-1,1],[-1,0,1]])
+        """
+        return self._batch(_MUTUAL_INFO, var_IDs)
+
+    def redundant_info_batch(self, var_IDs):
+        """ Compute redundant information for several sets of varIDs, see redundant_info.
+
+        ARGS:
+        varIDs: (2D int array-like, size=[number_of_specs, dims]) one list of varIDs per row
+
+        RETURNS:
+        numpy array of size number_of_specs with the redundant information for each row of varIDs
+        """
+        return self._batch(_REDUNDANT_INFO, var_IDs)
+
+    def unique_info_batch(self, var_IDs):
+        """ Compute unique information for several sets of varIDs, see unique_info.
+
+        ARGS:
+        varIDs: (2D int array-like, size=[number_of_specs, dims]) one list of varIDs per row
+
+        RETURNS:
+        numpy array of size number_of_specs with the unique information for each row of varIDs
+        """
+        return self._batch(_UNIQUE_INFO, var_IDs)
+
+    def synergy_batch(self, var_IDs):
+        """ Compute synergy for several sets of varIDs, see synergy.
+
+        ARGS:
+        varIDs: (2D int array-like, size=[number_of_specs, dims]) one list of varIDs per row
+
+        RETURNS:
+        numpy array of size number_of_specs with the synergy for each row of varIDs
+        """
+        return self._batch(_SYNERGY, var_IDs)
+
+    # ****************
+    # All pairs and triples
+    # ****************
+    def mutual_info_matrix(self, n_threads=0):
+        """ Mutual information between every pair of dims of the data added so far.
+        The bins of each dim are gathered once and each pair is counted into a dense table, with pairs shared between threads, making this much faster than calling mutual_info for each pair.
+
+        ARGS:
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        numpy array of size [dims, dims] with the mutual information between dims i and j at [i, j], and the entropy of dim i at [i, i]
+
+        Example:
+        it = InfoTools(100)
+        it.set_equal_interval_binning([10] * 100, [0] * 100, [1] * 100)
+        it.add_data(channels)
+        mi = it.mutual_info_matrix()
+        """
+        import numpy as np
+
+        dims = self._obj.getNumDims()
+        results = np.zeros((dims, dims))
+        self._obj.mutualInfoMatrix(results, int(n_threads))
+        return results
+
+    def synergy_tensor(self, n_threads=0):
+        """ Synergy about each dim from every pair of other dims, for the data added so far.
+        The bins of each dim are gathered once and each triple is counted into a dense table, with triples shared between threads, making this much faster than calling synergy for each triple.
+
+        ARGS:
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        numpy array of size [dims, dims, dims] with the synergy about dim i from dims j and k at [i, j, k], as from synergy with var_IDs 0 for dim i, 1 for dim j and 2 for dim k. nan where any two of i, j and k are the same
+        """
+        import numpy as np
+
+        dims = self._obj.getNumDims()
+        results = np.zeros((dims, dims, dims))
+        self._obj.synergyTensor(results, int(n_threads))
+        return results
+
+    # ****************
+    # Time resolved
+    # ****************
+    def time_resolved(self, data, measure, var_IDs, n_threads=0):
+        """ Compute a measure at each timestep of data recorded over several trials, from the datapoints of all trials at that timestep.
+        Uses the binning of this object, but not data added to it. Each datapoint is binned once and timesteps are shared between threads, making this much faster than creating an object for each timestep.
+
+        ARGS:
+        data: (array-like, size=[number_of_trials, number_of_timesteps, dims]) datapoint of each trial at each timestep
+        measure: (str) one of "entropy", "mutual_info", "redundant_info", "unique_info", "synergy" or "pid"
+        varIDs: (list-like, size=dims) list of length equal to dimensionality of data, as for the measure
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        numpy array of size number_of_timesteps with the measure at each timestep. For "pid", a dict with the same keys as returned by pid and one such array for each
+
+        Example:
+        it = InfoTools(2, 3)
+        it.set_equal_interval_binning([10] * 2, [0] * 2, [1] * 2)
+        mi = it.time_resolved(data, "mutual_info", [0, 1])
+        """
+        import numpy as np
+
+        var_IDs = list(var_IDs)
+        n_infos = _n_infos(measure, var_IDs)
+        data = np.asarray(data)
+        if data.dtype != np.float32:
+            data = data.astype(np.float64)
+        data = np.ascontiguousarray(data)
+        n_times = data.shape[1] if data.ndim == 3 else 0
+        results = np.zeros((n_times, n_infos))
+        self._obj.timeResolved(
+            data, _MEASURES[measure], var_IDs, results, int(n_threads)
+        )
+        if measure != "pid":
+            return results[:, 0]
+        return dict(zip(_pid_names(n_infos), results.T))
+
+    def _time_series(self, data):
+        """ data as a C-contiguous float64 or float32 array of shape [number_of_trials, number_of_timesteps, dims] """
+        import numpy as np
+
+        data = np.asarray(data)
+        if data.dtype != np.float32:
+            data = data.astype(np.float64)
+        if data.ndim == 2:
+            data = data[np.newaxis]
+        return np.ascontiguousarray(data)
+
+    def lagged_mutual_info(self, data, var_IDs, lags, n_threads=0):
+        """ Mutual information between a source and a target lagged behind it, at each of several lags.
+        Uses the binning of this object, but not data added to it. Each datapoint is binned once for all lags, and lags are shared between threads.
+
+        ARGS:
+        data: (array-like, size=[number_of_timesteps, dims] or [number_of_trials, number_of_timesteps, dims]) time series, pooled across trials
+        var_IDs: (list-like, size=dims) 0 for the dims of the source, 1 for those of the target and -1 for dims to be ignored
+        lags: (list-like of ints) the value for lag l is the mutual information between the source at t-l and the target at t. Negative lags have the target leading
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        numpy array with the mutual information at each lag
+
+        Example:
+        it = InfoTools(2, 3)
+        it.set_equal_interval_binning([10] * 2, [0] * 2, [1] * 2)
+        mi = it.lagged_mutual_info(series, [0, 1], range(-10, 11))
+        """
+        import numpy as np
+
+        lags = [int(lag) for lag in lags]
+        results = np.zeros(len(lags))
+        self._obj.laggedMutualInfo(
+            self._time_series(data), list(var_IDs), lags, results, int(n_threads)
+        )
+        return results
+
+    def transfer_entropy(
+        self, data, var_IDs, lags=(1,), target_history=1, source_history=1, n_threads=0
+    ):
+        """ Transfer entropy from a source to a target, at each of several lags.
+        Uses the binning of this object, but not data added to it. Each datapoint is binned once for all lags, and lags are shared between threads.
+
+        ARGS:
+        data: (array-like, size=[number_of_timesteps, dims] or [number_of_trials, number_of_timesteps, dims]) time series, pooled across trials
+        var_IDs: (list-like, size=dims) 0 for the dims of the source, 1 for those of the target and -1 for dims to be ignored
+        lags: (list-like of ints >= 1) the value for lag l is the mutual information between the target at t and the source at t-l,...,t-l-source_history+1, given the target at t-1,...,t-target_history
+        target_history: (int) number of past timesteps of the target that are conditioned on
+        source_history: (int) number of past timesteps of the source
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        numpy array with the transfer entropy at each lag
+        """
+        import numpy as np
+
+        lags = [int(lag) for lag in lags]
+        if any(lag < 1 for lag in lags):
+            raise ValueError("lags of transfer entropy must be at least 1")
+        results = np.zeros(len(lags))
+        self._obj.transferEntropy(
+            self._time_series(data),
+            list(var_IDs),
+            lags,
+            int(target_history),
+            int(source_history),
+            results,
+            int(n_threads),
+        )
+        return results
+
+    # ****************
+    # Significance
+    # ****************
+    def _null(self, measure, var_IDs, n_permutations, seed, n_threads):
+        """ null distribution and p-values of measure, see mutual_info_null """
+        import numpy as np
+
+        var_IDs = list(var_IDs)
+        n_infos = _n_infos(measure, var_IDs)
+        nulls = np.full((int(n_permutations), n_infos), np.nan)
+        p_values = np.full(n_infos, np.nan)
+        self._obj.nullDistribution(
+            _MEASURES[measure],
+            var_IDs,
+            int(n_permutations),
+            int(seed),
+            nulls,
+            p_values,
+            int(n_threads),
+        )
+        return nulls, p_values
+
+    def mutual_info_null(self, var_IDs, n_permutations=1000, seed=0, n_threads=0):
+        """ Null distribution of mutual information, with the variable identified by 0 in var_IDs shuffled across datapoints
+
+        Datapoints must have been kept as they were added (see keep_samples) or be in a window, and ValueError is raised if none are. They are not binned again and permutations are shared between threads.
+
+        ARGS:
+        var_IDs: (list-like, size=dims) as for mutual_info
+        n_permutations: (int) number of random permutations
+        seed: (int) seed of the permutations, the same seed giving the same null distribution whatever the number of threads
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        null: numpy array of size n_permutations with the mutual information of each permutation
+        p_value: fraction of permutations with mutual information at least as large as that of the datapoints, (1 + count) / (1 + n_permutations)
+
+        Example:
+        it.keep_samples()
+        it.add_data(data)
+        null, p_value = it.mutual_info_null([0, 1], n_permutations=1000)
+        """
+        nulls, p_values = self._null(
+            "mutual_info", var_IDs, n_permutations, seed, n_threads
+        )
+        return nulls[:, 0], p_values[0]
+
+    def pid_null(self, var_IDs, n_permutations=1000, seed=0, n_threads=0):
+        """ Null distributions of the partial information decomposition, with the target (identified by 0 in var_IDs) shuffled across datapoints
+
+        See mutual_info_null
+
+        ARGS:
+        var_IDs: (list-like, size=dims) as for pid
+        n_permutations: (int) number of random permutations
+        seed: (int) seed of the permutations
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        dict with the same keys as returned by pid and a (null, p_value) pair for each
+        """
+        nulls, p_values = self._null("pid", var_IDs, n_permutations, seed, n_threads)
+        return {
+            name: (nulls[:, k], p_values[k])
+            for k, name in enumerate(_pid_names(len(p_values)))
+        }
+
+    def bootstrap(
+        self, measure, var_IDs, n_resamples=1000, confidence=0.95, seed=0, n_threads=0
+    ):
+        """ Percentile bootstrap confidence interval of a measure, from resamples (with replacement) of the datapoints added
+
+        Datapoints must have been kept as they were added (see keep_samples) or be in a window, and ValueError is raised if none are. They are not binned again - each resample draws multinomial counts of the datapoints that fall in the same bins, and resamples are shared between threads.
+
+        ARGS:
+        measure: (str) one of "entropy", "mutual_info", "redundant_info", "unique_info", "synergy" or "pid"
+        var_IDs: (list-like, size=dims) as for the measure
+        n_resamples: (int) number of resamples
+        confidence: (float) fraction of the bootstrap distribution within the interval
+        seed: (int) seed of the resamples, the same seed giving the same interval whatever the number of threads
+        n_threads: (int) number of threads to use, 0 to use all cores
+
+        RETURNS:
+        (low, high) bounds of the interval. For "pid", a dict with the same keys as returned by pid and such a pair for each
+
+        Example:
+        it.keep_samples()
+        it.add_data(data)
+        low, high = it.bootstrap("mutual_info", [0, 1], n_resamples=500)
+        """
+        import numpy as np
+
+        var_IDs = list(var_IDs)
+        n_infos = _n_infos(measure, var_IDs)
+        replicates = np.full((int(n_resamples), n_infos), np.nan)
+        self._obj.bootstrapDistribution(
+            _MEASURES[measure],
+            var_IDs,
+            int(n_resamples),
+            int(seed),
+            replicates,
+            int(n_threads),
+        )
+        tail = 50 * (1 - confidence)
+        lows, highs = np.percentile(replicates, [tail, 100 - tail], axis=0)
+        if measure != "pid":
+            return lows[0], highs[0]
+        return {name: (lows[k], highs[k]) for k, name in enumerate(_pid_names(n_infos))}
@@ -18,14 +18,20 @@ https://github.com/madvn/infotheory"""
 # export LDFLAGS="-mmacosx-version-min=10.9"
 
 extra_compile_args = []
+extra_link_args = []
 if sys.platform == "darwin":
     extra_compile_args = ["-stdlib=libc++", "-mmacosx-version-min=10.9", "-v"]
+elif sys.platform.startswith("linux"):
+    # std::mutex and threads
+    extra_compile_args = ["-pthread"]
+    extra_link_args = ["-pthread"]
 
 info_ext_module = Extension(
     "infotheoryClass",
     sources=[os.path.join("./", package_name, "PyLinker.cpp")],
     # language = "c++",
     extra_compile_args=extra_compile_args,
+    extra_link_args=extra_link_args,
 )
 
 setup(
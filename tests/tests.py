@@ -177,6 +177,58 @@ def decomposition_test_3D(dims, nreps, nbins, data_ranges, data, results):
         _except(e)
 
 
+def pid_api_test(dims, nreps, nbins, data_ranges, data):
+    """ testing that pid() matches the individual PID measures """
+    try:
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+        it.add_data(data)
+
+        var_IDs = list(range(1, dims)) + [0]
+        pid = it.pid(var_IDs)
+
+        base_str = "PID in one call | "
+        do_matching(
+            base_str,
+            pid["mutual_info"],
+            it.mutual_info([1] * (dims - 1) + [0]),
+            "Total MI | ",
+        )
+        for s in range(1, dims):
+            # source s as varID 1, other sources after it
+            unique_IDs = [1 + (d - s) % (dims - 1) for d in range(1, dims)] + [0]
+            do_matching(
+                base_str,
+                pid["unique_{}".format(s)],
+                it.unique_info(unique_IDs),
+                "Unique source {} info | ".format(s),
+            )
+        do_matching(
+            base_str,
+            pid["redundant_info"],
+            it.redundant_info(var_IDs),
+            "Redundant info | ",
+        )
+        do_matching(
+            base_str, pid["synergy"], it.synergy(var_IDs), "Synergistic info | "
+        )
+
+        # one source, no target, a missing source or the wrong size raise instead of exiting
+        invalid = [[1] * (dims - 1) + [0], [-1] + list(range(1, dims)), [0, 1]]
+        if dims == 4:
+            invalid.append([1, 3, -1, 0])
+        for bad_IDs in invalid:
+            for pid_call in [it.pid, it._obj.pid]:
+                try:
+                    pid_call(bad_IDs)
+                    raise Exception("pid with varIDs {} did not fail".format(bad_IDs))
+                except ValueError:
+                    pass
+        print(base_str, "invalid varIDs | ", SUCCESS)
+    except Exception as e:
+        _except(e)
+
+
 def uniform_random_mi_test(dims, nreps, nbins, data_ranges, num_samples=1000):
     print(
         "Testing mutual info with uniform random variables. MI = ", end="", flush=True
@@ -287,6 +339,9 @@ def test_pid_4D():
     data = np.random.rand(5000, dims)
     decomposition_equivalence_4D(dims, nreps, nbins, data_ranges, data)
 
+    print("Testing PID in one call with uniform random data")
+    pid_api_test(dims, nreps, nbins, data_ranges, data)
+
 
 def test_pid_3D():
     """ Testing
@@ -361,6 +416,9 @@ def test_pid_3D():
     print("Testing redundant and synergistic equivalence | random data")
     decomposition_equivalence_3D(dims, nreps, nbins, data_ranges, data)
 
+    print("Testing PID in one call | random data")
+    pid_api_test(dims, nreps, nbins, data_ranges, data)
+
 
 def test_mutual_info(dims, nreps, nbins, data_ranges):
     """ Testing mutual information under three conditions
@@ -444,6 +502,644 @@ def test_binning(dims, nreps, nbins, data_ranges):
         SUCCESS,
     )
 
+    # datapoints exactly on bin margins go to the bin on the right
+    try:
+        base_str = "Binning points on bin margins | "
+        it = infotheory.InfoTools(1, 0)
+        it.set_equal_interval_binning([4], [0], [1])
+        it.add_data([[0.0], [0.25], [0.5], [0.75], [1.0]])
+        # bins 1,2,3,4,4
+        target = -(3 * 0.2 * np.log2(0.2) + 0.4 * np.log2(0.4))
+        do_matching(base_str, it.entropy([0]), target, "equal interval | ")
+
+        it = infotheory.InfoTools(1, 0)
+        it.set_bin_boundaries([[0.1, 0.5, 0.6]])
+        it.add_data([[0.05], [0.1], [0.5], [0.6]])
+        # bins 1,2,3,4
+        do_matching(base_str, it.entropy([0]), 2.0, "manually specified | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_bulk_ingestion(dims, nreps, nbins, data_ranges):
+    """ Testing that adding a numpy array in one native call
+    matches adding the same datapoints one at a time
+    """
+    print("\n" + bcolors.TEST_HEADER + "BULK INGESTION" + bcolors.ENDC)
+    # values exactly representable in float32 so that all three inputs are identical
+    data = np.random.rand(2000, dims).astype(np.float32).astype(np.float64)
+    try:
+        mis = []
+        for to_add in [data, data.tolist(), data.astype(np.float32)]:
+            it = infotheory.InfoTools(dims, nreps)
+            it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+            it.add_data(to_add)
+            mis.append(it.mutual_info([0, 1]))
+        base_str = "Bulk ingestion | "
+        do_matching(base_str, mis[0], mis[1], "float64 array vs list | ")
+        do_matching(base_str, mis[2], mis[1], "float32 array vs list | ")
+
+        # binning on several threads should not change the result
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+        it.add_data(np.concatenate([data] * 20), n_threads=3)
+        do_matching(base_str, it.mutual_info([0, 1]), mis[0], "threads | ")
+
+        # pre-sizing the bin store should not change the result
+        for expected_bins in [1, 100000]:
+            it = infotheory.InfoTools(dims, nreps, expected_bins=expected_bins)
+            it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+            it.add_data(data)
+            do_matching(
+                base_str,
+                it.mutual_info([0, 1]),
+                mis[0],
+                "expected_bins = {} | ".format(expected_bins),
+            )
+    except Exception as e:
+        _except(e)
+
+
+def test_marginal_cache(dims, nreps, nbins, data_ranges):
+    """ Testing that marginals reused from the cache give the same values
+    and that the cache can be disabled
+    """
+    print("\n" + bcolors.TEST_HEADER + "MARGINAL CACHE" + bcolors.ENDC)
+    data = np.random.rand(1000, dims)
+    try:
+        base_str = "Marginal cache | "
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+        it.add_data(data)
+        first = it.mutual_info([0, 1])
+        do_matching(base_str, it.mutual_info([0, 1]), first, "repeated call | ")
+        do_matching(base_str, it.cache_stats()["hits"], 3, "hits | ")
+        do_matching(base_str, it.entropy([0, -1]), it.entropy([0, -1]), "entropy | ")
+
+        it.set_cache_budget(0)
+        do_matching(base_str, it.cache_stats()["entries"], 0, "disabled | ")
+        do_matching(base_str, it.mutual_info([0, 1]), first, "uncached | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_dense_budget(nreps):
+    """ Testing that measures from marginals counted in flat arrays are
+    identical to those from searching the populated bins
+    """
+    print("\n" + bcolors.TEST_HEADER + "DENSE MARGINALS" + bcolors.ENDC)
+    data = np.random.rand(3000, 4)
+    data[::40, 1] = np.nan
+    try:
+        base_str = "Dense marginals | "
+        dense, sparse = infotheory.InfoTools(4, nreps), infotheory.InfoTools(4, nreps)
+        sparse.set_dense_budget(0)
+        for it in [dense, sparse]:
+            # dim 3 has too many bins to be dense together with the others
+            it.set_equal_interval_binning([10, 10, 10, 5000], [0] * 4, [1] * 4)
+            it.add_data(data[:2000])
+        for it in [dense, sparse]:
+            it.mutual_info([0, 1, -1, -1])
+            it.add_data(data[2000:])
+            it.remove_data(data[:500])
+
+        def values(it):
+            return (
+                [it.entropy([0, 0, -1, -1]), it.mutual_info([0, 1, -1, -1])]
+                + list(it.pid([0, 1, 2, -1]).values())
+                + list(it.pid([0, 1, 2, 3]).values())
+                + [it.synergy([3, 0, 1, 2])]
+            )
+
+        for i, (d, s) in enumerate(zip(values(dense), values(sparse))):
+            do_matching(base_str, int(d == s), 1, "identical %d | " % i)
+    except Exception as e:
+        _except(e)
+
+
+def test_batch(nreps):
+    """ Testing that batch evaluation matches evaluating each set of varIDs separately """
+    print("\n" + bcolors.TEST_HEADER + "BATCH EVALUATION" + bcolors.ENDC)
+    dims = 4
+    data = np.random.rand(2000, dims)
+    try:
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        it.add_data(data)
+        specs = [[0, 1, 2, -1], [0, 2, 1, -1], [1, 0, 2, 3], [-1, 0, 1, 2]]
+        batches = [
+            (it.entropy_batch, it.entropy),
+            (it.mutual_info_batch, it.mutual_info),
+            (it.redundant_info_batch, it.redundant_info),
+            (it.unique_info_batch, it.unique_info),
+            (it.synergy_batch, it.synergy),
+        ]
+        for batch, single in batches:
+            base_str = "Batch | " + single.__name__ + " | "
+            results = batch(np.array(specs))
+            for i, spec in enumerate(specs):
+                do_matching(base_str, results[i], single(spec), str(spec) + " | ")
+        do_matching("Batch | ", len(it.mutual_info_batch([])), 0, "empty | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_threads(nreps):
+    """ Testing that measures computed from several threads on one object
+    match the ones computed one after another
+    """
+    print("\n" + bcolors.TEST_HEADER + "THREADS" + bcolors.ENDC)
+    from concurrent.futures import ThreadPoolExecutor
+
+    dims = 4
+    data = np.random.rand(5000, dims)
+    specs = [[0, 1, 2, -1], [0, 2, 1, -1], [1, 0, 2, 3], [-1, 0, 1, 2]] * 4
+    try:
+        results = []
+        for threads in [1, 4]:
+            # data is collapsed by whichever thread gets there first
+            it = infotheory.InfoTools(dims, nreps)
+            it.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+            it.add_data(data)
+            with ThreadPoolExecutor(threads) as pool:
+                mis = list(pool.map(it.mutual_info, specs))
+                syns = list(pool.map(it.synergy, specs))
+            results.append(mis + syns)
+        for i in range(len(results[0])):
+            do_matching("Threads | ", results[1][i], results[0][i], str(i) + " | ")
+
+        # data added while another thread computes measures
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        it.add_data(data[:100])
+        with ThreadPoolExecutor(1) as pool:
+            done = []
+            query = pool.submit(
+                lambda: [it.pid([0, 1, 2, 3]) for _ in iter(lambda: done, [True])]
+            )
+            for batch in np.array_split(data[100:], 50):
+                it.add_data(batch)
+                it.remove_data(batch[:10])
+                it.add_data(batch[:10])
+            done.append(True)
+            query.result()
+        full = infotheory.InfoTools(dims, nreps)
+        full.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        full.add_data(data)
+        do_matching(
+            "Threads | ",
+            it.pid([0, 1, 2, 3])["synergy"],
+            full.pid([0, 1, 2, 3])["synergy"],
+            "adding while computing | ",
+        )
+    except Exception as e:
+        _except(e)
+
+
+def test_streaming(nreps):
+    """ Testing that adding data after measures have been computed
+    gives the same values as adding all data before computing them
+    """
+    print("\n" + bcolors.TEST_HEADER + "STREAMING" + bcolors.ENDC)
+    dims = 4
+    data = np.random.rand(3000, dims)
+    specs = [[0, 1, 2, -1], [1, 0, 2, 3]]
+    try:
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        for batch in np.array_split(data, 3):
+            it.add_data(batch)
+            # estimate marginals so that they are updated by the next batch
+            it.mutual_info(specs[0])
+            it.pid(specs[1])
+        full = infotheory.InfoTools(dims, nreps)
+        full.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        full.add_data(data)
+        for spec in specs:
+            base_str = "Streaming | " + str(spec) + " | "
+            do_matching(base_str, it.mutual_info(spec), full.mutual_info(spec), "mi | ")
+            pids, full_pids = it.pid(spec), full.pid(spec)
+            for k in pids:
+                do_matching(base_str, pids[k], full_pids[k], k + " | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_window(nreps):
+    """ Testing that estimates with a window or after removing datapoints
+    match the ones from adding just the remaining datapoints
+    """
+    print("\n" + bcolors.TEST_HEADER + "SLIDING WINDOW" + bcolors.ENDC)
+    dims = 3
+    data = np.random.rand(3000, dims)
+    times = np.arange(len(data)) * 0.5
+    specs = [[0, 1, -1], [0, 1, 2]]
+
+    def new_it():
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([10] * dims, [0] * dims, [1] * dims)
+        return it
+
+    def compare(name, it, kept):
+        full = new_it()
+        full.add_data(kept)
+        do_matching(
+            "Window | ",
+            it.mutual_info(specs[0]),
+            full.mutual_info(specs[0]),
+            name + " mi | ",
+        )
+        do_matching(
+            "Window | ",
+            it.synergy(specs[1]),
+            full.synergy(specs[1]),
+            name + " synergy | ",
+        )
+
+    try:
+        by_size, by_duration = new_it(), new_it()
+        by_size.set_window(size=1000)
+        by_duration.set_window(duration=200)
+        for batch, batch_times in zip(
+            np.array_split(data, 6), np.array_split(times, 6)
+        ):
+            by_size.add_data(batch)
+            by_duration.add_data(batch, batch_times)
+            # estimate marginals so that they are updated by the next batch
+            by_size.mutual_info(specs[0])
+            by_duration.synergy(specs[1])
+        compare("size", by_size, data[-1000:])
+        compare("duration", by_duration, data[times > times[-1] - 200])
+
+        removed = new_it()
+        removed.add_data(data)
+        removed.synergy(specs[1])
+        removed.remove_data(data[:2000])
+        removed.remove_data(data[2000:2500].tolist())
+        compare("removed", removed, data[2500:])
+    except Exception as e:
+        _except(e)
+
+
+def test_time_resolved(nreps):
+    """ Testing that measures at each timestep match the ones from
+    an object with the datapoints of that timestep
+    """
+    print("\n" + bcolors.TEST_HEADER + "TIME RESOLVED" + bcolors.ENDC)
+    dims = 3
+    data = np.random.rand(200, 5, dims)
+    try:
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+        mis = it.time_resolved(data, "mutual_info", [0, 1, -1], n_threads=2)
+        pids = it.time_resolved(data.astype(np.float32), "pid", [0, 1, 2])
+        for t in range(data.shape[1]):
+            it_t = infotheory.InfoTools(dims, nreps)
+            it_t.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+            it_t.add_data(data[:, t].astype(np.float32))
+            base_str = "Time resolved | t = {} | ".format(t)
+            do_matching(base_str, mis[t], it_t.mutual_info([0, 1, -1]), "mi | ")
+            for k, v in it_t.pid([0, 1, 2]).items():
+                do_matching(base_str, pids[k][t], v, k + " | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_merge(nreps):
+    """ Testing that merging objects built from parts of the data, and
+    pickling them, matches adding all of the data to one object
+    """
+    print("\n" + bcolors.TEST_HEADER + "MERGING AND PICKLING" + bcolors.ENDC)
+    import pickle
+
+    dims = 3
+    data = np.random.rand(3000, dims)
+
+    def build(part):
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+        it.add_data(part)
+        return it
+
+    try:
+        base_str = "Merging | "
+        whole = build(data)
+        merged = build(data[:1000])
+        merged.mutual_info([0, 1, -1])  # merging after a query
+        for part in [data[1000:2500], data[2500:]]:
+            merged.merge(pickle.loads(pickle.dumps(build(part))))
+        do_matching(
+            base_str,
+            merged.mutual_info([0, 1, -1]),
+            whole.mutual_info([0, 1, -1]),
+            "mi | ",
+        )
+        do_matching(
+            base_str, merged.synergy([0, 1, 2]), whole.synergy([0, 1, 2]), "synergy | "
+        )
+        restored = infotheory.InfoTools.from_bytes(merged.to_bytes())
+        do_matching(
+            base_str,
+            restored.mutual_info([0, 1, -1]),
+            whole.mutual_info([0, 1, -1]),
+            "restored | ",
+        )
+
+        other = infotheory.InfoTools(dims, nreps)
+        other.set_equal_interval_binning([5] * dims, [0] * dims, [1] * dims)
+        try:
+            merged.merge(other)
+            raise Exception("Merging objects with different binning did not fail")
+        except ValueError:
+            print(base_str, "different binning | ", SUCCESS)
+
+        # merging an object that keeps samples with itself is the same as adding its data twice
+        twice = infotheory.InfoTools(dims, nreps)
+        twice.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+        twice.keep_samples()
+        twice.add_data(data[:500])
+        twice.mutual_info([0, 1, -1])  # merging after a query
+        twice.merge(twice)
+        added = infotheory.InfoTools(dims, nreps)
+        added.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+        added.keep_samples()
+        added.add_data(data[:500])
+        added.add_data(data[:500])
+        do_matching(
+            base_str,
+            twice.mutual_info([0, 1, -1]),
+            added.mutual_info([0, 1, -1]),
+            "self | ",
+        )
+        null_twice, _ = twice.mutual_info_null([0, 1, -1], 20, seed=3)
+        null_added, _ = added.mutual_info_null([0, 1, -1], 20, seed=3)
+        do_matching(
+            base_str, int(np.all(null_twice == null_added)), 1, "self samples | "
+        )
+
+        # counts past 32 bits
+        big = infotheory.InfoTools(1, nreps)
+        big.set_equal_interval_binning([2], [0], [1])
+        big.add_data([[0.1]] + [[0.9]] * 3)
+        for _ in range(33):
+            big.merge(big)
+        do_matching(base_str, big.entropy([0]), 0.811278, "large counts | ")
+        do_matching(
+            base_str,
+            pickle.loads(pickle.dumps(big)).entropy([0]),
+            0.811278,
+            "large counts pickled | ",
+        )
+    except Exception as e:
+        _except(e)
+
+
+def test_save(nreps):
+    """ Testing that an object loaded from a file gives the same values
+    and can have more datapoints added to it
+    """
+    print("\n" + bcolors.TEST_HEADER + "SAVING AND LOADING" + bcolors.ENDC)
+    import os
+    import tempfile
+
+    dims = 3
+    data = np.random.rand(2000, dims)
+    path = os.path.join(tempfile.mkdtemp(), "state.bin")
+    try:
+        base_str = "Saving | "
+        it = infotheory.InfoTools(dims, nreps)
+        it.set_equal_interval_binning([4] * dims, [0] * dims, [1] * dims)
+        it.add_data(data[:1500])
+        it.save(path)
+        loaded = infotheory.InfoTools.load(path)
+        do_matching(
+            base_str,
+            loaded.mutual_info([0, 1, -1]),
+            it.mutual_info([0, 1, -1]),
+            "mi | ",
+        )
+        do_matching(
+            base_str, loaded.synergy([0, 1, 2]), it.synergy([0, 1, 2]), "synergy | "
+        )
+
+        # replacing the file that loaded is using
+        it.add_data(data[1500:])
+        loaded.add_data(data[1500:])
+        loaded.save(path)
+        do_matching(
+            base_str,
+            loaded.mutual_info([0, 1, -1]),
+            it.mutual_info([0, 1, -1]),
+            "added | ",
+        )
+        do_matching(
+            base_str,
+            infotheory.InfoTools.load(path).mutual_info([0, 1, -1]),
+            it.mutual_info([0, 1, -1]),
+            "saved again | ",
+        )
+        os.remove(path)
+    except Exception as e:
+        _except(e)
+
+
+def test_null(nreps):
+    """ Testing that null distributions from shuffled datapoints separate dependent from independent
+    variables and do not depend on the number of threads
+    """
+    print("\n" + bcolors.TEST_HEADER + "NULL DISTRIBUTIONS" + bcolors.ENDC)
+    x = np.random.rand(1000)
+    data = np.column_stack([x, x + 0.2 * np.random.rand(1000), np.random.rand(1000)])
+    try:
+        base_str = "Null | "
+        it = infotheory.InfoTools(3, nreps)
+        it.set_equal_interval_binning([5] * 3, [0] * 3, [1.2] * 3)
+        it.keep_samples()
+        it.add_data(data[:500])
+        it.add_data(data[500:].tolist())
+        null, p_value = it.mutual_info_null([0, 1, -1], 50, seed=1, n_threads=1)
+        do_matching(base_str, p_value, 1 / 51, "dependent | ")
+        do_matching(
+            base_str, int(np.all(null < it.mutual_info([0, 1, -1]))), 1, "below | "
+        )
+        null_threads, _ = it.mutual_info_null([0, 1, -1], 50, seed=1, n_threads=3)
+        do_matching(base_str, int(np.all(null == null_threads)), 1, "threads | ")
+        _, p_value = it.mutual_info_null([0, -1, 1], 50)
+        do_matching(base_str, int(p_value > 0.01), 1, "independent | ")
+        pid_nulls = it.pid_null([0, 1, 2], 20)
+        do_matching(base_str, pid_nulls["mutual_info"][1], 1 / 21, "pid | ")
+
+        # datapoints in a window are kept
+        it = infotheory.InfoTools(3, nreps)
+        it.set_equal_interval_binning([5] * 3, [0] * 3, [1.2] * 3)
+        it.set_window(size=400)
+        it.add_data(data)
+        _, p_value = it.mutual_info_null([0, 1, -1], 20)
+        do_matching(base_str, p_value, 1 / 21, "window | ")
+
+        # without kept datapoints, or with none, there is no null distribution
+        it = infotheory.InfoTools(3, nreps)
+        it.set_equal_interval_binning([5] * 3, [0] * 3, [1.2] * 3)
+        it.add_data(data)
+        empty = infotheory.InfoTools(3, nreps)
+        empty.set_equal_interval_binning([5] * 3, [0] * 3, [1.2] * 3)
+        empty.keep_samples()
+        for name, obj in [("not kept | ", it), ("no datapoints | ", empty)]:
+            try:
+                obj.mutual_info_null([0, 1, -1], 20)
+                raise Exception("Null distribution did not fail: " + name)
+            except ValueError:
+                print(base_str, name, SUCCESS)
+        try:
+            it.pid_null([0, 1, 2], 20)
+            raise Exception(
+                "PID null distribution without kept datapoints did not fail"
+            )
+        except ValueError:
+            print(base_str, "pid not kept | ", SUCCESS)
+    except Exception as e:
+        _except(e)
+
+
+def test_bootstrap(nreps):
+    """ Testing that bootstrap intervals contain the estimate, narrow with more datapoints
+    and do not depend on the number of threads
+    """
+    print("\n" + bcolors.TEST_HEADER + "BOOTSTRAP" + bcolors.ENDC)
+    x = np.random.rand(4000)
+    data = np.column_stack([x, x + 0.5 * np.random.rand(4000), np.random.rand(4000)])
+    try:
+        base_str = "Bootstrap | "
+        widths = []
+        for n in [400, 4000]:
+            it = infotheory.InfoTools(3, nreps)
+            it.set_equal_interval_binning([5] * 3, [0] * 3, [1.5] * 3)
+            it.keep_samples()
+            it.add_data(data[:n])
+            low, high = it.bootstrap(
+                "mutual_info", [0, 1, -1], 200, seed=2, n_threads=1
+            )
+            mi = it.mutual_info([0, 1, -1])
+            do_matching(base_str, int(low <= mi <= high), 1, "contains | ")
+            widths.append(high - low)
+        do_matching(base_str, int(widths[1] < widths[0]), 1, "narrows | ")
+        threads = it.bootstrap("mutual_info", [0, 1, -1], 200, seed=2, n_threads=3)
+        do_matching(base_str, threads[0], low, "threads | ")
+        intervals = it.bootstrap("pid", [0, 1, 2], 100)
+        do_matching(base_str, len(intervals), len(it.pid([0, 1, 2])), "pid | ")
+
+        # without kept datapoints, or with none, there is no interval
+        it = infotheory.InfoTools(3, nreps)
+        it.set_equal_interval_binning([5] * 3, [0] * 3, [1.5] * 3)
+        it.add_data(data)
+        empty = infotheory.InfoTools(3, nreps)
+        empty.set_equal_interval_binning([5] * 3, [0] * 3, [1.5] * 3)
+        empty.keep_samples()
+        for name, obj in [("not kept | ", it), ("no datapoints | ", empty)]:
+            try:
+                obj.bootstrap("mutual_info", [0, 1, -1], 20)
+                raise Exception("Bootstrap did not fail: " + name)
+            except ValueError:
+                print(base_str, name, SUCCESS)
+    except Exception as e:
+        _except(e)
+
+
+def test_lagged(nreps):
+    """ Testing that lagged mutual information and transfer entropy match
+    objects built from shifted copies of the time series
+    """
+    print("\n" + bcolors.TEST_HEADER + "LAGGED MI AND TRANSFER ENTROPY" + bcolors.ENDC)
+    x = np.random.rand(3000)
+    y = np.roll(x, 2) + 0.5 * np.random.rand(3000)
+    series = np.column_stack([x, y])
+
+    def shifted(columns, var_IDs):
+        n = min(len(c) for c in columns)
+        it = infotheory.InfoTools(len(columns), nreps)
+        it.set_equal_interval_binning(
+            [5] * len(columns), [0] * len(columns), [1.5] * len(columns)
+        )
+        it.add_data(np.column_stack([c[len(c) - n :] for c in columns]))
+        return it.mutual_info(var_IDs)
+
+    try:
+        base_str = "Lagged | "
+        it = infotheory.InfoTools(2, nreps)
+        it.set_equal_interval_binning([5, 5], [0, 0], [1.5, 1.5])
+        mis = it.lagged_mutual_info(series, [0, 1], [-1, 0, 2])
+        do_matching(base_str, mis[2], shifted([x[:-2], y], [0, 1]), "mi lag 2 | ")
+        do_matching(base_str, mis[0], shifted([x, y[:-1]], [0, 1]), "mi lag -1 | ")
+        do_matching(base_str, int(np.argmax(mis)), 2, "peak | ")
+
+        tes = it.transfer_entropy(series, [0, 1], [1, 2], n_threads=2)
+        te = shifted([y, y[:-1], x[:-2]], [0, 1, 1]) - shifted(
+            [y, y[:-1], x[:-2]], [0, 1, -1]
+        )
+        do_matching(base_str, tes[1], te, "te lag 2 | ")
+        tes = it.transfer_entropy(
+            series, [0, 1], [2], target_history=2, source_history=2
+        )
+        cols = [y, y[:-1], y[:-2], x[:-2], x[:-3]]
+        te = shifted(cols, [0, 1, 1, 1, 1]) - shifted(cols, [0, 1, 1, -1, -1])
+        do_matching(base_str, tes[0], te, "te histories | ")
+
+        trials = np.stack([series[:1500], series[1500:]])
+        mis = it.lagged_mutual_info(trials, [0, 1], [2])
+        # pairs within each trial only
+        source = np.concatenate([trial[:-2, 0] for trial in trials])
+        target = np.concatenate([trial[2:, 1] for trial in trials])
+        do_matching(base_str, mis[0], shifted([source, target], [0, 1]), "trials | ")
+    except Exception as e:
+        _except(e)
+
+
+def test_pairwise(nreps):
+    """ Testing that the mutual information matrix and synergy tensor match
+    mutual_info, entropy and synergy for each pair and triple of dims
+    """
+    print("\n" + bcolors.TEST_HEADER + "PAIRWISE MI AND SYNERGY" + bcolors.ENDC)
+    x = np.random.rand(2000, 5)
+    x[:, 1] = (x[:, 0] + x[:, 2]) / 2
+    x[:, 3] = x[:, 0] + 0.1 * x[:, 4]
+    x[::50, 2] = np.nan
+    try:
+        base_str = "Pairwise | "
+        it = infotheory.InfoTools(5, nreps)
+        # dims 3 and 4 have too many bins between them for a flat array of counts
+        it.set_equal_interval_binning([8, 8, 8, 2100, 2100], [0] * 5, [1.1] * 5)
+        it.add_data(x)
+        it.remove_data(x[:100])
+        mi = it.mutual_info_matrix(n_threads=2)
+        for i, j in [(0, 1), (2, 1), (0, 3), (3, 4)]:
+            var_IDs = [-1] * 5
+            var_IDs[i], var_IDs[j] = 0, 1
+            do_matching(
+                base_str, mi[i, j], it.mutual_info(var_IDs), "mi %d %d | " % (i, j)
+            )
+        do_matching(base_str, mi[1, 0], mi[0, 1], "symmetric | ")
+        do_matching(base_str, mi[2, 2], it.entropy([-1, -1, 0, -1, -1]), "entropy | ")
+
+        syn = it.synergy_tensor()
+        for i, j, k in [(1, 0, 2), (0, 1, 2), (3, 0, 4), (4, 3, 2)]:
+            var_IDs = [-1] * 5
+            var_IDs[i], var_IDs[j], var_IDs[k] = 0, 1, 2
+            do_matching(
+                base_str,
+                syn[i, j, k],
+                it.synergy(var_IDs),
+                "synergy %d %d %d | " % (i, j, k),
+            )
+        do_matching(base_str, syn[1, 2, 0], syn[1, 0, 2], "symmetric | ")
+        do_matching(base_str, int(np.isnan(syn[1, 1, 2])), 1, "repeated dim | ")
+
+        # hash tables only
+        it.set_dense_budget(0)
+        do_matching(base_str, it.synergy_tensor()[1, 0, 2], syn[1, 0, 2], "no dense | ")
+        do_matching(base_str, it.mutual_info_matrix()[0, 1], mi[0, 1], "no dense | ")
+    except Exception as e:
+        _except(e)
+
 
 def test_creation(dims, nreps, nbins, data_ranges):
     print("Testing creating an object. ", end="", flush=True)
@@ -451,6 +1147,16 @@ def test_creation(dims, nreps, nbins, data_ranges):
         # creating object
         it = infotheory.InfoTools(dims, nreps)
         it.set_equal_interval_binning(nbins, data_ranges[0], data_ranges[1])
+
+        # the native object cannot be created without dims
+        native = type(it._obj)
+        try:
+            native.__new__(native).getNumDims()
+            raise Exception("Creating a native object without dims did not fail")
+        except TypeError:
+            pass
+        if native(dims, nreps).getNumDims() != dims:
+            raise Exception("Native object has the wrong number of dims")
         print(bcolors.OKGREEN + "SUCCESS" + bcolors.ENDC)
     except Exception as e:
         _except(e)
@@ -461,10 +1167,24 @@ def run_tests(dims, nreps, nbins, data_ranges):
     print(bcolors.HEADER + "************ Starting tests ************" + bcolors.ENDC)
     test_creation(dims, nreps, nbins, data_ranges)
     test_binning(dims, nreps, [3, 3], data_ranges)
+    test_bulk_ingestion(dims, nreps, nbins, data_ranges)
+    test_marginal_cache(dims, nreps, nbins, data_ranges)
+    test_dense_budget(nreps)
     test_entropy(1, nreps, [50], [[0], [1]])
     test_mutual_info(dims, nreps, nbins, data_ranges)
     test_pid_3D()
     test_pid_4D()
+    test_batch(nreps)
+    test_threads(nreps)
+    test_streaming(nreps)
+    test_window(nreps)
+    test_time_resolved(nreps)
+    test_merge(nreps)
+    test_save(nreps)
+    test_null(nreps)
+    test_bootstrap(nreps)
+    test_lagged(nreps)
+    test_pairwise(nreps)
     print(
         "\n"
         + bcolors.HEADER